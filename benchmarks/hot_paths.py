@@ -0,0 +1,360 @@
+"""
+{This script times the forward-model and likelihood hot paths on synthetic
+ halo and mock catalogues and writes wall time, throughput and peak memory of
+ each to a JSON file that can be compared between commits}
+
+Run from the project root:
+
+    python -m benchmarks.hot_paths --output bench_<commit>.json
+    python -m benchmarks.hot_paths --compare bench_<old>.json
+"""
+
+# Built-in/Generic Imports
+import argparse
+import platform
+import subprocess
+import tempfile
+import tracemalloc
+import warnings
+import json
+import time
+import os
+
+# Libs
+import pandas as pd
+import numpy as np
+
+from benchmarks.synthetic import synthetic_halo_arrays, \
+    synthetic_mock_catalog, synthetic_data_catalog, write_mock_suite
+
+__author__ = '{Mehnaaz Asad}'
+
+SEED = 42
+# Best fit SMHM parameters used as the benchmark theta
+THETA = np.array([12.32, 10.56, 0.42, 0.62, 0.29])
+
+BENCHMARKS = []
+
+
+def benchmark(name, unit):
+    """Registers a benchmark setup function under `name`"""
+    def register(setup):
+        BENCHMARKS.append((name, unit, setup))
+        return setup
+    return register
+
+def mcmc_module(survey='eco', mf_type='smf'):
+    """Imports mcmc.py with the globals main() would set"""
+    from src.mcmc import mcmc
+    mcmc.survey = survey
+    mcmc.mf_type = mf_type
+    return mcmc
+
+def halotools_model(num_halos):
+    """Behroozi 2010 model populated on a synthetic halo catalog"""
+    from halotools.empirical_models import PrebuiltSubhaloModelFactory
+    from halotools.sim_manager import UserSuppliedHaloCatalog
+    rng = np.random.default_rng(SEED)
+    halocat = UserSuppliedHaloCatalog(**synthetic_halo_arrays(num_halos, rng))
+    model = PrebuiltSubhaloModelFactory('behroozi10', redshift=0.,
+        prim_haloprop_key='halo_macc')
+    model.populate_mock(halocat, seed=5)
+    return model
+
+@benchmark('populate_mock', 'galaxies')
+def setup_populate_mock(ctx):
+    mcmc = mcmc_module()
+    model = halotools_model(ctx['num_halos'])
+    mcmc.model_init = model
+    def run():
+        return mcmc.populate_mock(THETA, model)
+    return run, ctx['num_halos']
+
+@benchmark('diff_smf', 'galaxies')
+def setup_diff_smf(ctx):
+    mcmc = mcmc_module(mf_type='smf')
+    rng = np.random.default_rng(SEED)
+    mstar = 10**rng.normal(9.5, 0.8, ctx['num_gals'])
+    def run():
+        return mcmc.diff_smf(mstar, 130**3, True)
+    return run, ctx['num_gals']
+
+@benchmark('diff_bmf', 'galaxies')
+def setup_diff_bmf(ctx):
+    mcmc = mcmc_module(mf_type='bmf')
+    rng = np.random.default_rng(SEED)
+    mock_pd = synthetic_mock_catalog(ctx['num_gals'], rng)
+    logmstar = mock_pd.logmstar.values
+    logmgas = np.log10(1.4 * mock_pd.mhi.values)
+    def run():
+        logmbary = mcmc.calc_bary(logmstar, logmgas)
+        return mcmc.diff_bmf(logmbary, 151829.26, False)
+    return run, ctx['num_gals']
+
+@benchmark('chi_squared', 'evaluations')
+def setup_chi_squared(ctx):
+    mcmc = mcmc_module()
+    rng = np.random.default_rng(SEED)
+    data = rng.normal(-2, 0.5, 6)
+    model = data + rng.normal(0, 0.1, 6)
+    err = np.full(6, 0.1)
+    inv_corr_mat = np.linalg.inv(np.eye(6) + 0.1)
+    num_evals = 1000
+    def run():
+        for _ in range(num_evals):
+            mcmc.chi_squared(data, model, err, inv_corr_mat)
+    return run, num_evals
+
+@benchmark('lnprob', 'evaluations')
+def setup_lnprob(ctx):
+    mcmc = mcmc_module()
+    model = halotools_model(ctx['num_halos'])
+    mcmc.model_init = model
+    phi = mcmc.diff_smf(mcmc.populate_mock(THETA, model).stellar_mass.values,
+        130**3, True)[1]
+    err = np.full(len(phi), 0.1)
+    inv_corr_mat = np.eye(len(phi))
+    def run():
+        with warnings.catch_warnings():
+            return mcmc.lnprob(THETA, phi, err, inv_corr_mat)
+    return run, 1
+
+@benchmark('get_err_data', 'mocks')
+def setup_get_err_data(ctx):
+    from src.data.surveys import get_survey
+    mcmc = mcmc_module()
+    rng = np.random.default_rng(SEED)
+    path = os.path.join(ctx['tmpdir'], 'mocks') + '/'
+    if not os.path.exists(path):
+        write_mock_suite(path, get_survey('eco'), ctx['num_mock_gals'], rng)
+    num_mocks = 8 * get_survey('eco').num_mocks
+    def run():
+        return mcmc.get_err_data('eco', path)
+    return run, num_mocks
+
+@benchmark('assign_colour_label_data', 'galaxies')
+def setup_assign_colour_label_data(ctx):
+    from src.mcmc import mcmc_colour
+    rng = np.random.default_rng(SEED)
+    catl = synthetic_data_catalog(ctx['num_gals'], rng)
+    def run():
+        return mcmc_colour.assign_colour_label_data(catl.copy())
+    return run, ctx['num_gals']
+
+@benchmark('assign_colour_mock', 'galaxies')
+def setup_assign_colour_mock(ctx):
+    from src.data.mock_comparisons import quenching_model_smf
+    rng = np.random.default_rng(SEED)
+    catl = synthetic_data_catalog(ctx['num_gals'], rng)
+    gals_df = pd.DataFrame({'stellar_mass': 10**rng.normal(9.5, 0.8,
+        ctx['num_gals'])})
+    def run():
+        return quenching_model_smf.assign_colour_mock(gals_df.copy(), catl,
+            'median')
+    return run, ctx['num_gals']
+
+@benchmark('jackknife', 'galaxies')
+def setup_jackknife(ctx):
+    from src.mcmc import smf_smhm_from_chain
+    smf_smhm_from_chain.survey = 'eco'
+    smf_smhm_from_chain.mf_type = 'smf'
+    rng = np.random.default_rng(SEED)
+    catl = synthetic_data_catalog(ctx['num_gals'], rng)
+    def run():
+        return smf_smhm_from_chain.jackknife(catl, 151829.26)
+    return run, ctx['num_gals']
+
+def time_benchmark(run, repeat):
+    """
+    Times a benchmark and measures its peak traced memory
+
+    Parameters
+    ----------
+    run: callable
+        Benchmark to time
+
+    repeat: int
+        Number of timed calls
+
+    Returns
+    ---------
+    result: dict
+        Minimum, median and all wall times [s] and peak memory [bytes]
+    """
+    # Warm up caches and imports outside of the timed calls
+    run()
+    times = []
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t_start)
+    # Memory is traced in a separate call since tracing slows down numpy
+    tracemalloc.start()
+    run()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    result = {
+        'min_s': min(times),
+        'median_s': float(np.median(times)),
+        'times_s': times,
+        'peak_memory_bytes': peak_memory,
+    }
+    return result
+
+def run_benchmarks(ctx, names=None):
+    """
+    Runs registered benchmarks, skipping those whose dependencies are missing
+
+    Parameters
+    ----------
+    ctx: dict
+        Benchmark sizes and temporary directory
+
+    names: list, optional
+        Subset of benchmarks to run
+
+    Returns
+    ---------
+    results: dict
+        Result of each benchmark keyed by name
+    """
+    results = {}
+    for name, unit, setup in BENCHMARKS:
+        if names and name not in names:
+            continue
+        try:
+            run, num_items = setup(ctx)
+        except ImportError as err:
+            print('{0:<26} skipped ({1})'.format(name, err))
+            results[name] = {'status': 'skipped', 'reason': str(err)}
+            continue
+        result = time_benchmark(run, ctx['repeat'])
+        result['status'] = 'ok'
+        result['items'] = num_items
+        result['unit'] = unit
+        result['throughput'] = num_items / result['median_s']
+        results[name] = result
+        print('{0:<26} {1:10.4f} s  {2:12.1f} {3}/s  {4:8.1f} MB'.format(
+            name, result['median_s'], result['throughput'], unit,
+            result['peak_memory_bytes'] / 1e6))
+    return results
+
+def run_metadata(ctx):
+    """Commit, interpreter, library versions and sizes of benchmark run"""
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    meta = {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'seed': SEED,
+        'sizes': {key: value for key, value in ctx.items()
+            if key != 'tmpdir'},
+    }
+    return meta
+
+def compare(results, baseline_file, threshold):
+    """
+    Prints ratio of median times to a baseline run and flags regressions
+
+    Parameters
+    ----------
+    results: dict
+        Results of current run
+
+    baseline_file: string
+        Path to JSON written by an earlier run
+
+    threshold: float
+        Ratio of median times above which a benchmark is a regression
+
+    Returns
+    ---------
+    regressions: list
+        Names of benchmarks slower than threshold times the baseline
+    """
+    with open(baseline_file) as infile:
+        baseline = json.load(infile)
+    print('\nComparison to {0} (commit {1})'.format(baseline_file,
+        baseline['meta']['commit']))
+    regressions = []
+    for name, result in results.items():
+        old = baseline['results'].get(name)
+        if result['status'] != 'ok' or old is None or old['status'] != 'ok':
+            continue
+        ratio = result['median_s'] / old['median_s']
+        flag = ''
+        if ratio > threshold:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        print('{0:<26} {1:6.2f}x {2}'.format(name, ratio, flag))
+    return regressions
+
+def args_parser():
+    """
+    Parsing arguments passed to script
+
+    Returns
+    -------
+    args:
+        Input arguments to the script
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', type=str, default='bench_output.json',
+        help='JSON file to write results to')
+    parser.add_argument('--compare', type=str, default=None,
+        help='JSON file of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=1.2,
+        help='Slowdown ratio reported as a regression')
+    parser.add_argument('--only', type=str, nargs='*', default=None,
+        help='Names of benchmarks to run')
+    parser.add_argument('--repeat', type=int, default=5,
+        help='Number of timed calls per benchmark')
+    parser.add_argument('--num_gals', type=int, default=20000,
+        help='Number of galaxies in synthetic catalogs')
+    parser.add_argument('--num_halos', type=int, default=100000,
+        help='Number of halos in synthetic halo catalog')
+    parser.add_argument('--num_mock_gals', type=int, default=2000,
+        help='Number of galaxies in each synthetic mock file')
+    args = parser.parse_args()
+    return args
+
+def main(args):
+    """
+    Main function that calls all other functions
+
+    Parameters
+    ----------
+    args:
+        Input arguments to the script
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ctx = {
+            'repeat': args.repeat,
+            'num_gals': args.num_gals,
+            'num_halos': args.num_halos,
+            'num_mock_gals': args.num_mock_gals,
+            'tmpdir': tmpdir,
+        }
+        results = run_benchmarks(ctx, args.only)
+        output = {'meta': run_metadata(ctx), 'results': results}
+
+    with open(args.output, 'w') as outfile:
+        json.dump(output, outfile, indent=2)
+    print('Results written to {0}'.format(args.output))
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            raise SystemExit(1)
+
+# Main function
+if __name__ == '__main__':
+    args = args_parser()
+    main(args)
@@ -0,0 +1,207 @@
+"""
+{This module builds small synthetic halo, mock and survey catalogues shaped
+ like the Vishnu halo catalog, the ECO_cat_*_Planck_memb_cat.hdf5 mocks and
+ the ECO data csv so that the hot paths can be benchmarked without the raw
+ data}
+"""
+
+# Built-in/Generic Imports
+import os
+
+# Libs
+import pandas as pd
+import numpy as np
+
+__author__ = '{Mehnaaz Asad}'
+
+LBOX = 130. # Vishnu box size [Mpc/h]
+
+
+def synthetic_halo_arrays(num_halos, rng, lbox=LBOX):
+    """
+    Synthetic host and subhalo arrays accepted by UserSuppliedHaloCatalog
+
+    Parameters
+    ----------
+    num_halos: int
+        Number of halos
+
+    rng: numpy.random.Generator
+        Random number generator
+
+    lbox: float, optional
+        Box size [Mpc/h]
+
+    Returns
+    ---------
+    halo_arrays: dict
+        Halo columns and box properties
+    """
+    # Power law mass function between 10^10.5 and 10^15 Msun/h
+    logmvir = 10.5 - np.log10(rng.uniform(10**-4.5, 1, num_halos)) / 0.9
+    logmvir = np.clip(logmvir, 10.5, 15.)
+    halo_id = np.arange(num_halos, dtype=np.int64)
+    # 20% subhalos attached to random hosts
+    is_sub = rng.uniform(size=num_halos) < 0.2
+    hosts = halo_id[~is_sub]
+    halo_upid = np.full(num_halos, -1, dtype=np.int64)
+    halo_upid[is_sub] = rng.choice(hosts, is_sub.sum())
+    halo_hostid = np.where(is_sub, halo_upid, halo_id)
+    halo_mvir = 10**logmvir
+    halo_arrays = {
+        'halo_id': halo_id,
+        'halo_upid': halo_upid,
+        'halo_hostid': halo_hostid,
+        'halo_x': rng.uniform(0, lbox, num_halos),
+        'halo_y': rng.uniform(0, lbox, num_halos),
+        'halo_z': rng.uniform(0, lbox, num_halos),
+        'halo_vx': rng.normal(0, 300, num_halos),
+        'halo_vy': rng.normal(0, 300, num_halos),
+        'halo_vz': rng.normal(0, 300, num_halos),
+        'halo_mvir': halo_mvir,
+        'halo_macc': halo_mvir * rng.uniform(0.8, 1., num_halos),
+        'halo_mpeak': halo_mvir * rng.uniform(1., 1.2, num_halos),
+        'halo_rvir': 0.1 * (halo_mvir / 1e12)**(1./3),
+        'halo_nfw_conc': rng.uniform(4, 15, num_halos),
+        'Lbox': lbox,
+        'particle_mass': 3.215e7,
+        'redshift': 0.,
+    }
+    return halo_arrays
+
+def synthetic_mock_catalog(num_gals, rng, min_cz=3000, max_cz=7000):
+    """
+    Synthetic mock with the columns of the ECO_cat_*_Planck_memb_cat.hdf5
+    files
+
+    Parameters
+    ----------
+    num_gals: int
+        Number of galaxies
+
+    rng: numpy.random.Generator
+        Random number generator
+
+    min_cz, max_cz: float, optional
+        Redshift range of mock [km/s]
+
+    Returns
+    ---------
+    mock_pd: pandas.DataFrame
+        Mock catalog
+    """
+    logmstar = np.clip(rng.normal(9.3, 0.8, num_gals), 6.4, 11.6)
+    loghalom = np.clip(11.2 + 0.9 * (logmstar - 9.) +
+        rng.normal(0, 0.3, num_gals), 10.3, 14.5)
+    M_r = -17. - 1.6 * (logmstar - 8.9) + rng.normal(0, 0.3, num_gals)
+    u_r = np.clip(1.0 + 0.25 * (logmstar - 8.) + rng.normal(0, 0.3,
+        num_gals), 0.5, 3.1)
+    cs_flag = (rng.uniform(size=num_gals) < 0.7).astype(np.int64)
+    groupid = rng.integers(0, max(num_gals // 2, 1), num_gals)
+    mock_pd = pd.DataFrame({
+        'loghalom': loghalom,
+        'cs_flag': cs_flag,
+        'haloid': rng.integers(85775, 1710852, num_gals),
+        'halo_ngal': rng.integers(1, 10, num_gals),
+        'M_r': M_r,
+        'dist_c': rng.uniform(0, 1.6, num_gals),
+        'morph': np.where(u_r > 1.8, 'E', 'S'),
+        'rmag': M_r + 34.,
+        'umag': M_r + 34. + u_r,
+        'logmstar': logmstar,
+        'fsmgr': rng.uniform(0.003, 15, num_gals),
+        'mhi': 10**(logmstar + rng.normal(-0.5, 0.4, num_gals)),
+        'survey_flag': np.ones(num_gals, dtype=np.int64),
+        'u_r': u_r,
+        'r_dist': rng.uniform(21, 85, num_gals),
+        'ra': rng.uniform(130., 237., num_gals),
+        'dec': rng.uniform(-1., 50., num_gals),
+        'cz': rng.uniform(min_cz, max_cz, num_gals),
+        'cz_nodist': rng.uniform(min_cz - 800, max_cz + 1500, num_gals),
+        'vel_tot': rng.uniform(16, 2350, num_gals),
+        'vel_tan': rng.uniform(1, 2200, num_gals),
+        'groupid': groupid,
+        'M_group': loghalom + rng.normal(0, 0.1, num_gals),
+        'g_ngal': rng.integers(1, 20, num_gals),
+        'g_galtype': cs_flag,
+        'halo_rvir': rng.uniform(0.06, 1.6, num_gals),
+    })
+    return mock_pd
+
+def synthetic_data_catalog(num_gals, rng):
+    """
+    Synthetic survey catalog with the columns of eco_all.csv used by the
+    analysis
+
+    Parameters
+    ----------
+    num_gals: int
+        Number of galaxies
+
+    rng: numpy.random.Generator
+        Random number generator
+
+    Returns
+    ---------
+    catl: pandas.DataFrame
+        Survey catalog
+    """
+    mock_pd = synthetic_mock_catalog(num_gals, rng, 2530, 7470)
+    catl = pd.DataFrame({
+        'name': np.array(['ECO{0:05d}'.format(idx) for idx in
+            range(num_gals)]),
+        'radeg': mock_pd.ra.values,
+        'dedeg': mock_pd.dec.values,
+        'cz': mock_pd.cz.values,
+        'grpcz': mock_pd.cz.values + rng.normal(0, 50, num_gals),
+        'absrmag': mock_pd.M_r.values,
+        'logmstar': mock_pd.logmstar.values,
+        'logmgas': np.log10(1.4 * mock_pd.mhi.values),
+        'grp': mock_pd.groupid.values,
+        'grpn': mock_pd.g_ngal.values,
+        'logmh': mock_pd.M_group.values,
+        'logmh_s': mock_pd.M_group.values,
+        'fc': mock_pd.cs_flag.values,
+        'grpmb': mock_pd.logmstar.values + 0.2,
+        'grpms': mock_pd.logmstar.values,
+        'modelu_rcorr': mock_pd.u_r.values,
+    })
+    return catl
+
+def write_mock_suite(path, survey_def, num_gals, rng, num_boxes=8):
+    """
+    Writes synthetic mocks with the directory layout of data/mocks/m200b
+
+    Parameters
+    ----------
+    path: string
+        Directory to write boxes to
+
+    survey_def: SurveyDefinition
+        Survey definition giving mock names and counts
+
+    num_gals: int
+        Number of galaxies per mock
+
+    rng: numpy.random.Generator
+        Random number generator
+
+    num_boxes: int, optional
+        Number of boxes starting at 5001
+
+    Returns
+    ---------
+    num_files: int
+        Number of mock files written
+    """
+    num_files = 0
+    for box in range(5001, 5001 + num_boxes):
+        box_path = os.path.join(path, survey_def.mock_dir(box))
+        os.makedirs(box_path, exist_ok=True)
+        for num in range(survey_def.num_mocks):
+            mock_pd = synthetic_mock_catalog(num_gals, rng,
+                survey_def.min_cz, survey_def.max_cz)
+            mock_pd.to_hdf(os.path.join(box_path,
+                survey_def.mock_filename(num)), key='gal_catl', mode='w')
+            num_files += 1
+    return num_files
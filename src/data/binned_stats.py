@@ -0,0 +1,233 @@
+"""
+{This module computes binned statistics of y in bins of x (e.g. stellar mass
+ in bins of halo mass for the SMHM relation) for many draws at once. All draws
+ are sorted together by (draw, bin, y) and every statistic is read off the
+ sorted segments, so a posterior sample or a suite of mocks reduces to one
+ compact band array}
+"""
+
+# Libs
+import numpy as np
+
+__author__ = '{Mehnaaz Asad}'
+
+# Rows of the stats array returned by binned_stats and binned_stats_batch
+STATS = ('count', 'mean', 'std', 'std_err', 'p16', 'median', 'p84')
+PERCENTILES = (16, 50, 84)
+
+
+def base_bins(x_min, x_max, base):
+    """
+    Bin edges of width base aligned to multiples of base
+
+    Parameters
+    ----------
+    x_min, x_max: float
+        Range to cover
+
+    base: float
+        Bin width
+
+    Returns
+    ---------
+    bins: array
+        Array of bin edges covering x_min to x_max
+    """
+    edge_min = np.floor(x_min / base) * base
+    edge_max = np.ceil(x_max / base) * base
+    return np.arange(edge_min, edge_max + 0.5 * base, base)
+
+def binned_stats_batch(x_arr, y_arr, bins, min_count=1):
+    """
+    Binned statistics of many draws on shared bins in one pass
+
+    Parameters
+    ----------
+    x_arr: list of arrays
+        Values that are binned (e.g. halo masses) of each draw
+
+    y_arr: list of arrays
+        Values whose statistics are measured (e.g. stellar masses) of each
+        draw. Non-finite values are ignored.
+
+    bins: array
+        Array of bin edges shared by all draws. The last bin includes its
+        right edge.
+
+    min_count: int, optional
+        Bins with fewer objects have NaN statistics
+
+    Returns
+    ---------
+    stats_arr: array
+        Array of shape (number of draws, len(STATS), number of bins). Rows
+        are count, mean, std, std_err (std / sqrt(count)) and the 16th, 50th
+        and 84th percentiles of y per bin.
+    """
+    bins = np.asarray(bins, dtype=float)
+    num_bins = len(bins) - 1
+    num_draws = len(x_arr)
+    lengths = np.array([len(x) for x in x_arr])
+    x_all = np.concatenate([np.asarray(x, dtype=float) for x in x_arr]) \
+        if num_draws else np.empty(0)
+    y_all = np.concatenate([np.asarray(y, dtype=float) for y in y_arr]) \
+        if num_draws else np.empty(0)
+    draw_idx = np.repeat(np.arange(num_draws), lengths)
+
+    bin_idx = np.searchsorted(bins, x_all, side='right') - 1
+    bin_idx[x_all == bins[-1]] = num_bins - 1
+    keep = (bin_idx >= 0) & (bin_idx < num_bins) & np.isfinite(y_all)
+    key = draw_idx[keep] * num_bins + bin_idx[keep]
+    y_all = y_all[keep]
+    # Sort by segment then value so percentiles are positions in segments
+    order = np.lexsort((y_all, key))
+    key = key[order]
+    y_all = y_all[order]
+
+    size = num_draws * num_bins
+    count = np.bincount(key, minlength=size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.bincount(key, weights=y_all, minlength=size) / count
+        std = np.sqrt(np.bincount(key, weights=(y_all - mean[key])**2,
+            minlength=size) / count)
+        std_err = std / np.sqrt(count)
+
+    # Linear interpolation between order statistics as in np.percentile
+    starts = np.cumsum(count) - count
+    filled = count > 0
+    pctl_arr = np.full((len(PERCENTILES), size), np.nan)
+    for idx, pctl in enumerate(PERCENTILES):
+        pos = pctl / 100 * (count[filled] - 1)
+        lower = np.floor(pos).astype(int)
+        upper = np.minimum(lower + 1, count[filled] - 1)
+        frac = pos - lower
+        y_lower = y_all[starts[filled] + lower]
+        y_upper = y_all[starts[filled] + upper]
+        pctl_arr[idx, filled] = y_lower + frac * (y_upper - y_lower)
+
+    stats_arr = np.vstack([count, mean, std, std_err, pctl_arr])
+    stats_arr[1:, count < min_count] = np.nan
+    return stats_arr.reshape(len(STATS), num_draws, num_bins).\
+        transpose(1, 0, 2)
+
+def binned_stats(x, y, bins, min_count=1):
+    """
+    Binned statistics of a single draw
+
+    Returns
+    ---------
+    stats_arr: array
+        Array of shape (len(STATS), number of bins), see binned_stats_batch
+    """
+    return binned_stats_batch([x], [y], bins, min_count)[0]
+
+def stat_band(stats_arr, stat='mean', pctls=PERCENTILES):
+    """
+    Percentiles of one statistic across draws
+
+    Parameters
+    ----------
+    stats_arr: array
+        Output of binned_stats_batch
+
+    stat: string, optional
+        Name of statistic in STATS
+
+    pctls: tuple, optional
+        Percentiles across draws
+
+    Returns
+    ---------
+    band: array
+        Array of shape (len(pctls), number of bins). Bins empty in every draw
+        are NaN.
+    """
+    values = stats_arr[:, STATS.index(stat), :]
+    band = np.full((len(pctls), values.shape[1]), np.nan)
+    filled = np.any(np.isfinite(values), axis=0)
+    band[:, filled] = np.nanpercentile(values[:, filled], pctls, axis=0)
+    return band
+
+def nearest_bin(x, bin_centers):
+    """
+    Index of nearest bin centre
+
+    Parameters
+    ----------
+    x: array
+        Values to look up
+
+    bin_centers: array
+        Increasing bin centres
+
+    Returns
+    ---------
+    idx: array
+        Index into bin_centers of nearest centre to each value
+    """
+    x = np.asarray(x, dtype=float)
+    if len(bin_centers) == 1:
+        return np.zeros(len(x), dtype=int)
+    upper = np.clip(np.searchsorted(bin_centers, x), 1, len(bin_centers) - 1)
+    lower = upper - 1
+    closer_lower = (x - bin_centers[lower]) <= (bin_centers[upper] - x)
+    return np.where(closer_lower, lower, upper)
+
+def assign_from_bins(x_query, x_ref, y_ref, bins, stat='median', rng=None):
+    """
+    Assigns y to objects from the nearest non-empty bin of a reference sample
+    (e.g. data colours to mock galaxies by stellar mass)
+
+    Parameters
+    ----------
+    x_query: array
+        Values of objects that are assigned y
+
+    x_ref, y_ref: array
+        Reference sample. Non-finite y values are ignored.
+
+    bins: array
+        Array of bin edges
+
+    stat: string, optional
+        'mean' or 'median' assigns that statistic of the bin. 'sample'
+        assigns y of a random reference object in the bin, which keeps the
+        scatter of the reference sample.
+
+    rng: numpy.random.Generator, optional
+        Random number generator used when stat is 'sample'
+
+    Returns
+    ---------
+    y_query: array
+        Assigned value of each query object
+    """
+    x_ref = np.asarray(x_ref, dtype=float)
+    y_ref = np.asarray(y_ref, dtype=float)
+    num_bins = len(bins) - 1
+    bin_idx = np.searchsorted(bins, x_ref, side='right') - 1
+    bin_idx[x_ref == bins[-1]] = num_bins - 1
+    keep = (bin_idx >= 0) & (bin_idx < num_bins) & np.isfinite(y_ref)
+    count = np.bincount(bin_idx[keep], minlength=num_bins)
+    filled = np.flatnonzero(count)
+    if len(filled) == 0:
+        msg = 'No reference objects inside bins'
+        raise ValueError(msg)
+    bin_centers = 0.5 * (bins[1:] + bins[:-1])
+    query_bin = filled[nearest_bin(x_query, bin_centers[filled])]
+
+    if stat == 'sample':
+        if rng is None:
+            rng = np.random.default_rng()
+        order = np.argsort(bin_idx[keep], kind='stable')
+        y_sorted = y_ref[keep][order]
+        starts = np.cumsum(count) - count
+        pick = starts[query_bin] + (rng.random(len(query_bin)) *
+            count[query_bin]).astype(int)
+        return y_sorted[pick]
+    if stat not in ('mean', 'median'):
+        msg = '`stat` ({0}) not supported! Options: mean/median/sample'.\
+            format(stat)
+        raise ValueError(msg)
+    stats_arr = binned_stats(x_ref, y_ref, bins)
+    return stats_arr[STATS.index(stat)][query_bin]
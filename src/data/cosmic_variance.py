@@ -0,0 +1,260 @@
+"""
+{This module counts galaxies in sub-volumes of a survey to estimate cosmic
+ variance: equal-area declination slices, and RESOLVE-A/B shaped footprints
+ placed at every (or at random) position inside ECO. Galaxies are binned once
+ with np.searchsorted and np.bincount and footprint counts are read off a
+ summed-area table, so thousands of placements cost a few array lookups}
+"""
+
+# Libs
+import numpy as np
+
+__author__ = '{Mehnaaz Asad}'
+
+DEG2_IN_SPHERE = 41252.96 # deg^2
+
+
+def get_area_on_sphere(ra_min, ra_max, dec_min, dec_max):
+    """Calculate area on sphere given ra and dec in degrees"""
+    area = (ra_max-ra_min)* \
+        (np.rad2deg(np.sin(np.deg2rad(dec_max)))- \
+            np.rad2deg(np.sin(np.deg2rad(dec_min))))
+    return area
+
+def equal_area_dec_edges(ra_min, ra_max, dec_min, dec_max, dec_width):
+    """
+    Declination edges of slices with the same area as the first slice
+
+    Parameters
+    ----------
+    ra_min, ra_max: float
+        RA range of slices [deg]
+
+    dec_min, dec_max: float
+        Dec range to fill with slices [deg]. The last slice is truncated at
+        dec_max.
+
+    dec_width: float
+        Dec width of the first slice [deg]
+
+    Returns
+    ---------
+    dec_edges: array
+        Array of slice edges starting at dec_min and ending at dec_max
+    """
+    area = get_area_on_sphere(ra_min, ra_max, dec_min, dec_min + dec_width)
+    sin_min = np.sin(np.deg2rad(dec_min))
+    sin_max = np.sin(np.deg2rad(dec_max))
+    # Equal area slices are equally spaced in sin(dec)
+    sin_step = np.deg2rad(area / (ra_max - ra_min))
+    sin_edges = np.arange(sin_min, sin_max, sin_step)
+    dec_edges = np.append(np.rad2deg(np.arcsin(sin_edges)), dec_max)
+    return dec_edges
+
+def count_in_slices(dec_arr, dec_edges):
+    """
+    Counts galaxies in declination slices
+
+    Parameters
+    ----------
+    dec_arr: array
+        Dec of galaxies [deg], already restricted to the RA and cz range of
+        the slices
+
+    dec_edges: array
+        Increasing slice edges [deg]. Slices include their lower edge.
+
+    Returns
+    ---------
+    num_in_slice: array
+        Number of galaxies per slice
+    """
+    num_slices = len(dec_edges) - 1
+    slice_idx = np.searchsorted(dec_edges, dec_arr, side='right') - 1
+    inside = (slice_idx >= 0) & (slice_idx < num_slices)
+    return np.bincount(slice_idx[inside], minlength=num_slices)
+
+def shell_volume(min_cz, max_cz, H_0=70):
+    """Volume of full sky shell between two recession velocities [Mpc^3]"""
+    inner_vol = (4/3)*np.pi*((min_cz/H_0)**3)
+    outer_vol = (4/3)*np.pi*((max_cz/H_0)**3)
+    return outer_vol - inner_vol
+
+
+class Footprint(object):
+    """
+    Survey footprint made of RA/dec rectangles, stored relative to the lower
+    left corner of its bounding box in (RA, sin(dec)) so that moving it
+    around the sky keeps its area fixed
+    """
+    def __init__(self, rects):
+        """
+        Parameters
+        ----------
+        rects: list
+            List of (ra_min, ra_max, dec_min, dec_max) rectangles [deg]. RA
+            ranges crossing 0 are written continuously, e.g. (330, 405).
+        """
+        rects = np.atleast_2d(np.asarray(rects, dtype=float))
+        ra_lo = rects[:, 0]
+        ra_hi = rects[:, 1]
+        sin_lo = np.sin(np.deg2rad(rects[:, 2]))
+        sin_hi = np.sin(np.deg2rad(rects[:, 3]))
+        self.rects = np.column_stack([ra_lo - ra_lo.min(), ra_hi - ra_lo.min(),
+            sin_lo - sin_lo.min(), sin_hi - sin_lo.min()])
+
+    @property
+    def width(self):
+        """RA extent of bounding box [deg]"""
+        return self.rects[:, 1].max()
+
+    @property
+    def height(self):
+        """sin(dec) extent of bounding box"""
+        return self.rects[:, 3].max()
+
+    @property
+    def area(self):
+        """Area of footprint [deg^2]"""
+        return float(np.sum((self.rects[:, 1] -
+            self.rects[:, 0]) * np.rad2deg(self.rects[:, 3] -
+            self.rects[:, 2])))
+
+
+# RESOLVE-A spans 8.75h - 15.75h and 0 - 5 deg
+RESOLVE_A = Footprint([(131.25, 236.25, 0., 5.)])
+# RESOLVE-B spans 22h - 3h and -1.25 - 1.25 deg
+RESOLVE_B = Footprint([(330., 405., -1.25, 1.25)])
+
+
+class PlacementCounter(object):
+    """
+    Counts galaxies inside footprints placed anywhere inside a parent survey
+
+    Galaxies are binned once on a fine (RA, sin(dec)) grid and the counts
+    are turned into a summed-area table. Footprints are snapped to the grid
+    so each count is exact for the snapped footprint and costs four lookups
+    per rectangle.
+    """
+    def __init__(self, ra_arr, dec_arr, ra_range, dec_range, ra_step=0.25,
+        dec_step=0.25):
+        """
+        Parameters
+        ----------
+        ra_arr, dec_arr: array
+            Coordinates of galaxies in parent survey [deg], already restricted
+            to the cz range of the sub-volumes
+
+        ra_range, dec_range: tuple
+            Bounds of parent survey [deg]
+
+        ra_step: float, optional
+            Grid step in RA [deg]
+
+        dec_step: float, optional
+            Grid step in dec at the equator [deg]
+        """
+        sin_range = np.sin(np.deg2rad(dec_range))
+        num_ra = int(np.floor((ra_range[1] - ra_range[0]) / ra_step))
+        self.sin_step = np.deg2rad(dec_step)
+        num_sin = int(np.floor((sin_range[1] - sin_range[0]) / self.sin_step))
+        self.ra_step = ra_step
+        self.ra_edges = ra_range[0] + ra_step * np.arange(num_ra + 1)
+        self.sin_edges = sin_range[0] + self.sin_step * np.arange(num_sin + 1)
+
+        ra_idx = np.searchsorted(self.ra_edges, ra_arr, side='right') - 1
+        sin_idx = np.searchsorted(self.sin_edges,
+            np.sin(np.deg2rad(dec_arr)), side='right') - 1
+        inside = (ra_idx >= 0) & (ra_idx < num_ra) & (sin_idx >= 0) & \
+            (sin_idx < num_sin)
+        grid = np.bincount(ra_idx[inside] * num_sin + sin_idx[inside],
+            minlength=num_ra * num_sin).reshape(num_ra, num_sin)
+        # Summed-area table padded with a leading row and column of zeros
+        self.table = np.zeros((num_ra + 1, num_sin + 1), dtype=np.int64)
+        self.table[1:, 1:] = grid.cumsum(axis=0).cumsum(axis=1)
+
+    def snap(self, footprint):
+        """Footprint rectangles in grid cells and snapped area [deg^2]"""
+        cells = np.column_stack([
+            np.round(footprint.rects[:, :2] / self.ra_step),
+            np.round(footprint.rects[:, 2:] / self.sin_step)]).astype(int)
+        area = float(np.sum(self.ra_step *
+            (cells[:, 1] - cells[:, 0]) * np.rad2deg(self.sin_step) *
+            (cells[:, 3] - cells[:, 2])))
+        return cells, area
+
+    def all_placements(self, footprint):
+        """
+        Every grid position at which footprint lies inside parent survey
+
+        Returns
+        ---------
+        offsets: array
+            Array of shape (number of placements, 2) of lower left corners in
+            grid cells
+        """
+        cells, _ = self.snap(footprint)
+        num_ra = self.table.shape[0] - 1 - cells[:, 1].max()
+        num_sin = self.table.shape[1] - 1 - cells[:, 3].max()
+        if num_ra < 0 or num_sin < 0:
+            msg = 'Footprint does not fit inside parent survey'
+            raise ValueError(msg)
+        ra_off, sin_off = np.meshgrid(np.arange(num_ra + 1),
+            np.arange(num_sin + 1), indexing='ij')
+        return np.column_stack([ra_off.ravel(), sin_off.ravel()])
+
+    def random_placements(self, footprint, num, rng):
+        """Random sample of `num` placements (with replacement)"""
+        offsets = self.all_placements(footprint)
+        return offsets[rng.integers(0, len(offsets), num)]
+
+    def count(self, footprint, offsets):
+        """
+        Number of galaxies in footprint at each placement
+
+        Parameters
+        ----------
+        footprint: Footprint
+            Footprint to place
+
+        offsets: array
+            Array of shape (number of placements, 2) of lower left corners in
+            grid cells
+
+        Returns
+        ---------
+        counts: array
+            Number of galaxies per placement
+        """
+        cells, _ = self.snap(footprint)
+        offsets = np.atleast_2d(offsets)
+        counts = np.zeros(len(offsets), dtype=np.int64)
+        for ra0, ra1, sin0, sin1 in cells:
+            i0 = offsets[:, 0] + ra0
+            i1 = offsets[:, 0] + ra1
+            j0 = offsets[:, 1] + sin0
+            j1 = offsets[:, 1] + sin1
+            counts += self.table[i1, j1] - self.table[i0, j1] - \
+                self.table[i1, j0] + self.table[i0, j0]
+        return counts
+
+    def cosmic_variance(self, footprint, offsets, min_cz, max_cz):
+        """
+        Fractional scatter of number density between placements
+
+        Overlapping placements are not independent so this is a smoothed
+        estimate of the variance between independent sub-volumes.
+
+        Returns
+        ---------
+        cvar: float
+            Standard deviation over mean of number density
+
+        gal_dens_arr: array
+            Number density of each placement [Mpc^-3]
+        """
+        _, area = self.snap(footprint)
+        volume = (area / DEG2_IN_SPHERE) * shell_volume(min_cz, max_cz)
+        gal_dens_arr = self.count(footprint, offsets) / volume
+        cvar = np.std(gal_dens_arr) / np.mean(gal_dens_arr)
+        return cvar, gal_dens_arr
@@ -0,0 +1,118 @@
+"""
+{This module estimates errors of a measurement (e.g. SMF or BMF) from a stack
+ of mocks: per-bin scatter, fractional errors of the mean and of each mock,
+ errors scaled to data, and a shrinkage covariance matrix that stays well
+ conditioned for small numbers of mocks}
+"""
+
+# Libs
+import numpy as np
+
+__author__ = '{Mehnaaz Asad}'
+
+
+def ensemble_errors(phi_arr):
+    """
+    Per-bin scatter and fractional errors of a stack of mocks
+
+    Parameters
+    ----------
+    phi_arr: array
+        Array of shape (number of mocks, number of bins)
+
+    Returns
+    ---------
+    std: array
+        Standard deviation of each bin between all mocks
+
+    mean: array
+        Mean of each bin over all mocks
+
+    frac_err: array
+        Array of shape (number of mocks, number of bins) of fractional error
+        of each bin of each mock (std / phi)
+
+    frac_err_mean: array
+        Fractional error on the mean of all mocks per bin (std / mean)
+    """
+    phi_arr = np.asarray(phi_arr, dtype=float)
+    std = np.std(phi_arr, axis=0)
+    mean = np.mean(phi_arr, axis=0)
+    # Empty bins give inf/nan fractional errors as before
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frac_err = std / phi_arr
+        frac_err_mean = std / mean
+    return std, mean, frac_err, frac_err_mean
+
+def sigma_from_frac(frac_err, phi_data):
+    """
+    Scales fractional errors to data
+
+    Parameters
+    ----------
+    frac_err: array
+        Fractional errors of shape (number of bins,) for the mean or
+        (number of mocks, number of bins) for each mock
+
+    phi_data: array
+        Data value per bin
+
+    Returns
+    ---------
+    sigma: array
+        Errors with the same shape as frac_err
+    """
+    return np.asarray(frac_err) * np.asarray(phi_data)
+
+def shrinkage_covariance(phi_arr):
+    """
+    Covariance matrix with correlations shrunk towards zero by the optimal
+    (Schafer & Strimmer 2005, target D) amount. The sample covariance of a
+    few tens of mocks is noisy and can be close to singular, the shrunk one
+    keeps the sample variances and is positive definite whenever the
+    intensity is above 0 and every bin has scatter. An estimated intensity
+    of 0 returns the sample covariance, which is singular if there are no
+    more mocks than bins.
+
+    Parameters
+    ----------
+    phi_arr: array
+        Array of shape (number of mocks, number of bins)
+
+    Returns
+    ---------
+    cov_mat: array
+        Shrunk covariance matrix of shape (number of bins, number of bins)
+
+    shrinkage: float
+        Shrinkage intensity between 0 (sample covariance) and 1 (diagonal)
+    """
+    phi_arr = np.asarray(phi_arr, dtype=float)
+    num_mocks = phi_arr.shape[0]
+    if num_mocks < 3:
+        msg = 'Need at least 3 mocks to estimate shrinkage, got {0}'.format(
+            num_mocks)
+        raise ValueError(msg)
+    stddev = np.std(phi_arr, axis=0, ddof=1)
+    # Standardized data, bins without scatter do not contribute
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std_arr = (phi_arr - phi_arr.mean(axis=0)) / stddev
+    std_arr[:, stddev == 0] = 0
+
+    # Sample correlation matrix and variance of each of its elements
+    w_arr = std_arr[:, :, None] * std_arr[:, None, :]
+    w_mean = w_arr.mean(axis=0)
+    corr_mat = w_mean * num_mocks / (num_mocks - 1)
+    corr_var = num_mocks / (num_mocks - 1)**3 * \
+        ((w_arr - w_mean)**2).sum(axis=0)
+
+    off_diag = ~np.eye(corr_mat.shape[0], dtype=bool)
+    denom = (corr_mat[off_diag]**2).sum()
+    if denom > 0:
+        shrinkage = float(np.clip(corr_var[off_diag].sum() / denom, 0, 1))
+    else:
+        shrinkage = 0.
+    corr_shrunk = (1 - shrinkage) * corr_mat
+    np.fill_diagonal(corr_shrunk, 1)
+    cov_mat = corr_shrunk * np.outer(stddev, stddev)
+    return cov_mat, shrinkage
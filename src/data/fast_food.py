@@ -0,0 +1,148 @@
+"""
+{This module reads the fast-food binary halo/galaxy files written by the mock
+ pipeline. The header is parsed once and every column is exposed as a
+ read-only np.memmap at its offset in the file, so counting galaxies or
+ reading a single column never reads the rest of the file}
+"""
+
+# Built-in/Generic Imports
+import os
+
+# Libs
+import numpy as np
+
+__author__ = '{Mehnaaz Asad}'
+
+# Types used by cosmo_utils.utils.file_readers.fast_food_reader
+DTYPES = {
+    'int': np.int32,
+    'float': np.float32,
+    'double': np.float64,
+    'long': np.int64,
+}
+
+# Header records (name, type, number of items)
+HEADER = (('idat', 'int', 5), ('fdat', 'float', 9), ('znow', 'float', 1))
+
+# Columns following the header, each of length ngal
+COLUMNS = (
+    ('x', 'float'), ('y', 'float'), ('z', 'float'),
+    ('vx', 'float'), ('vy', 'float'), ('vz', 'float'),
+    ('halom', 'double'), ('cs_flag', 'int'), ('haloid', 'long'),
+)
+
+# Every record is wrapped in 4 byte Fortran markers holding its size in bytes
+MARKER_SIZE = 4
+
+
+def _record_size(dtype_str, nitems):
+    """Size of a record including both markers in bytes"""
+    return 2 * MARKER_SIZE + nitems * np.dtype(DTYPES[dtype_str]).itemsize
+
+def _byteorder(filename):
+    """Detects byte order of file from the marker of the first record"""
+    expected = HEADER[0][2] * np.dtype(DTYPES[HEADER[0][1]]).itemsize
+    marker = np.fromfile(filename, dtype=np.int32, count=1)
+    if len(marker) == 0:
+        msg = '`filename`: {0} is empty'.format(filename)
+        raise ValueError(msg)
+    if marker[0] == expected:
+        return '<' if np.little_endian else '>'
+    if marker.byteswap()[0] == expected:
+        return '>' if np.little_endian else '<'
+    msg = '`filename`: {0} is not a fast-food file'.format(filename)
+    raise ValueError(msg)
+
+def read_header(filename):
+    """
+    Reads only the header records of a fast-food file
+
+    Parameters
+    ----------
+    filename: string
+        Path to fast-food file
+
+    Returns
+    ---------
+    header: dict
+        idat, fdat and znow records together with the derived number of
+        galaxies `ngal`, box size `lbox` and byte order
+    """
+    if not os.path.exists(filename):
+        msg = '`filename`: {0} NOT FOUND! Exiting..'.format(filename)
+        raise ValueError(msg)
+    byteorder = _byteorder(filename)
+    header = {'byteorder': byteorder}
+    with open(filename, 'rb') as infile:
+        for name, dtype_str, nitems in HEADER:
+            dtype = np.dtype(DTYPES[dtype_str]).newbyteorder(byteorder)
+            infile.seek(MARKER_SIZE, os.SEEK_CUR)
+            header[name] = np.fromfile(infile, dtype=dtype, count=nitems)
+            infile.seek(MARKER_SIZE, os.SEEK_CUR)
+    header['znow'] = float(header['znow'][0])
+    header['ngal'] = int(header['idat'][1])
+    header['lbox'] = int(header['fdat'][0])
+    return header
+
+
+class FastFoodFile(object):
+    """
+    Zero-copy view of a fast-food file
+
+    Examples
+    --------
+    >>> ff = FastFoodFile('5001_ff.dat')
+    >>> ff.ngal / ff.lbox**3
+    >>> halom = ff['halom']
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.header = read_header(filename)
+        self.ngal = self.header['ngal']
+        self.lbox = self.header['lbox']
+        self.znow = self.header['znow']
+        self.offsets = {}
+        offset = sum(_record_size(dtype_str, nitems) for _, dtype_str, nitems
+            in HEADER)
+        for name, dtype_str in COLUMNS:
+            # Data starts after the leading marker of the record
+            self.offsets[name] = offset + MARKER_SIZE
+            offset += _record_size(dtype_str, self.ngal)
+        file_size = os.path.getsize(filename)
+        if file_size < offset:
+            msg = '`filename`: {0} is truncated ({1} bytes, expected {2})'.\
+                format(filename, file_size, offset)
+            raise ValueError(msg)
+
+    @property
+    def columns(self):
+        """Names of columns in file"""
+        return [name for name, _ in COLUMNS]
+
+    def column(self, name):
+        """
+        Memory maps a single column
+
+        Parameters
+        ----------
+        name: string
+            Name of column
+
+        Returns
+        ---------
+        arr: np.memmap
+            Read-only array of length ngal
+        """
+        dtypes = dict(COLUMNS)
+        if name not in dtypes:
+            msg = '`name` ({0}) not a fast-food column. Options: {1}'.format(
+                name, self.columns)
+            raise KeyError(msg)
+        dtype = np.dtype(DTYPES[dtypes[name]]).newbyteorder(
+            self.header['byteorder'])
+        arr = np.memmap(self.filename, dtype=dtype, mode='r',
+            offset=self.offsets[name], shape=(self.ngal,))
+        return arr
+
+    def __getitem__(self, name):
+        return self.column(name)
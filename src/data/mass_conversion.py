@@ -0,0 +1,141 @@
+"""
+{This module converts log masses without leaving log space: gas masses from
+ HI, baryonic masses as a stable base-10 logaddexp of stellar and gas masses,
+ and the h=0.7 to h=1 change as a constant offset. Every function can write
+ into a preallocated buffer and keeps float32 columns in float32}
+"""
+
+# Libs
+import numpy as np
+
+from src.data.surveys import LOG_H_CONVERSION
+
+__author__ = '{Mehnaaz Asad}'
+
+LN10 = np.log(10)
+# Helium correction of HI masses
+HE_CORRECTION = 1.4
+LOG_HE_CORRECTION = np.log10(HE_CORRECTION)
+
+
+def _buffer(out, *arrays):
+    """Output array of the broadcast shape and float dtype of arrays"""
+    if out is not None:
+        return out
+    arrays = [np.asarray(array) for array in arrays]
+    dtype = np.result_type(np.float32, *arrays)
+    return np.empty(np.broadcast(*arrays).shape, dtype=dtype)
+
+def to_h1(logmass_arr, out=None):
+    """
+    Changes log masses from h=0.7 to h=1 assuming h^-2 dependence
+
+    Parameters
+    ----------
+    logmass_arr: array
+        Array of masses in h=0.7 [log Msun]
+
+    out: array, optional
+        Output array. May be logmass_arr itself.
+
+    Returns
+    ---------
+    logmass_arr: array
+        Array of masses in h=1 [log Msun/h]
+    """
+    out = _buffer(out, logmass_arr)
+    return np.subtract(logmass_arr, LOG_H_CONVERSION, out=out,
+        casting='same_kind')
+
+def log_gas_mass(mhi_arr, out=None):
+    """
+    Log gas masses, HI masses corrected for helium
+
+    Parameters
+    ----------
+    mhi_arr: array
+        Array of HI masses [Msun]
+
+    out: array, optional
+        Output array. May be mhi_arr itself.
+
+    Returns
+    ---------
+    logmgas_arr: array
+        Array of gas masses [log Msun]
+    """
+    out = _buffer(out, mhi_arr)
+    with np.errstate(divide='ignore'):
+        np.log10(mhi_arr, out=out)
+    out += LOG_HE_CORRECTION
+    return out
+
+def log_bary_mass(logmstar_arr, logmgas_arr, h1_shift=False, out=None):
+    """
+    Log baryonic masses log10(10**logmstar + 10**logmgas) computed as the
+    base-10 logaddexp max + log10(1 + 10**-|logmgas - logmstar|), which
+    cannot overflow and needs a single scratch array. This is faster than
+    both the 10** round trip and np.logaddexp.
+
+    Parameters
+    ----------
+    logmstar_arr: array
+        Array of stellar masses [log Msun]
+
+    logmgas_arr: array
+        Array of gas masses [log Msun]. Galaxies without gas (-inf) get their
+        stellar mass.
+
+    h1_shift: boolean, optional
+        True changes the result from h=0.7 to h=1
+
+    out: array, optional
+        Output array. May be logmgas_arr itself but not logmstar_arr.
+
+    Returns
+    ---------
+    logmbary_arr: array
+        Array of baryonic masses [log Msun, or log Msun/h if h1_shift]
+    """
+    out = _buffer(out, logmstar_arr, logmgas_arr)
+    np.subtract(logmgas_arr, logmstar_arr, out=out, casting='same_kind')
+    # Gas excess over stellar mass where gas dominates
+    excess = np.maximum(out, 0)
+    np.abs(out, out=out)
+    out *= -LN10
+    np.exp(out, out=out)
+    np.log1p(out, out=out)
+    out /= LN10
+    out += excess
+    out += logmstar_arr
+    if h1_shift:
+        out -= LOG_H_CONVERSION
+    return out
+
+def mock_log_bary_mass(logmstar_arr, mhi_arr, h1_shift=True, out=None):
+    """
+    Log baryonic masses of mock galaxies from stellar and HI masses in a
+    single buffer
+
+    Parameters
+    ----------
+    logmstar_arr: array
+        Array of stellar masses in h=0.7 [log Msun]
+
+    mhi_arr: array
+        Array of HI masses in h=0.7 [Msun]
+
+    h1_shift: boolean, optional
+        True changes the result from h=0.7 to h=1
+
+    out: array, optional
+        Output array. May be mhi_arr itself but not logmstar_arr.
+
+    Returns
+    ---------
+    logmbary_arr: array
+        Array of baryonic masses [log Msun/h if h1_shift]
+    """
+    out = _buffer(out, logmstar_arr, mhi_arr)
+    log_gas_mass(mhi_arr, out=out)
+    return log_bary_mass(logmstar_arr, out, h1_shift, out=out)
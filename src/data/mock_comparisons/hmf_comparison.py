@@ -12,6 +12,8 @@ import pandas as pd
 import numpy as np
 import math
 
+from src.data.number_density import cumu_num_dens
+
 def num_bins(data_arr):
     q75, q25 = np.percentile(data_arr, [75 ,25])
     iqr = q75 - q25
@@ -20,23 +22,6 @@ def num_bins(data_arr):
     n_bins = math.ceil((max(data_arr)-min(data_arr))/h) #Round up number   
     return n_bins
 
-def cumu_num_dens(data,nbins,weights,volume,bool_mag):
-    if weights is None:
-        weights = np.ones(len(data))
-    else:
-        weights = np.array(weights)
-    #Unnormalized histogram and bin edges
-    freq,edg = np.histogram(data,bins=nbins,weights=weights)
-    bin_centers = 0.5*(edg[1:]+edg[:-1])
-    bin_width = edg[1] - edg[0]
-    if not bool_mag:
-        N_cumu = np.cumsum(freq[::-1])[::-1] 
-    else:
-        N_cumu = np.cumsum(freq)
-    n_cumu = N_cumu/volume
-    err_poiss = np.sqrt(N_cumu)/volume
-    return bin_centers,edg,n_cumu,err_poiss,bin_width
-
 rc('font',**{'family':'sans-serif','sans-serif':['Helvetica']},size=18)
 rc('text', usetex=True)
 
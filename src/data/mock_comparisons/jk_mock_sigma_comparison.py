@@ -6,6 +6,7 @@
 # Libs
 from cosmo_utils.utils.stats_funcs import Stats_one_arr
 from cosmo_utils.utils import work_paths as cwpaths
+from src.data.surveys import get_survey, mock_mask, measure_mf
 import matplotlib.pyplot as plt
 from random import randint
 from matplotlib import cm
@@ -127,30 +128,10 @@ def diff_smf(mstar_arr, volume, h1_bool):
     else:
         logmstar_arr = mstar_arr
 
-    if survey == 'eco' or survey == 'resolvea':
-        bin_min = np.round(np.log10((10**8.9) / 2.041), 1)
-        if survey == 'eco':
-            bin_max = np.round(np.log10((10**11.8) / 2.041), 1)
-        elif survey == 'resolvea':
-            bin_max = np.round(np.log10((10**11.5) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)
-    elif survey == 'resolveb':
-        bin_min = np.round(np.log10((10**8.7) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.3) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)   
-
-    # Unnormalized histogram and bin edges
-    counts, edg = np.histogram(logmstar_arr, bins=bins)  # paper used 17 bins
-    dm = edg[1] - edg[0]  # Bin width
-    maxis = 0.5 * (edg[1:] + edg[:-1])  # Mass axis i.e. bin centers
-    # Normalized to volume and bin width
-    err_poiss = np.sqrt(counts) / (volume * dm)
-    err_tot = err_poiss
-
-    phi = counts / (volume * dm)  # not a log quantity
+    bins = get_survey(survey).bins('smf')
+    maxis, phi, err_tot, counts = measure_mf(logmstar_arr, volume, bins)
     phi = np.log10(phi)
-    # print(counts)
-    # print(phi)
+
     return maxis, phi, err_tot, bins, counts
 
 def calc_bary(logmstar_arr, logmgas_arr):
@@ -195,23 +176,8 @@ def diff_bmf(mass_arr, volume, h1_bool):
         logmbary_arr = np.log10((10**mass_arr) / 2.041)
     else:
         logmbary_arr = np.log10(mass_arr)
-    if survey == 'eco' or survey == 'resolvea':
-        bin_min = np.round(np.log10((10**9.4) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.8) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)
-    elif survey == 'resolveb':
-        bin_min = np.round(np.log10((10**9.1) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.3) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)
-    # Unnormalized histogram and bin edges
-    counts, edg = np.histogram(logmbary_arr, bins=bins)  # paper used 17 bins
-    dm = edg[1] - edg[0]  # Bin width
-    maxis = 0.5 * (edg[1:] + edg[:-1])  # Mass axis i.e. bin centers
-    # Normalized to volume and bin width
-    err_poiss = np.sqrt(counts) / (volume * dm)
-    err_tot = err_poiss
-
-    phi = counts / (volume * dm)  # not a log quantity
+    bins = get_survey(survey).bins('bmf')
+    maxis, phi, err_tot, counts = measure_mf(logmbary_arr, volume, bins)
     phi = np.log10(phi)
 
     return maxis, phi, err_tot, bins, counts
@@ -237,30 +203,10 @@ def get_std_phi_mocks(survey, path, mf_type):
         Standard deviation of phi values between all mocks and for blue galaxies
     """
 
-    if survey == 'eco':
-        mock_name = 'ECO'
-        num_mocks = 8
-        min_cz = 3000
-        max_cz = 7000
-        mag_limit = -17.33
-        mstar_limit = 8.9
-        volume = 151829.26 # Survey volume without buffer [Mpc/h]^3
-    elif survey == 'resolvea':
-        mock_name = 'A'
-        num_mocks = 59
-        min_cz = 4500
-        max_cz = 7000
-        mag_limit = -17.33
-        mstar_limit = 8.9
-        volume = 13172.384  # Survey volume without buffer [Mpc/h]^3 
-    elif survey == 'resolveb':
-        mock_name = 'B'
-        num_mocks = 104
-        min_cz = 4500
-        max_cz = 7000
-        mag_limit = -17
-        mstar_limit = 8.7
-        volume = 4709.8373  # Survey volume without buffer [Mpc/h]^3
+    survey_def = get_survey(survey)
+    mock_name = survey_def.mock_name
+    num_mocks = survey_def.num_mocks
+    volume = survey_def.volume # Survey volume without buffer [Mpc/h]^3
 
     phi_arr_total = []
     max_arr_total = []
@@ -276,17 +222,12 @@ def get_std_phi_mocks(survey, path, mf_type):
         # Using the same survey definition as in mcmc mf i.e excluding the 
         # buffer
         if mf_type == 'smf':
-            mock_pd = mock_pd.loc[(mock_pd.cz.values >= min_cz) & \
-                (mock_pd.cz.values <= max_cz) & \
-                (mock_pd.M_r.values <= mag_limit) & \
-                (mock_pd.logmstar.values >= mstar_limit)]
+            mock_pd = mock_pd.loc[mock_mask(mock_pd, survey_def, 'smf')]
             logmstar_arr = mock_pd.logmstar.values
             mass_arr = logmstar_arr
 
         elif mf_type == 'bmf':
-            mock_pd = mock_pd.loc[(mock_pd.cz.values >= min_cz) & \
-                (mock_pd.cz.values <= max_cz) & \
-                (mock_pd.M_r.values <= mag_limit)]
+            mock_pd = mock_pd.loc[mock_mask(mock_pd, survey_def, 'bmf')]
             logmstar_arr = mock_pd.logmstar.values
             mhi_arr = mock_pd.mhi.values
             logmgas_arr = np.log10(1.4 * mhi_arr)
@@ -386,30 +327,10 @@ def get_jk_mocks(survey, path, mf_type, data_catl):
         Standard deviation of phi values between all mocks and for blue galaxies
     """
 
-    if survey == 'eco':
-        mock_name = 'ECO'
-        num_mocks = 8
-        min_cz = 3000
-        max_cz = 7000
-        mag_limit = -17.33
-        mstar_limit = 8.9
-        volume = 151829.26 # Survey volume without buffer [Mpc/h]^3
-    elif survey == 'resolvea':
-        mock_name = 'A'
-        num_mocks = 59
-        min_cz = 4500
-        max_cz = 7000
-        mag_limit = -17.33
-        mstar_limit = 8.9
-        volume = 13172.384  # Survey volume without buffer [Mpc/h]^3 
-    elif survey == 'resolveb':
-        mock_name = 'B'
-        num_mocks = 104
-        min_cz = 4500
-        max_cz = 7000
-        mag_limit = -17
-        mstar_limit = 8.7
-        volume = 4709.8373  # Survey volume without buffer [Mpc/h]^3
+    survey_def = get_survey(survey)
+    mock_name = survey_def.mock_name
+    num_mocks = survey_def.num_mocks
+    volume = survey_def.volume # Survey volume without buffer [Mpc/h]^3
 
     stddev_jk_arr = []
     err_total_arr = []
@@ -419,10 +340,7 @@ def get_jk_mocks(survey, path, mf_type, data_catl):
             filename = path + '{0}_cat_{1}_Planck_memb_cat.hdf5'.format(
                 mock_name, num)
             mock_pd = reading_catls(filename) 
-            mock_pd = mock_pd.loc[(mock_pd.cz.values >= min_cz) & \
-                (mock_pd.cz.values <= max_cz) & \
-                (mock_pd.M_r.values <= mag_limit) & \
-                (mock_pd.logmstar.values >= mstar_limit)]
+            mock_pd = mock_pd.loc[mock_mask(mock_pd, survey_def, 'smf')]
             print(len(mock_pd))
 
             if survey == 'resolveb':
@@ -539,17 +457,12 @@ def get_jk_mocks(survey, path, mf_type, data_catl):
             # Using the same survey definition as in mcmc smf i.e excluding the 
             # buffer
             if mf_type == 'smf':
-                mock_pd = mock_pd.loc[(mock_pd.cz.values >= min_cz) & \
-                    (mock_pd.cz.values <= max_cz) & \
-                    (mock_pd.M_r.values <= mag_limit) & \
-                    (mock_pd.logmstar.values >= mstar_limit)]
+                mock_pd = mock_pd.loc[mock_mask(mock_pd, survey_def, 'smf')]
                 logmstar_arr = mock_pd.logmstar.values
                 mass_arr = logmstar_arr
 
             elif mf_type == 'bmf':
-                mock_pd = mock_pd.loc[(mock_pd.cz.values >= min_cz) & \
-                    (mock_pd.cz.values <= max_cz) & \
-                    (mock_pd.M_r.values <= mag_limit)]
+                mock_pd = mock_pd.loc[mock_mask(mock_pd, survey_def, 'bmf')]
                 logmstar_arr = mock_pd.logmstar.values
                 mhi_arr = mock_pd.mhi.values
                 logmgas_arr = np.log10(1.4 * mhi_arr)
@@ -621,30 +534,10 @@ def get_sampled_err_data(survey, path, mf_type):
         Standard deviation of phi values between samples of 8 mocks
     """
 
-    if survey == 'eco':
-        mock_name = 'ECO'
-        num_mocks = 8
-        min_cz = 3000
-        max_cz = 7000
-        mag_limit = -17.33
-        mstar_limit = 8.9
-        volume = 151829.26 # Survey volume without buffer [Mpc/h]^3
-    elif survey == 'resolvea':
-        mock_name = 'A'
-        num_mocks = 59
-        min_cz = 4500
-        max_cz = 7000
-        mag_limit = -17.33
-        mstar_limit = 8.9
-        volume = 13172.384  # Survey volume without buffer [Mpc/h]^3 
-    elif survey == 'resolveb':
-        mock_name = 'B'
-        num_mocks = 104
-        min_cz = 4500
-        max_cz = 7000
-        mag_limit = -17
-        mstar_limit = 8.7
-        volume = 4709.8373  # Survey volume without buffer [Mpc/h]^3
+    survey_def = get_survey(survey)
+    mock_name = survey_def.mock_name
+    num_mocks = survey_def.num_mocks
+    volume = survey_def.volume # Survey volume without buffer [Mpc/h]^3
 
     phi_total_arr = []
     err_total_arr = []
@@ -658,17 +551,12 @@ def get_sampled_err_data(survey, path, mf_type):
             # Using the same survey definition as in mcmc smf i.e excluding the 
             # buffer
             if mf_type == 'smf':
-                mock_pd = mock_pd.loc[(mock_pd.cz.values >= min_cz) & \
-                    (mock_pd.cz.values <= max_cz) & \
-                    (mock_pd.M_r.values <= mag_limit) & \
-                    (mock_pd.logmstar.values >= mstar_limit)]
+                mock_pd = mock_pd.loc[mock_mask(mock_pd, survey_def, 'smf')]
                 logmstar_arr = mock_pd.logmstar.values
                 mass_arr = logmstar_arr
 
             elif mf_type == 'bmf':
-                mock_pd = mock_pd.loc[(mock_pd.cz.values >= min_cz) & \
-                    (mock_pd.cz.values <= max_cz) & \
-                    (mock_pd.M_r.values <= mag_limit)]
+                mock_pd = mock_pd.loc[mock_mask(mock_pd, survey_def, 'bmf')]
                 logmstar_arr = mock_pd.logmstar.values
                 mhi_arr = mock_pd.mhi.values
                 logmgas_arr = np.log10(1.4 * mhi_arr)
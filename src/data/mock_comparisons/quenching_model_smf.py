@@ -8,6 +8,7 @@ from halotools.empirical_models import PrebuiltSubhaloModelFactory
 from cosmo_utils.utils.stats_funcs import Stats_one_arr
 from cosmo_utils.utils import work_paths as cwpaths
 from halotools.sim_manager import CachedHaloCatalog
+from src.data.binned_stats import base_bins, assign_from_bins
 from collections import OrderedDict
 import matplotlib.pyplot as plt
 from matplotlib import rc
@@ -592,7 +593,7 @@ def assign_colour_label_data(catl):
 
     return catl
 
-def assign_colour_mock(gals_df, catl, stat):
+def assign_colour_mock(gals_df, catl, stat, rng=None):
     """
     Assign colour to mock catalog
 
@@ -604,7 +605,10 @@ def assign_colour_mock(gals_df, catl, stat):
         Data catalog
     stat: string
         Specify whether mean or median statistic is used to assign colour
-        from data to mock catalog
+        from data to mock catalog, or 'sample' to assign the colour of a
+        random data galaxy in the bin
+    rng: numpy.random.Generator, optional
+        Random number generator used when stat is 'sample'
 
     Returns
     ---------
@@ -618,25 +622,11 @@ def assign_colour_mock(gals_df, catl, stat):
     logmstar_arr_data = np.log10((10**logmstar_arr_data) / 2.041)
     u_r_arr_data = catl.modelu_rcorr.values
 
-    # Either assign the mean or median colour within each bin of stellar mass
-    if stat == 'mean':
-        x,y,x_err,y_err = Stats_one_arr(logmstar_arr_data, u_r_arr_data, 0.005, 
-        statfunc=np.nanmean)
-    elif stat == 'median':
-        x,y,x_err,y_err = Stats_one_arr(logmstar_arr_data, u_r_arr_data, 0.005, 
-        statfunc=np.nanmedian)       
-
-    # Assign mean or median colour based on which data bin the mock stellar mass
-    # falls in
-    colour_arr = np.zeros(len(gals_df))
-    for idx1, value1 in enumerate(logmstar_arr_mock):
-        colour = 0
-        for idx2, value2 in enumerate(x):
-            if value1 > value2:
-                colour = y[idx2]
-                break
-
-        colour_arr[idx1] = colour
+    # Assign mean or median colour (or a sampled colour) of the data bin of
+    # stellar mass nearest to each mock stellar mass
+    bins = base_bins(logmstar_arr_data.min(), logmstar_arr_data.max(), 0.005)
+    colour_arr = assign_from_bins(logmstar_arr_mock, logmstar_arr_data,
+        u_r_arr_data, bins, stat, rng)
     
     gals_df['modelu_rcorr'] = colour_arr
 
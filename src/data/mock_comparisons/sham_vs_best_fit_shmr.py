@@ -8,6 +8,8 @@ from halotools.empirical_models import PrebuiltSubhaloModelFactory
 from cosmo_utils.utils.stats_funcs import Stats_one_arr
 from halotools.sim_manager import CachedHaloCatalog
 from cosmo_utils.utils import work_paths as cwpaths
+from src.data.surveys import get_survey, mock_mask
+from src.data.number_density import cumu_num_dens as measure_cumu_num_dens
 from collections import OrderedDict
 from progressbar import ProgressBar
 from multiprocessing import Pool
@@ -226,23 +228,10 @@ def num_bins(data_arr):
     return n_bins
 
 def cumu_num_dens(data, bins, weights, volume, mag_bool, h1_bool):
-    if weights is None:
-        weights = np.ones(len(data))
-    else:
-        weights = np.array(weights)
     if not h1_bool:
         # changing from h=0.7 to h=1 assuming h^-2 dependence
         data = np.log10((10**data) / 2.041)
-    freq,edg = np.histogram(data, bins=bins, weights=weights)
-    bin_centers = 0.5*(edg[1:]+edg[:-1])
-    bin_width = edg[1] - edg[0]
-    if not mag_bool:
-        N_cumu = np.cumsum(freq[::-1])[::-1] 
-    else:
-        N_cumu = np.cumsum(freq)
-    n_cumu = N_cumu/volume
-    err_poiss = np.sqrt(N_cumu)/volume
-    return bin_centers,edg,n_cumu,err_poiss,bin_width
+    return measure_cumu_num_dens(data, bins, weights, volume, mag_bool)
 
 def get_paramvals_percentile(mcmc_table, pctl, chi2):
     """
@@ -546,30 +535,10 @@ def get_xmhm_mocks(survey, path, mf_type):
         Standard deviation of phi values between samples of 8 mocks
     """
 
-    if survey == 'eco':
-        mock_name = 'ECO'
-        num_mocks = 8
-        min_cz = 3000
-        max_cz = 7000
-        mag_limit = -17.33
-        mstar_limit = 8.9
-        volume = 151829.26 # Survey volume without buffer [Mpc/h]^3
-    elif survey == 'resolvea':
-        mock_name = 'A'
-        num_mocks = 59
-        min_cz = 4500
-        max_cz = 7000
-        mag_limit = -17.33
-        mstar_limit = 8.9
-        volume = 13172.384  # Survey volume without buffer [Mpc/h]^3 
-    elif survey == 'resolveb':
-        mock_name = 'B'
-        num_mocks = 104
-        min_cz = 4500
-        max_cz = 7000
-        mag_limit = -17
-        mstar_limit = 8.7
-        volume = 4709.8373  # Survey volume without buffer [Mpc/h]^3
+    survey_def = get_survey(survey)
+    mock_name = survey_def.mock_name
+    num_mocks = survey_def.num_mocks
+    volume = survey_def.volume # Survey volume without buffer [Mpc/h]^3
 
 
     x_arr = []
@@ -583,10 +552,7 @@ def get_xmhm_mocks(survey, path, mf_type):
         # Using the same survey definition as in mcmc smf i.e excluding the 
         # buffer
         if mf_type == 'smf':
-            mock_pd = mock_pd.loc[(mock_pd.cz.values >= min_cz) & \
-                (mock_pd.cz.values <= max_cz) & \
-                (mock_pd.M_r.values <= mag_limit) & \
-                (mock_pd.logmstar.values >= mstar_limit)]
+            mock_pd = mock_pd.loc[mock_mask(mock_pd, survey_def, 'smf')]
             cen_gals = np.log10(10**(mock_pd.logmstar.loc
                 [mock_pd.cs_flag == 1])/2.041)
             cen_halos = mock_pd.M_group.loc[mock_pd.cs_flag == 1]
@@ -595,27 +561,18 @@ def get_xmhm_mocks(survey, path, mf_type):
                 bin_statval='center')
 
         elif mf_type == 'bmf':
-            mock_pd = mock_pd.loc[(mock_pd.cz.values >= min_cz) & \
-                (mock_pd.cz.values <= max_cz) & \
-                (mock_pd.M_r.values <= mag_limit)]
+            mock_pd = mock_pd.loc[mock_mask(mock_pd, survey_def, 'bmf')]
             cen_gals_stellar = np.log10(10**(mock_pd.logmstar.loc
                 [mock_pd.cs_flag == 1])/2.041)
             cen_gals_gas = mock_pd.mhi.loc[mock_pd.cs_flag == 1]
             cen_gals_gas = np.log10((1.4 * cen_gals_gas)/2.041)
             cen_gals_bary = calc_bary(cen_gals_stellar, cen_gals_gas)
             mock_pd['cen_gals_bary'] = cen_gals_bary
-            if survey == 'eco' or survey == 'resolvea':
-                limit = np.log10((10**9.4) / 2.041)
-                cen_gals_bary = mock_pd.cen_gals_bary.loc\
-                    [mock_pd.cen_gals_bary >= limit]
-                cen_halos = mock_pd.M_group.loc[(mock_pd.cs_flag == 1) & 
-                    (mock_pd.cen_gals_bary >= limit)]
-            elif survey == 'resolveb':
-                limit = np.log10((10**9.1) / 2.041)
-                cen_gals_bary = mock_pd.cen_gals_bary.loc\
-                    [mock_pd.cen_gals_bary >= limit]
-                cen_halos = mock_pd.M_group.loc[(mock_pd.cs_flag == 1) & 
-                    (mock_pd.cen_gals_bary >= limit)]
+            limit = np.log10((10**survey_def.mbary_limit) / 2.041)
+            cen_gals_bary = mock_pd.cen_gals_bary.loc\
+                [mock_pd.cen_gals_bary >= limit]
+            cen_halos = mock_pd.M_group.loc[(mock_pd.cs_flag == 1) &
+                (mock_pd.cen_gals_bary >= limit)]
 
             x,y,y_std,y_std_err = Stats_one_arr(cen_halos, cen_gals_bary, 
                 base=0.4, bin_statval='center')        
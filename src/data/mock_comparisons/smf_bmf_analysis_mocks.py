@@ -5,6 +5,8 @@
 
 # Libs
 from cosmo_utils.utils import work_paths as cwpaths
+from src.data.surveys import get_survey, data_mask, mock_mask, measure_mf, \
+    make_bins
 import matplotlib.pyplot as plt
 from matplotlib import cm as cm
 from matplotlib import rc
@@ -20,45 +22,6 @@ __author__ = '{Mehnaaz Asad}'
 rc('font', **{'family': 'sans-serif', 'sans-serif': ['Helvetica']}, size=10)
 rc('text', usetex=True)
 
-def survey_definitions():
-    
-    eco = {
-        "mock_name": "ECO",
-        "num_mocks": 8,
-        "min_cz": 3000,
-        "max_cz": 7000,
-        "mag_limit": -17.33,
-        "mstar_limit": 8.9,
-        "volume": 151829.26 # Survey volume without buffer [Mpc/h]^3
-    }
-
-    resolvea = {
-        "mock_name": "A",
-        "num_mocks": 59,
-        "min_cz": 4500,
-        "max_cz": 7000,
-        "mag_limit": -17.33,
-        "mstar_limit": 8.9,
-        "volume": 13172.384 # Survey volume without buffer [Mpc/h]^3
-    }
-
-    resolveb = {
-        "mock_name": "B",
-        "num_mocks": 104,
-        "min_cz": 4500,
-        "max_cz": 7000,
-        "mag_limit": -17,
-        "mstar_limit": 8.7,
-        "volume": 4709.8373 # Survey volume without buffer [Mpc/h]^3
-    }
-
-    if survey == 'eco':
-        return eco
-    elif survey == 'resolvea':
-        return resolvea
-    elif survey == 'resolveb':
-        return resolveb
-    
 def reading_catls(filename, catl_format='.hdf5'):
     """
     Function to read ECO/RESOLVE catalogues.
@@ -154,6 +117,7 @@ def read_data(path_to_file, survey):
     z_median: `float`
         Median redshift of survey
     """
+    survey_def = get_survey(survey)
     if survey == 'eco':
         columns = ['name', 'radeg', 'dedeg', 'cz', 'grpcz', 'absrmag', 
                     'logmstar', 'logmgas', 'grp', 'grpn', 'logmh', 'logmh_s', 
@@ -164,13 +128,7 @@ def read_data(path_to_file, survey):
             usecols=columns)
 
         # 6456 galaxies                       
-        catl = eco_buff.loc[(eco_buff.grpcz.values >= 3000) & 
-            (eco_buff.grpcz.values <= 7000) & 
-            (eco_buff.absrmag.values <= -17.33) &
-            (eco_buff.logmstar.values >= 8.9)]
-
-        volume = 151829.26 # Survey volume without buffer [Mpc/h]^3
-        cvar = 0.125
+        catl = eco_buff.loc[data_mask(eco_buff, survey_def, 'smf')]
         z_median = np.median(catl.grpcz.values) / (3 * 10**5)
         
     elif survey == 'resolvea' or survey == 'resolveb':
@@ -182,29 +140,12 @@ def read_data(path_to_file, survey):
         resolve_live18 = pd.read_csv(path_to_file, delimiter=",", header=0, \
             usecols=columns)
 
-        if survey == 'resolvea':
-            catl = resolve_live18.loc[(resolve_live18.f_a.values == 1) & \
-                (resolve_live18.grpcz.values > 4500) & \
-                    (resolve_live18.grpcz.values < 7000) & \
-                        (resolve_live18.absrmag.values < -17.33) & \
-                            (resolve_live18.logmstar.values >= 8.9)]
+        catl = resolve_live18.loc[data_mask(resolve_live18, survey_def,
+            'smf')]
+        z_median = np.median(resolve_live18.grpcz.values) / (3 * 10**5)
 
-
-            volume = 13172.384  # Survey volume without buffer [Mpc/h]^3
-            cvar = 0.30
-            z_median = np.median(resolve_live18.grpcz.values) / (3 * 10**5)
-        
-        elif survey == 'resolveb':
-            # 487 - cz, 369 - grpcz
-            catl = resolve_live18.loc[(resolve_live18.f_b.values == 1) & \
-                (resolve_live18.grpcz.values > 4500) & \
-                    (resolve_live18.grpcz.values < 7000) & \
-                        (resolve_live18.absrmag.values < -17) & \
-                            (resolve_live18.logmstar.values >= 8.7)]
-
-            volume = 4709.8373  # *2.915 #Survey volume without buffer [Mpc/h]^3
-            cvar = 0.58
-            z_median = np.median(resolve_live18.grpcz.values) / (3 * 10**5)
+    volume = survey_def.volume # Survey volume without buffer [Mpc/h]^3
+    cvar = survey_def.cvar
 
     return catl,volume,cvar,z_median
 
@@ -245,22 +186,8 @@ def diff_smf(mstar_arr, volume, cvar_err, h1_bool):
         logmstar_arr = np.log10((10**mstar_arr) / 2.041)        
     else:
         logmstar_arr = mstar_arr
-    if survey == 'eco' or survey == 'resolvea':
-        bin_min = np.round(np.log10((10**8.9) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.8) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 12)
-    elif survey == 'resolveb':
-        bin_min = np.round(np.log10((10**8.7) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.8) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 12)   
-
-    # Unnormalized histogram and bin edges
-    counts, edg = np.histogram(logmstar_arr, bins=bins)  # paper used 17 bins
-    dm = edg[1] - edg[0]  # Bin width
-    maxis = 0.5 * (edg[1:] + edg[:-1])  # Mass axis i.e. bin centers
-    # Normalized to volume and bin width
-    err_poiss = np.sqrt(counts) / (volume * dm)
-    phi = counts / (volume * dm)  # not a log quantity
+    bins = make_bins(survey_def.mstar_limit, 11.8, 12)
+    maxis, phi, err_poiss, counts = measure_mf(logmstar_arr, volume, bins)
     return maxis, phi, err_poiss, bins, counts
 
 def diff_bmf(mass_arr, volume, cvar_err, sim_bool, h1_bool):
@@ -273,19 +200,8 @@ def diff_bmf(mass_arr, volume, cvar_err, sim_bool, h1_bool):
         # changing from h=0.7 to h=1
         mass_arr = np.log10((10**mass_arr) / 2.041)
     
-    if survey == 'eco' or survey == 'resolvea':
-        bin_min = np.round(np.log10((10**9.4) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.8) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 9)
-
-    # Unnormalized histogram and bin edges
-    counts, edg = np.histogram(mass_arr, bins=bins)  # paper used 17 bins
-    dm = edg[1] - edg[0]  # Bin width
-    maxis = 0.5 * (edg[1:] + edg[:-1])  # Mass axis i.e. bin centers
-    # Normalized to volume and bin width
-    err_poiss = np.sqrt(counts) / (volume * dm)
-
-    phi = counts / (volume * dm)  # not a log quantity
+    bins = make_bins(survey_def.mbary_limit, 11.8, 9)
+    maxis, phi, err_poiss, counts = measure_mf(mass_arr, volume, bins)
     return maxis, phi, err_poiss, bins, counts
 
 def measure_mock_total_mf(path):
@@ -313,17 +229,13 @@ def measure_mock_total_mf(path):
     err_smf_arr = []
     err_bmf_arr = []
 
-    for num in range(survey_dict["num_mocks"]):
-        filename = path + '{0}_cat_{1}_Planck_memb_cat.hdf5'.format(
-            survey_dict["mock_name"], num)
+    for num in range(survey_def.num_mocks):
+        filename = path + survey_def.mock_filename(num)
         mock_pd = reading_catls(filename) 
 
         # Using the same survey definition as in mcmc smf i.e excluding the 
         # buffer
-        mock_pd = mock_pd.loc[(mock_pd.cz.values >= survey_dict["min_cz"]) & \
-            (mock_pd.cz.values <= survey_dict["max_cz"]) & \
-            (mock_pd.M_r.values <= survey_dict["mag_limit"]) & \
-            (mock_pd.logmstar.values >= survey_dict["mstar_limit"])]
+        mock_pd = mock_pd.loc[mock_mask(mock_pd, survey_def, 'smf')]
 
         # Convert mhI and logmstar masses to h=1.0 assuming h^-2 dependence
         logmstar_arr = np.log10((10**mock_pd.logmstar.values) / 2.041)
@@ -334,9 +246,9 @@ def measure_mock_total_mf(path):
         # Measure SMF of mock using diff_smf function
         # Volume in h=1 since stellar masses have been changed to be in h=1
         max_smf, phi_smf, err_smf, bins_smf, counts_smf = \
-            diff_smf(logmstar_arr, survey_dict["volume"], 0, True)
+            diff_smf(logmstar_arr, survey_def.volume, 0, True)
         max_bmf, phi_bmf, err_bmf, bins_bmf, counts_bmf = \
-            diff_bmf(logmbary_arr, survey_dict["volume"], 0, False, True)
+            diff_bmf(logmbary_arr, survey_def.volume, 0, False, True)
 
         phi_smf_arr.append(np.log10(phi_smf))
         phi_bmf_arr.append(np.log10(phi_bmf))
@@ -365,7 +277,7 @@ def measure_mock_colour_mf(path):
     catl: pandas Dataframe
         Data catalog with colour label assigned as new column
     """
-    cols = survey_dict["num_mocks"]
+    cols = survey_def.num_mocks
     rows = 3 # store mass, phi, error measurements from SMF
     len_arr = 5 # number of bins in SMF
     smf_red = [[[0 for k in range(len_arr)] for j in range(cols)] 
@@ -373,17 +285,13 @@ def measure_mock_colour_mf(path):
     smf_blue = [[[0 for k in range(len_arr)] for j in range(cols)] 
         for i in range(rows)]
 
-    for num in range(survey_dict["num_mocks"]):
-        filename = path + '{0}_cat_{1}_Planck_memb_cat.hdf5'.format(
-            survey_dict["mock_name"], num)
+    for num in range(survey_def.num_mocks):
+        filename = path + survey_def.mock_filename(num)
         mock_pd = reading_catls(filename) 
 
         # Using the same survey definition as in mcmc smf i.e excluding the 
         # buffer
-        mock_pd = mock_pd.loc[(mock_pd.cz.values >= survey_dict["min_cz"]) & \
-            (mock_pd.cz.values <= survey_dict["max_cz"]) & \
-            (mock_pd.M_r.values <= survey_dict["mag_limit"]) & \
-            (mock_pd.logmstar.values >= survey_dict["mstar_limit"])]
+        mock_pd = mock_pd.loc[mock_mask(mock_pd, survey_def, 'smf')]
 
         logmstar_arr = mock_pd.logmstar.values
         u_r_arr = mock_pd.u_r.values
@@ -416,10 +324,10 @@ def measure_mock_colour_mf(path):
 
         max_red, phi_red, err_red, bins_red, counts_red = \
             diff_smf(mock_pd.logmstar.loc[mock_pd.colour_label.values == 'R'],
-                survey_dict["volume"], 0, False)
+                survey_def.volume, 0, False)
         max_blue, phi_blue, err_blue, bins_blue, counts_blue = \
             diff_smf(mock_pd.logmstar.loc[mock_pd.colour_label.values == 'B'], 
-                survey_dict["volume"], 0, False)
+                survey_def.volume, 0, False)
 
         smf_red[0][num] = max_red
         smf_red[1][num] = phi_red
@@ -584,11 +492,11 @@ def main(args):
     """
     global survey
     global mf_type
-    global survey_dict
+    global survey_def
     
     survey = args.survey
     mf_type = args.mf_type
-    survey_dict = survey_definitions()
+    survey_def = get_survey(survey)
 
     # Paths
     dict_of_paths = cwpaths.cookiecutter_paths()
@@ -0,0 +1,250 @@
+"""
+{This module discovers the box and mock catalogs of a survey, yields their
+ columns after applying the survey definition, and maps a reduction (mass
+ function, luminosity function, counts) over every mock in a process pool}
+"""
+
+# Built-in/Generic Imports
+from multiprocessing import Pool
+import glob
+import os
+import re
+
+# Libs
+import pandas as pd
+import numpy as np
+
+from src.data.surveys import mock_mask, measure_mf
+from src.data.mass_conversion import to_h1, mock_log_bary_mass
+
+__author__ = '{Mehnaaz Asad}'
+
+
+def discover_mocks(path, survey_def):
+    """
+    Finds mock catalogs of a survey in all boxes under a directory
+
+    Parameters
+    ----------
+    path: string
+        Path to directory containing one directory per box (5001, 5002...)
+
+    survey_def: SurveyDefinition
+        Survey definition giving mock names
+
+    Returns
+    ---------
+    mocks: list
+        List of (box, mock number, filename) sorted by box and mock number
+    """
+    pattern = re.compile(r'{0}_cat_(\d+)_Planck_memb_cat\.hdf5$'.format(
+        re.escape(survey_def.mock_name)))
+    mocks = []
+    for box_path in glob.glob(os.path.join(path, '*', '')):
+        box = os.path.basename(os.path.normpath(box_path))
+        if not box.isdigit():
+            continue
+        mock_path = os.path.join(path, survey_def.mock_dir(box))
+        if not os.path.isdir(mock_path):
+            continue
+        for filename in os.listdir(mock_path):
+            match = pattern.match(filename)
+            if match:
+                mocks.append((int(box), int(match.group(1)),
+                    os.path.join(mock_path, filename)))
+    if not mocks:
+        msg = 'No {0} mocks found in {1}'.format(survey_def.mock_name, path)
+        raise ValueError(msg)
+    mocks.sort()
+    return mocks
+
+def read_mock(filename, survey_def, mf_type, columns=None):
+    """
+    Reads columns of a mock catalog inside the survey definition
+
+    Parameters
+    ----------
+    filename: string
+        Path to mock catalog
+
+    survey_def: SurveyDefinition
+        Survey definition used to select galaxies
+
+    mf_type: string or None
+        Mass function type (smf/bmf) whose selection is applied. None reads
+        all galaxies.
+
+    columns: list, optional
+        Columns to return. Default returns all columns.
+
+    Returns
+    ---------
+    mock_cols: dict
+        Arrays of selected galaxies keyed by column name
+    """
+    mock_pd = pd.read_hdf(filename)
+    if mf_type is not None:
+        mock_pd = mock_pd.loc[mock_mask(mock_pd, survey_def, mf_type)]
+    if columns is None:
+        columns = mock_pd.columns
+    mock_cols = {column: mock_pd[column].values for column in columns}
+    return mock_cols
+
+def _reduce_mock(args):
+    """Pool worker applying a reduction to one mock"""
+    filename, survey_def, mf_type, columns, reducer = args
+    return reducer(read_mock(filename, survey_def, mf_type, columns))
+
+def stack(results):
+    """
+    Stacks per-mock results into arrays with one row per mock
+
+    Parameters
+    ----------
+    results: list
+        Per-mock results. Tuples are stacked element by element.
+
+    Returns
+    ---------
+    stacked: array or tuple of arrays
+        Stacked results. Results of different shapes (e.g. luminosity
+        functions on data dependent bins) are returned as object arrays.
+    """
+    if len(results) > 0 and isinstance(results[0], tuple):
+        return tuple(stack(list(values)) for values in zip(*results))
+    if len({np.shape(value) for value in results}) <= 1:
+        return np.array(results)
+    stacked = np.empty(len(results), dtype=object)
+    for idx, value in enumerate(results):
+        stacked[idx] = value
+    return stacked
+
+
+class MockSuite(object):
+    """
+    All mocks of a survey across boxes
+
+    Examples
+    --------
+    >>> suite = MockSuite(path_to_mocks, get_survey('eco'), 'smf')
+    >>> for box, num, mock_cols in suite:
+    ...     print(box, num, len(mock_cols['logmstar']))
+    >>> phi = suite.map(partial(mass_function, mf_type='smf',
+    ...     volume=survey_def.volume, bins=survey_def.bins('smf')), nproc=8)[1]
+    """
+    def __init__(self, path, survey_def, mf_type='smf', columns=None):
+        """
+        Parameters
+        ----------
+        path: string
+            Path to directory containing one directory per box
+
+        survey_def: SurveyDefinition
+            Survey definition used to find mocks and select galaxies
+
+        mf_type: string or None, optional
+            Mass function type (smf/bmf) whose selection is applied. None
+            reads all galaxies.
+
+        columns: list, optional
+            Columns to read. Default reads all columns.
+        """
+        self.path = path
+        self.survey_def = survey_def
+        self.mf_type = mf_type
+        self.columns = columns
+        self.mocks = discover_mocks(path, survey_def)
+
+    def __len__(self):
+        return len(self.mocks)
+
+    @property
+    def boxes(self):
+        """Array of box number of each mock"""
+        return np.array([box for box, _, _ in self.mocks])
+
+    def __iter__(self):
+        for box, num, filename in self.mocks:
+            yield box, num, read_mock(filename, self.survey_def, self.mf_type,
+                self.columns)
+
+    def map(self, reducer, nproc=1):
+        """
+        Applies a reduction to every mock
+
+        Parameters
+        ----------
+        reducer: callable
+            Function of the dict of mock columns. Must be defined at module
+            level (or be a functools.partial of one) when nproc > 1 so that
+            it can be sent to workers.
+
+        nproc: int, optional
+            Number of processes. 1 runs serially without a pool.
+
+        Returns
+        ---------
+        stacked: array or tuple of arrays
+            Results with one row per mock in the order of self.mocks
+        """
+        tasks = [(filename, self.survey_def, self.mf_type, self.columns,
+            reducer) for _, _, filename in self.mocks]
+        if nproc > 1:
+            with Pool(processes=nproc) as pool:
+                results = pool.map(_reduce_mock, tasks)
+        else:
+            results = [_reduce_mock(task) for task in tasks]
+        return stack(results)
+
+
+def mock_logmass(mock_cols, mf_type):
+    """
+    Stellar or baryonic masses of mock galaxies in h=1
+
+    Parameters
+    ----------
+    mock_cols: dict
+        Mock columns with logmstar and, for bmf, mhi
+
+    mf_type: string
+        Mass function type (smf/bmf)
+
+    Returns
+    ---------
+    logmass_arr: array
+        Array of masses in h=1 [log Msun/h]
+    """
+    # changing from h=0.7 to h=1 assuming h^-2 dependence
+    if mf_type == 'smf':
+        return to_h1(mock_cols['logmstar'])
+    elif mf_type == 'bmf':
+        return mock_log_bary_mass(mock_cols['logmstar'], mock_cols['mhi'])
+
+def mass_function(mock_cols, mf_type, volume, bins):
+    """
+    Reduction measuring the mass function of a mock
+
+    Parameters
+    ----------
+    mock_cols: dict
+        Mock columns with logmstar and, for bmf, mhi
+
+    mf_type: string
+        Mass function type (smf/bmf)
+
+    volume: float
+        Volume of survey
+
+    bins: array
+        Array of bin edge values
+
+    Returns
+    ---------
+    maxis, phi, err_poiss, counts: tuple
+        Output of measure_mf (phi is not a log quantity)
+    """
+    return measure_mf(mock_logmass(mock_cols, mf_type), volume, bins)
+
+def count(mock_cols):
+    """Reduction counting galaxies in a mock"""
+    return len(next(iter(mock_cols.values())))
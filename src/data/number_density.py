@@ -0,0 +1,151 @@
+"""
+{This module measures cumulative number densities (abundance matching inputs
+ and luminosity functions) on fixed bins, either for a single catalog or for
+ a whole stack of mocks in one pass}
+"""
+
+# Libs
+import numpy as np
+
+__author__ = '{Mehnaaz Asad}'
+
+# Changing absolute magnitudes from h=0.7 to h=1 (-5 log10(0.7))
+MAG_H_CONVERSION = 0.775
+
+
+def cumu_num_dens(data, bins, weights, volume, bool_mag):
+    """
+    Calculates cumulative number density of a single catalog
+
+    Parameters
+    ----------
+    data: array
+        Array of masses or magnitudes. Not modified.
+
+    bins: int or array
+        Number of bins or array of bin edges
+
+    weights: array or None
+        Weight of each object. None weighs all objects equally.
+
+    volume: float
+        Volume of survey or simulation
+
+    bool_mag: boolean
+        True if data are magnitudes (counted from bright to faint), False if
+        data are masses (counted from massive to small)
+
+    Returns
+    ---------
+    bin_centers: array
+        Array of bin centers
+
+    edg: array
+        Array of bin edges
+
+    n_cumu: array
+        Array of cumulative number density per bin
+
+    err_poiss: array
+        Array of poisson error per bin
+
+    bin_width: float
+        Width of bins
+    """
+    freq, edg = np.histogram(data, bins=bins, weights=weights)
+    bin_centers = 0.5 * (edg[1:] + edg[:-1])
+    bin_width = edg[1] - edg[0]
+    if not bool_mag:
+        N_cumu = np.cumsum(freq[::-1])[::-1]
+    else:
+        N_cumu = np.cumsum(freq)
+    n_cumu = N_cumu / volume
+    err_poiss = np.sqrt(N_cumu) / volume
+    return bin_centers, edg, n_cumu, err_poiss, bin_width
+
+def cumu_num_dens_batch(data_arr, bins, volume, bool_mag, weights_arr=None):
+    """
+    Calculates cumulative number densities of a stack of catalogs on shared
+    bins in one pass
+
+    Parameters
+    ----------
+    data_arr: list of arrays
+        Masses or magnitudes of each catalog (e.g. one per mock). Not
+        modified.
+
+    bins: array
+        Array of bin edges shared by all catalogs
+
+    volume: float
+        Volume of survey or simulation
+
+    bool_mag: boolean
+        True if data are magnitudes (counted from bright to faint), False if
+        data are masses (counted from massive to small)
+
+    weights_arr: list of arrays, optional
+        Weight of each object in each catalog
+
+    Returns
+    ---------
+    bin_centers: array
+        Array of bin centers
+
+    n_cumu: array
+        Array of shape (number of catalogs, number of bins) of cumulative
+        number densities, one row per catalog
+
+    err_poiss: array
+        Array of poisson errors with the same shape as n_cumu
+    """
+    bins = np.asarray(bins, dtype=float)
+    num_bins = len(bins) - 1
+    num_catls = len(data_arr)
+    lengths = np.array([len(data) for data in data_arr], dtype=int)
+    values = np.concatenate([np.asarray(data, dtype=float) for data in
+        data_arr]) if num_catls else np.empty(0)
+    catl_idx = np.repeat(np.arange(num_catls), lengths)
+    if weights_arr is None:
+        weights = None
+    else:
+        weights = np.concatenate([np.asarray(w, dtype=float) for w in
+            weights_arr])
+
+    # Same bin assignment as np.histogram, last bin includes its right edge
+    bin_idx = np.searchsorted(bins, values, side='right') - 1
+    bin_idx[values == bins[-1]] = num_bins - 1
+    inside = (bin_idx >= 0) & (bin_idx < num_bins)
+    flat_idx = catl_idx[inside] * num_bins + bin_idx[inside]
+    freq = np.bincount(flat_idx, weights=None if weights is None else
+        weights[inside], minlength=num_catls * num_bins).\
+        reshape(num_catls, num_bins)
+
+    if not bool_mag:
+        N_cumu = np.cumsum(freq[:, ::-1], axis=1)[:, ::-1]
+    else:
+        N_cumu = np.cumsum(freq, axis=1)
+    n_cumu = N_cumu / volume
+    err_poiss = np.sqrt(N_cumu) / volume
+    bin_centers = 0.5 * (bins[1:] + bins[:-1])
+    return bin_centers, n_cumu, err_poiss
+
+def lum_func_bins(absrmag_arr, bin_width=0.2):
+    """
+    Shared h=1 magnitude bins of luminosity functions from a reference sample
+
+    Parameters
+    ----------
+    absrmag_arr: array
+        Absolute r-band magnitudes in h=0.7 (e.g. of the data catalog)
+
+    bin_width: float, optional
+        Width of bins [mag]
+
+    Returns
+    ---------
+    bins: array
+        Array of bin edges in h=1
+    """
+    absrmag_arr = np.asarray(absrmag_arr) + MAG_H_CONVERSION
+    return np.arange(absrmag_arr.min(), absrmag_arr.max(), bin_width)
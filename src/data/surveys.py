@@ -0,0 +1,302 @@
+"""
+{This module holds a single registry of the ECO, RESOLVE-A and RESOLVE-B survey
+ definitions (cz range, magnitude and mass limits, volumes, mocks and mass
+ function bins) together with the selectors and histogrammers that use them}
+"""
+
+# Built-in/Generic Imports
+from dataclasses import dataclass, field
+
+# Libs
+import numpy as np
+
+__author__ = '{Mehnaaz Asad}'
+
+# Changing from h=0.7 to h=1 assuming h^-2 dependence
+H_CONVERSION = 2.041
+LOG_H_CONVERSION = np.log10(H_CONVERSION)
+
+MF_TYPES = ('smf', 'bmf')
+
+
+@dataclass(frozen=True)
+class SurveyDefinition:
+    """
+    Frozen description of a survey used by the data, mock and model pipelines
+
+    Attributes
+    ----------
+    name: string
+        Name of survey (eco/resolvea/resolveb)
+
+    mock_name: string
+        Prefix of mock catalog files and directories
+
+    num_mocks: int
+        Number of mocks per box
+
+    min_cz, max_cz: float
+        Redshift range of survey without buffer [km/s]
+
+    mag_limit: float
+        Absolute r-band magnitude limit
+
+    mstar_limit: float
+        Stellar mass limit in h=0.7 [log Msun]
+
+    mbary_limit: float
+        Baryonic mass limit in h=0.7 [log Msun]
+
+    volume: float
+        Survey volume without buffer [Mpc/h]^3
+
+    cvar: float
+        Cosmic variance of survey
+
+    flag_column: string or None
+        Column in data catalog flagging membership of survey footprint
+
+    smf_range, bmf_range: tuple
+        Lower and upper mass function bin limits in h=0.7 [log Msun]
+
+    num_edges: int
+        Number of mass function bin edges
+
+    smf_bins, bmf_bins: tuple
+        Precomputed mass function bin edges in h=1 [log Msun/h]
+    """
+    name: str
+    mock_name: str
+    num_mocks: int
+    min_cz: float
+    max_cz: float
+    mag_limit: float
+    mstar_limit: float
+    mbary_limit: float
+    volume: float
+    cvar: float
+    flag_column: str
+    smf_range: tuple
+    bmf_range: tuple
+    num_edges: int = 7
+    smf_bins: tuple = field(init=False)
+    bmf_bins: tuple = field(init=False)
+
+    def __post_init__(self):
+        # Bins are stored as tuples so that survey definitions stay hashable
+        object.__setattr__(self, 'smf_bins',
+            tuple(make_bins(*self.smf_range, self.num_edges).tolist()))
+        object.__setattr__(self, 'bmf_bins',
+            tuple(make_bins(*self.bmf_range, self.num_edges).tolist()))
+
+    def bins(self, mf_type):
+        """Returns h=1 bin edges of mass function as an array"""
+        check_mf_type(mf_type)
+        if mf_type == 'smf':
+            return np.array(self.smf_bins)
+        return np.array(self.bmf_bins)
+
+    def mass_limit(self, mf_type):
+        """Returns h=0.7 lower mass limit of sample or None if no mass cut"""
+        check_mf_type(mf_type)
+        if mf_type == 'smf':
+            return self.mstar_limit
+        # BMF samples use the same survey definition as data - *no mstar cut*
+        return None
+
+    def model_limit(self, mf_type):
+        """Returns h=1 lower mass limit applied to populated mocks"""
+        return self.bins(mf_type)[0]
+
+    def mock_dir(self, box):
+        """Returns mock catalog directory name for a given box"""
+        return '{0}/{1}_m200b_catls/'.format(int(box), self.mock_name)
+
+    def mock_filename(self, num):
+        """Returns mock catalog file name for a given mock number"""
+        return '{0}_cat_{1}_Planck_memb_cat.hdf5'.format(self.mock_name,
+            int(num))
+
+
+def make_bins(mass_min, mass_max, num_edges):
+    """
+    Converts h=0.7 mass limits to h=1 mass function bin edges
+
+    Parameters
+    ----------
+    mass_min: float
+        Lower bin limit in h=0.7 [log Msun]
+
+    mass_max: float
+        Upper bin limit in h=0.7 [log Msun]
+
+    num_edges: int
+        Number of bin edges
+
+    Returns
+    ---------
+    bins: array
+        Array of bin edge values in h=1 rounded to 0.1 dex
+    """
+    bin_min = np.round(mass_min - LOG_H_CONVERSION, 1)
+    bin_max = np.round(mass_max - LOG_H_CONVERSION, 1)
+    return np.linspace(bin_min, bin_max, num_edges)
+
+
+def check_mf_type(mf_type):
+    """Raises ValueError for unsupported mass function types"""
+    if mf_type not in MF_TYPES:
+        msg = '`mf_type` ({0}) not supported! Exiting...'.format(mf_type)
+        raise ValueError(msg)
+
+
+SURVEYS = {
+    'eco': SurveyDefinition(
+        name='eco', mock_name='ECO', num_mocks=8,
+        min_cz=3000, max_cz=7000, mag_limit=-17.33,
+        mstar_limit=8.9, mbary_limit=9.4,
+        volume=151829.26, cvar=0.125, flag_column=None,
+        smf_range=(8.9, 11.8), bmf_range=(9.4, 11.5)),
+    'resolvea': SurveyDefinition(
+        name='resolvea', mock_name='A', num_mocks=59,
+        min_cz=4500, max_cz=7000, mag_limit=-17.33,
+        mstar_limit=8.9, mbary_limit=9.4,
+        volume=13172.384, cvar=0.30, flag_column='f_a',
+        # different to avoid nan in inverse corr mat
+        smf_range=(8.9, 11.5), bmf_range=(9.4, 11.5)),
+    'resolveb': SurveyDefinition(
+        name='resolveb', mock_name='B', num_mocks=104,
+        min_cz=4500, max_cz=7000, mag_limit=-17,
+        mstar_limit=8.7, mbary_limit=9.1,
+        volume=4709.8373, cvar=0.58, flag_column='f_b',
+        smf_range=(8.7, 11.8), bmf_range=(9.1, 11.5)),
+}
+
+
+def get_survey(survey):
+    """
+    Looks up survey definition in registry
+
+    Parameters
+    ----------
+    survey: string
+        Name of survey
+
+    Returns
+    ---------
+    survey_def: SurveyDefinition
+        Frozen survey definition
+    """
+    try:
+        return SURVEYS[survey]
+    except KeyError:
+        msg = '`survey` ({0}) not supported! Exiting...'.format(survey)
+        raise ValueError(msg)
+
+
+def data_mask(catl, survey_def, mf_type):
+    """
+    Boolean mask selecting survey galaxies from data catalog
+
+    Parameters
+    ----------
+    catl: pandas.DataFrame
+        Data catalog with grpcz, absrmag, logmstar and footprint columns
+
+    survey_def: SurveyDefinition
+        Survey definition
+
+    mf_type: string
+        Mass function type (smf/bmf)
+
+    Returns
+    ---------
+    mask: boolean array
+        True for galaxies inside survey definition
+    """
+    grpcz = catl.grpcz.values
+    mask = (grpcz >= survey_def.min_cz) & (grpcz <= survey_def.max_cz) & \
+        (catl.absrmag.values <= survey_def.mag_limit)
+    if survey_def.flag_column is not None:
+        mask &= catl[survey_def.flag_column].values == 1
+    mass_limit = survey_def.mass_limit(mf_type)
+    if mass_limit is not None:
+        mask &= catl.logmstar.values >= mass_limit
+    return mask
+
+
+def mock_mask(mock_pd, survey_def, mf_type):
+    """
+    Boolean mask selecting galaxies from mock catalog using the same survey
+    definition as data
+
+    Parameters
+    ----------
+    mock_pd: pandas.DataFrame
+        Mock catalog with cz, M_r and logmstar columns
+
+    survey_def: SurveyDefinition
+        Survey definition
+
+    mf_type: string
+        Mass function type (smf/bmf)
+
+    Returns
+    ---------
+    mask: boolean array
+        True for galaxies inside survey definition
+    """
+    cz = mock_pd.cz.values
+    mask = (cz >= survey_def.min_cz) & (cz <= survey_def.max_cz) & \
+        (mock_pd.M_r.values <= survey_def.mag_limit)
+    mass_limit = survey_def.mass_limit(mf_type)
+    if mass_limit is not None:
+        mask &= mock_pd.logmstar.values >= mass_limit
+    return mask
+
+
+def measure_mf(logmass_arr, volume, bins, weights=None):
+    """
+    Calculates differential mass function on fixed bins
+
+    Parameters
+    ----------
+    logmass_arr: numpy array
+        Array of masses in h=1 [log Msun/h]
+
+    volume: float
+        Volume of survey or simulation
+
+    bins: array
+        Array of bin edge values
+
+    weights: numpy array, optional
+        Weight of each galaxy, e.g. for mocks populated on a subsample of
+        halos. Counts are sums of weights if given.
+
+    Returns
+    ---------
+    maxis: array
+        Array of x-axis mass values
+
+    phi: array
+        Array of y-axis values (not a log quantity)
+
+    err_poiss: array
+        Array of poisson error values per bin
+
+    counts: array
+        Array of number of galaxies per bin
+    """
+    # Unnormalized histogram
+    counts, edg = np.histogram(logmass_arr, bins=bins, weights=weights)
+    dm = edg[1] - edg[0]  # Bin width
+    maxis = 0.5 * (edg[1:] + edg[:-1])  # Mass axis i.e. bin centers
+    # Normalized to volume and bin width
+    if weights is None:
+        err_poiss = np.sqrt(counts) / (volume * dm)
+    else:
+        sum_sq = np.histogram(logmass_arr, bins=bins, weights=weights**2)[0]
+        err_poiss = np.sqrt(sum_sq) / (volume * dm)
+    phi = counts / (volume * dm)
+    return maxis, phi, err_poiss, counts
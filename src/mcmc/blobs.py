@@ -0,0 +1,236 @@
+"""
+{This module stores the model predictions of every walker at every step
+ (e.g. the model mass function and a binned SMHM summary) next to the chain,
+ so that posterior predictive bands are array slices instead of new mock
+ populations. Each step appends one float32 record per walker to a binary
+ file described by a small JSON header}
+"""
+
+# Built-in/Generic Imports
+import json
+import os
+
+# Libs
+import numpy as np
+
+from src.data.binned_stats import base_bins, binned_stats, STATS
+
+__author__ = '{Mehnaaz Asad}'
+
+# Halo mass bins [log Msun/h] shared by all SMHM measurements so that the
+# relations of posterior draws, mocks and data line up bin by bin
+SMHM_BINS = base_bins(10, 15, 0.4)
+# Rows of STATS kept in blobs
+BLOB_STATS = ('mean', 'std', 'median')
+
+
+def smhm_summary(gals_df):
+    """
+    Binned SMHM of the centrals of a populated mock
+
+    Parameters
+    ----------
+    gals_df: pandas dataframe
+        Mock catalog with stellar_mass, halo_mvir, halo_id and halo_hostid
+        columns
+
+    Returns
+    ---------
+    summary: array
+        Array of shape (len(BLOB_STATS), number of SMHM_BINS) of log stellar
+        mass statistics in bins of log halo mass
+    """
+    centrals = gals_df.halo_hostid.values == gals_df.halo_id.values
+    cen_gals = np.log10(gals_df.stellar_mass.values[centrals])
+    cen_halos = np.log10(gals_df.halo_mvir.values[centrals])
+    stats_arr = binned_stats(cen_halos, cen_gals, SMHM_BINS)
+    return stats_arr[[STATS.index(stat) for stat in BLOB_STATS]]
+
+def expand_summary(summary):
+    """
+    SMHM summaries in the layout of binned_stats_batch
+
+    Parameters
+    ----------
+    summary: array
+        Array of shape (..., len(BLOB_STATS), number of bins)
+
+    Returns
+    ---------
+    stats_arr: array
+        Array of shape (..., len(STATS), number of bins). Statistics not kept
+        in blobs are NaN.
+    """
+    stats_arr = np.full(summary.shape[:-2] + (len(STATS),
+        summary.shape[-1]), np.nan)
+    for idx, stat in enumerate(BLOB_STATS):
+        stats_arr[..., STATS.index(stat), :] = summary[..., idx, :]
+    return stats_arr
+
+
+def blob_fname(survey, mf_type, tag='', path=''):
+    """
+    Path to the blob file of a run, shared by the samplers writing it and
+    the scripts reading it
+
+    Parameters
+    ----------
+    survey: string
+        Name of survey
+
+    mf_type: string
+        Type of mass function (smf/bmf), or 'colour' for the red and blue
+        SMF fit
+
+    tag: string, optional
+        Tag of the run, e.g. '_emu' or '_lowfi'
+
+    path: string, optional
+        Directory of the run files. The samplers write to the working
+        directory.
+
+    Returns
+    ---------
+    filename: string
+        Path to binary blob file
+    """
+    return os.path.join(path, "mcmc_{0}_{1}{2}_blobs.f4".format(survey,
+        mf_type, tag))
+
+def pack_record(*arrays):
+    """Flattens the predictions of one evaluation into a float32 record"""
+    return np.concatenate([np.ravel(array) for array in arrays]).\
+        astype(np.float32)
+
+
+class BlobWriter(object):
+    """
+    Appends model predictions of all walkers after every step
+    """
+    def __init__(self, filename, nwalkers, segments, meta=None):
+        """
+        Parameters
+        ----------
+        filename: string
+            Path to binary blob file. The header is written to filename +
+            '.json'.
+
+        nwalkers: int
+            Number of walkers
+
+        segments: list
+            List of (name, shape) of the arrays making up one record, e.g.
+            [('phi', (12,)), ('smhm', (3, 13))]
+
+        meta: dict, optional
+            JSON serializable information stored in the header
+        """
+        self.filename = filename
+        self.nwalkers = nwalkers
+        self.segments = [(name, tuple(int(dim) for dim in shape)) for name,
+            shape in segments]
+        self.size = sum(int(np.prod(shape)) for _, shape in self.segments)
+        header = {'nwalkers': nwalkers, 'segments': self.segments,
+            'meta': meta or {}}
+        with open(filename + '.json', 'w') as outfile:
+            json.dump(header, outfile)
+
+    def write(self, records):
+        """
+        Appends the records of one step
+
+        Parameters
+        ----------
+        records: list
+            Record of each walker returned by pack_record. None for rejected
+            or failed evaluations, which are stored as NaNs.
+        """
+        empty = np.full(self.size, np.nan, dtype=np.float32)
+        records = np.array([empty if record is None else record for record
+            in records], dtype=np.float32)
+        if records.shape != (self.nwalkers, self.size):
+            msg = 'Blob records have shape {0}, expected {1}'.format(
+                records.shape, (self.nwalkers, self.size))
+            raise ValueError(msg)
+        with open(self.filename, 'ab') as outfile:
+            records.tofile(outfile)
+
+
+def read_blobs(filename):
+    """
+    Reads model predictions written by BlobWriter
+
+    Parameters
+    ----------
+    filename: string
+        Path to binary blob file
+
+    Returns
+    ---------
+    blobs: dict
+        Array of shape (number of steps, nwalkers, *shape) for each segment
+        and the header metadata under 'meta'
+    """
+    with open(filename + '.json', 'r') as infile:
+        header = json.load(infile)
+    nwalkers = header['nwalkers']
+    sizes = [int(np.prod(shape)) for _, shape in header['segments']]
+    record_size = sum(sizes)
+    values = np.fromfile(filename, dtype=np.float32)
+    # Drop a step that was only partially written
+    num_steps = values.size // (nwalkers * record_size)
+    values = values[:num_steps * nwalkers * record_size].reshape(num_steps,
+        nwalkers, record_size)
+    blobs = {'meta': header['meta']}
+    start = 0
+    for (name, shape), size in zip(header['segments'], sizes):
+        blobs[name] = values[:, :, start:start + size].reshape(
+            (num_steps, nwalkers) + tuple(shape))
+        start += size
+    return blobs
+
+def posterior_draws(blobs, chi2=None, pctl=68, num=100, rng=None):
+    """
+    Random draws among the samples with the lowest chi-squared values
+
+    Parameters
+    ----------
+    blobs: dict
+        Output of read_blobs
+
+    chi2: array, optional
+        Chi-squared of each sample in step-major order (steps x walkers),
+        at least as long as the blob file. Defaults to the 'chi2' segment
+        stored with every record.
+
+    pctl: float, optional
+        Percentage of samples with the lowest chi-squared to draw from
+
+    num: int, optional
+        Number of draws
+
+    rng: numpy.random.Generator, optional
+        Random number generator
+
+    Returns
+    ---------
+    draws: dict
+        Array of shape (num, *shape) for each segment
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    if chi2 is None:
+        if 'chi2' not in blobs:
+            msg = 'Blobs have no chi2 segment, pass the chi-squared values '\
+                'of the run in step-major order'
+            raise ValueError(msg)
+        chi2 = blobs['chi2'].ravel()
+    names = [name for name in blobs if name != 'meta']
+    num_samples = np.prod(blobs[names[0]].shape[:2])
+    chi2 = np.asarray(chi2, dtype=float)[:num_samples]
+    order = np.argsort(chi2)
+    order = order[np.isfinite(chi2[order])]
+    best = order[:int(pctl / 100 * len(order))]
+    idx = rng.choice(best, size=min(num, len(best)), replace=False)
+    return {name: blobs[name].reshape((num_samples,) +
+        blobs[name].shape[2:])[idx] for name in names}
@@ -0,0 +1,114 @@
+"""
+{This module snapshots the emcee sampler state (walker positions, log
+ probabilities, blobs, random state and step counter) together with the sizes
+ of the chain files so that preempted runs can resume exactly where the last
+ snapshot was taken}
+"""
+
+# Built-in/Generic Imports
+import pickle
+import os
+
+__author__ = '{Mehnaaz Asad}'
+
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(filename, result, iteration, output_files, meta=None):
+    """
+    Atomically writes sampler state after a step
+
+    Parameters
+    ----------
+    filename: string
+        Path to checkpoint file
+
+    result: tuple
+        Tuple of (position, lnprob, rstate, blobs) yielded by sampler.sample
+
+    iteration: int
+        Number of steps taken so far
+
+    output_files: list
+        Paths to chain files appended to every step. Their sizes are recorded
+        so that rows written after the snapshot can be dropped on resume.
+
+    meta: dict, optional
+        Settings the likelihood depends on beyond the sampler state, e.g.
+        the seed of the mock populations. A resumed run must match them.
+    """
+    position, lnprob, rstate, blobs = result[:4]
+    state = {
+        'version': CHECKPOINT_VERSION,
+        'position': position,
+        'lnprob': lnprob,
+        'rstate': rstate,
+        'blobs': blobs,
+        'iteration': iteration,
+        'meta': meta or {},
+        'file_sizes': {fname: os.path.getsize(fname) for fname in
+            output_files},
+    }
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as outfile:
+        pickle.dump(state, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+        outfile.flush()
+        os.fsync(outfile.fileno())
+    os.replace(tmp_filename, filename)
+
+def load_checkpoint(filename, nwalkers, ndim, meta=None):
+    """
+    Reads sampler state written by save_checkpoint
+
+    Parameters
+    ----------
+    filename: string
+        Path to checkpoint file
+
+    nwalkers: int
+        Number of walkers of run being resumed
+
+    ndim: int
+        Number of parameters of run being resumed
+
+    meta: dict, optional
+        Settings of run being resumed, see save_checkpoint
+
+    Returns
+    ---------
+    state: dict
+        Sampler state
+    """
+    with open(filename, 'rb') as infile:
+        state = pickle.load(infile)
+    if state.get('version') != CHECKPOINT_VERSION:
+        msg = 'Checkpoint {0} has version {1}, expected {2}'.format(filename,
+            state.get('version'), CHECKPOINT_VERSION)
+        raise ValueError(msg)
+    if state['position'].shape != (nwalkers, ndim):
+        msg = 'Checkpoint {0} has {1} walkers and {2} parameters but the run '\
+            'has {3} walkers and {4} parameters'.format(filename,
+            *state['position'].shape, nwalkers, ndim)
+        raise ValueError(msg)
+    if state.get('meta', {}) != (meta or {}):
+        msg = 'Checkpoint {0} was written with {1} but the run has {2}, '\
+            'resuming would not continue the same chain'.format(filename,
+            state.get('meta', {}), meta or {})
+        raise ValueError(msg)
+    return state
+
+def truncate_outputs(state):
+    """
+    Drops rows appended to chain files after the checkpoint was taken
+
+    Parameters
+    ----------
+    state: dict
+        Sampler state returned by load_checkpoint
+    """
+    for fname, size in state['file_sizes'].items():
+        if not os.path.exists(fname) or os.path.getsize(fname) < size:
+            msg = 'Chain file {0} is shorter than at checkpoint'.format(fname)
+            raise ValueError(msg)
+        with open(fname, 'r+b') as outfile:
+            outfile.truncate(size)
@@ -13,8 +13,11 @@ from halotools.empirical_models import PrebuiltSubhaloModelFactory
 from cosmo_utils.utils.stats_funcs import Stats_one_arr
 from halotools.sim_manager import CachedHaloCatalog
 from cosmo_utils.utils import work_paths as cwpaths
+from src.mcmc.draw_plots import plot_draws, stack_draws, set_text_mode, \
+    tex_label
+from src.mcmc.pools import open_pool, is_master
+from src.mcmc.blobs import read_blobs, posterior_draws, blob_fname
 from collections import OrderedDict
-from multiprocessing import Pool
 import matplotlib.pyplot as plt
 from matplotlib import rc
 import pandas as pd
@@ -28,8 +31,11 @@ import os
 __author__ = '{Mehnaaz Asad}'
 
 rc('font', **{'family': 'sans-serif', 'sans-serif': ['Helvetica']}, size=20)
-rc('text', usetex=True)
-rc('text.latex', preamble=[r"\usepackage{amsmath}"])
+# 'mathtext' for fast drafts, 'latex' for final figures
+set_text_mode('latex')
+# Posterior draws as one collection of lines ('lines') or as percentile
+# bands ('band')
+draw_mode = 'lines'
 
 def read_chi2(path_to_file):
     """
@@ -997,24 +1003,58 @@ def mp_init(mcmc_table_pctl,nproc):
         Mcmc chain dataframe of 1000 random samples
 
     nproc: int
-        Number of processes to use in multiprocessing
+        Number of processes (multiprocessing) or local dask workers
 
     Returns
     ---------
     result: multidimensional array
-        Array of smf and smhm data
+        Array of smf and smhm data. None on MPI worker ranks.
     """
     start = time.time()
     chunks = np.array([mcmc_table_pctl.iloc[:,:4].values[i::5] \
         for i in range(5)])
-    pool = Pool(processes=nproc)
-    result = pool.map(mp_func, chunks)
+    with open_pool(pool_backend, nproc, address=dask_address) as pool:
+        if pool is None:
+            # MPI worker rank, the master holds the result
+            return None
+        result = pool.map(mp_func, chunks)
     end = time.time()
     multi_time = end - start
     print("Multiprocessing took {0:.1f} seconds".format(multi_time))
 
     return result
 
+def blob_init(blob_file, maxis_red, maxis_blue, num_chunks=5):
+    """
+    Red and blue SMFs of posterior draws from model predictions stored by
+    the sampler, without running the quenching model again
+
+    Parameters
+    ----------
+    blob_file: string
+        Path to blob file written by mcmc_colour.py --blobs, see blob_fname
+
+    maxis_red, maxis_blue: array
+        Arrays of x-axis mass values of the red and blue SMFs shared by all
+        draws
+
+    num_chunks: int, optional
+        Number of chunks of draws, as returned by mp_init
+
+    Returns
+    ---------
+    result: multidimensional array
+        Array of red and blue SMFs in the layout of mp_init
+    """
+    # Draws are ranked by the chi^2 stored with each record, which is in the
+    # step-major order of the blob file
+    draws = posterior_draws(read_blobs(blob_file))
+    result = []
+    for idx in np.array_split(np.arange(len(draws['phi_red'])), num_chunks):
+        result.append([[maxis_red] * len(idx), list(draws['phi_red'][idx]),
+            [maxis_blue] * len(idx), list(draws['phi_blue'][idx])])
+    return result
+
 def plot_mf(result, red_data, blue_data, maxis_bf_red, phi_bf_red, 
     maxis_bf_blue, phi_bf_blue, bf_chi2):
     """
@@ -1075,36 +1115,12 @@ def plot_mf(result, red_data, blue_data, maxis_bf_red, phi_bf_red,
     plt.errorbar(maxis_blue_data,phi_blue_data,yerr=asymmetric_err,color='b',fmt='s',
         ecolor='b',markersize=5,capsize=5,capthick=0.5,
         label='data',zorder=10)
-    for idx in range(len(result[0][0])):
-        plt.plot(result[0][0][idx],result[0][1][idx],color='red',
-            linestyle='-',alpha=0.3,zorder=0,label='model')
-    for idx in range(len(result[0][2])):
-        plt.plot(result[0][2][idx],result[0][3][idx],color='blue',
-            linestyle='-',alpha=0.3,zorder=0,label='model')
-    for idx in range(len(result[1][0])):
-        plt.plot(result[1][0][idx],result[1][1][idx],color='red',
-            linestyle='-',alpha=0.3,zorder=1)
-    for idx in range(len(result[1][2])):
-        plt.plot(result[1][2][idx],result[1][3][idx],color='blue',
-            linestyle='-',alpha=0.3,zorder=0,label='model')
-    for idx in range(len(result[2][0])):
-        plt.plot(result[2][0][idx],result[2][1][idx],color='red',
-            linestyle='-',alpha=0.3,zorder=2)
-    for idx in range(len(result[2][2])):
-        plt.plot(result[2][2][idx],result[2][3][idx],color='blue',
-            linestyle='-',alpha=0.3,zorder=2)
-    for idx in range(len(result[3][0])):
-        plt.plot(result[3][0][idx],result[3][1][idx],color='red',
-            linestyle='-',alpha=0.3,zorder=3)
-    for idx in range(len(result[3][2])):
-        plt.plot(result[3][2][idx],result[3][3][idx],color='blue',
-            linestyle='-',alpha=0.3,zorder=3)
-    for idx in range(len(result[4][0])):
-        plt.plot(result[4][0][idx],result[4][1][idx],color='red',
-            linestyle='-',alpha=0.3,zorder=4)
-    for idx in range(len(result[4][2])):
-        plt.plot(result[4][2][idx],result[4][3][idx],color='blue',
-            linestyle='-',alpha=0.3,zorder=4)
+    maxis_red_arr, phi_red_arr = stack_draws(result, 0, 1)
+    maxis_blue_arr, phi_blue_arr = stack_draws(result, 2, 3)
+    plot_draws(plt.gca(), maxis_red_arr, phi_red_arr, 'red', draw_mode,
+        alpha=0.3, label='model')
+    plot_draws(plt.gca(), maxis_blue_arr, phi_blue_arr, 'blue', draw_mode,
+        alpha=0.3, label='model')
     # lower_err = np.log10((10**phi_model_bf) - err_tot_model_bf)
     # upper_err = np.log10((10**phi_model_bf) + err_tot_model_bf)
     # lower_err = phi_model_bf - lower_err
@@ -1119,14 +1135,14 @@ def plot_mf(result, red_data, blue_data, maxis_bf_red, phi_bf_red,
         capsize=5,capthick=0.5,label='best fit',zorder=10)
     plt.ylim(-5,-1)
     if mf_type == 'smf':
-        plt.xlabel(r'\boldmath$\log_{10}\ M_\star \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$', fontsize=20)
+        plt.xlabel(tex_label(r'\boldmath$\log_{10}\ M_\star \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'), fontsize=20)
     elif mf_type == 'bmf':
-        plt.xlabel(r'\boldmath$\log_{10}\ M_{b} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$', fontsize=20)
-    plt.ylabel(r'\boldmath$\Phi \left[\mathrm{dex}^{-1}\,\mathrm{Mpc}^{-3}\,\mathrm{h}^{3} \right]$', fontsize=20)
+        plt.xlabel(tex_label(r'\boldmath$\log_{10}\ M_{b} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'), fontsize=20)
+    plt.ylabel(tex_label(r'\boldmath$\Phi \left[\mathrm{dex}^{-1}\,\mathrm{Mpc}^{-3}\,\mathrm{h}^{3} \right]$'), fontsize=20)
     handles, labels = plt.gca().get_legend_handles_labels()
     by_label = OrderedDict(zip(labels, handles))
     plt.legend(by_label.values(), by_label.keys(), loc='best',prop={'size': 20})
-    plt.annotate(r'$\boldsymbol\chi ^2 \approx$ {0}'.format(np.round(bf_chi2,2)), 
+    plt.annotate(tex_label(r'$\boldsymbol\chi ^2 \approx$ {0}').format(np.round(bf_chi2,2)),
         xy=(0.1, 0.1), xycoords='axes fraction', bbox=dict(boxstyle="square", 
         ec='k', fc='lightgray', alpha=0.5), size=15)
     plt.show()
@@ -1234,7 +1250,7 @@ def plot_xmhm(result, gals_bf_red, halos_bf_red, gals_bf_blue, halos_bf_blue,
         plt.xlim(10,14)
     else:
         plt.xlim(10,)
-    plt.xlabel(r'\boldmath$\log_{10}\ M_{h} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$',fontsize=20)
+    plt.xlabel(tex_label(r'\boldmath$\log_{10}\ M_{h} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'),fontsize=20)
     if mf_type == 'smf':
         if survey == 'eco':
             plt.ylim(np.log10((10**8.9)/2.041),)
@@ -1242,17 +1258,17 @@ def plot_xmhm(result, gals_bf_red, halos_bf_red, gals_bf_blue, halos_bf_blue,
             plt.ylim(np.log10((10**8.9)/2.041),13)
         elif survey == 'resolveb':
             plt.ylim(np.log10((10**8.7)/2.041),)
-        plt.ylabel(r'\boldmath$\log_{10}\ M_\star \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$',fontsize=20)
+        plt.ylabel(tex_label(r'\boldmath$\log_{10}\ M_\star \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'),fontsize=20)
     elif mf_type == 'bmf':
         if survey == 'eco' or survey == 'resolvea':
             plt.ylim(np.log10((10**9.4)/2.041),)
         elif survey == 'resolveb':
             plt.ylim(np.log10((10**9.1)/2.041),)
-        plt.ylabel(r'\boldmath$\log_{10}\ M_{b} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$',fontsize=20)
+        plt.ylabel(tex_label(r'\boldmath$\log_{10}\ M_{b} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'),fontsize=20)
     handles, labels = plt.gca().get_legend_handles_labels()
     by_label = OrderedDict(zip(labels, handles))
     plt.legend(by_label.values(), by_label.keys(), loc='best',prop={'size': 20})
-    plt.annotate(r'$\boldsymbol\chi ^2 \approx$ {0}'.format(np.round(bf_chi2,2)), 
+    plt.annotate(tex_label(r'$\boldsymbol\chi ^2 \approx$ {0}').format(np.round(bf_chi2,2)),
         xy=(0.8, 0.1), xycoords='axes fraction', bbox=dict(boxstyle="square", 
         ec='k', fc='lightgray', alpha=0.5), size=15)
     plt.show()
@@ -1275,6 +1291,9 @@ machine = 'mac'
 mf_type = 'smf'
 survey = 'eco'
 nproc = 2
+# multiprocessing, mpi (run with mpirun -n N) or dask, see src.mcmc.pools
+pool_backend = 'multiprocessing'
+dask_address = None
 
 if machine == 'bender':
     halo_catalog = '/home/asadm2/.astropy/cache/halotools/halo_catalogs/'\
@@ -1284,6 +1303,7 @@ elif machine == 'mac':
 
 chi2_file = path_to_proc + '{0}_colour_chi2.txt'.format(survey)
 chain_file = path_to_proc + 'mcmc_{0}_colour_raw.txt'.format(survey)
+blob_file = blob_fname(survey, 'colour', path=path_to_proc)
 
 if survey == 'eco':
     catl_file = path_to_raw + "eco_all.csv"
@@ -1328,13 +1348,20 @@ gals_df_ = assign_cen_sat_flag(gals_df_)
 gals_df_ = gals_df_[['stellar_mass', 'C_S', 'halo_mvir', 'halo_mvir_host_halo',
     'halo_macc','halo_hostid', 'halo_id']]
 
-print('Multiprocessing')
-result = mp_init(mcmc_table_pctl, nproc)
-
 print('Getting best fit model')
 maxis_bf_red, phi_bf_red, maxis_bf_blue, phi_bf_blue, cen_gals_red, \
     cen_halos_red, cen_gals_blue, cen_halos_blue = get_best_fit_model(bf_params)
 
+if os.path.exists(blob_file):
+    # Chains run with --blobs need no new model SMFs
+    print('Reading model SMFs of posterior draws')
+    result = blob_init(blob_file, maxis_bf_red, maxis_bf_blue)
+else:
+    print('Multiprocessing')
+    result = mp_init(mcmc_table_pctl, nproc)
+    if not is_master(pool_backend):
+        raise SystemExit
+
 plot_mf(result, red_data, blue_data, maxis_bf_red, phi_bf_red, 
     maxis_bf_blue, phi_bf_blue, bf_chi2)
 
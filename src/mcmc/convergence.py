@@ -0,0 +1,206 @@
+"""
+{This module decides when a chain has converged from its integrated
+ autocorrelation time. Walker positions are kept in memory as the sampler
+ runs, tau is re-estimated every K steps and the run stops once the chain is
+ longer than M times tau and tau has stopped changing. Every check is
+ appended to a log as one JSON line}
+"""
+
+# Built-in/Generic Imports
+import json
+
+# Libs
+import numpy as np
+
+__author__ = '{Mehnaaz Asad}'
+
+
+def autocorr_func(x_arr):
+    """
+    Normalized autocorrelation function of each column using FFTs
+
+    Parameters
+    ----------
+    x_arr: array
+        Array of shape (number of steps, number of series)
+
+    Returns
+    ---------
+    acf: array
+        Autocorrelation of each series with the same shape as x_arr
+    """
+    num_steps = x_arr.shape[0]
+    # Zero pad to next power of 2 to avoid circular correlation
+    num_fft = 2**int(np.ceil(np.log2(2 * num_steps)))
+    x_arr = x_arr - x_arr.mean(axis=0)
+    fft_arr = np.fft.rfft(x_arr, n=num_fft, axis=0)
+    acf = np.fft.irfft(fft_arr * np.conjugate(fft_arr), axis=0)[:num_steps]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        acf /= acf[0]
+    return acf
+
+def integrated_time(chain, c=5):
+    """
+    Integrated autocorrelation time of each parameter, using the walker
+    averaged autocorrelation function and the automatic window of Sokal
+    (1989) as in emcee
+
+    Parameters
+    ----------
+    chain: array
+        Array of shape (number of steps, number of walkers, number of
+        parameters)
+
+    c: float, optional
+        Window is the smallest M with M >= c * tau(M)
+
+    Returns
+    ---------
+    tau: array
+        Autocorrelation time of each parameter in steps
+    """
+    num_steps, num_walkers, ndim = chain.shape
+    acf = autocorr_func(chain.reshape(num_steps, num_walkers * ndim))
+    acf = acf.reshape(num_steps, num_walkers, ndim).mean(axis=1)
+    taus = 2 * np.cumsum(acf, axis=0) - 1
+    windows = np.arange(num_steps)[:, None] >= c * taus
+    # First step satisfying window condition, last step if none does
+    window = np.where(windows.any(axis=0), np.argmax(windows, axis=0),
+        num_steps - 1)
+    return taus[window, np.arange(ndim)]
+
+
+class ConvergenceMonitor(object):
+    """
+    Tracks autocorrelation time of a running chain and decides when to stop
+    """
+    def __init__(self, nwalkers, ndim, check_every, tau_factor=50,
+        tau_rtol=0.01, log_fname=None):
+        """
+        Parameters
+        ----------
+        nwalkers: int
+            Number of walkers
+
+        ndim: int
+            Number of parameters
+
+        check_every: int
+            Number of steps between estimates of tau
+
+        tau_factor: float, optional
+            Chain has to be longer than tau_factor times the largest tau
+
+        tau_rtol: float, optional
+            Largest relative change of tau between two checks
+
+        log_fname: string, optional
+            Path to JSON lines log of checks
+        """
+        self.check_every = check_every
+        self.tau_factor = tau_factor
+        self.tau_rtol = tau_rtol
+        self.log_fname = log_fname
+        self.num_steps = 0
+        self.tau = None
+        self.converged = False
+        self._chain = np.empty((max(check_every, 1), nwalkers, ndim))
+
+    def load_history(self, positions):
+        """
+        Adds positions of steps taken before a resume
+
+        Parameters
+        ----------
+        positions: array
+            Array of shape (number of steps, nwalkers, ndim)
+        """
+        for position in positions:
+            self.add(position)
+
+    def add(self, position):
+        """Stores walker positions of one step"""
+        if self.num_steps == len(self._chain):
+            # Grow by doubling so appends stay amortized constant time
+            self._chain = np.concatenate([self._chain,
+                np.empty_like(self._chain)])
+        self._chain[self.num_steps] = position
+        self.num_steps += 1
+
+    def check(self):
+        """
+        Re-estimates tau every check_every steps
+
+        Returns
+        ---------
+        converged: boolean
+            True once chain is longer than tau_factor * tau and tau changed
+            by less than tau_rtol since the last check
+        """
+        if self.num_steps % self.check_every != 0:
+            return self.converged
+        tau = integrated_time(self._chain[:self.num_steps])
+        tau_max = float(np.max(tau))
+        long_enough = bool(self.num_steps > self.tau_factor * tau_max)
+        if self.tau is None:
+            tau_change = None
+            stable = False
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                tau_change = float(np.max(np.abs(self.tau - tau) / tau))
+            stable = bool(tau_change < self.tau_rtol)
+        self.tau = tau
+        self.converged = long_enough and stable
+        self.log({'step': self.num_steps, 'tau': tau.tolist(),
+            'tau_max': tau_max, 'min_steps': self.tau_factor * tau_max,
+            'tau_change': tau_change, 'converged': self.converged})
+        return self.converged
+
+    def log(self, entry):
+        """Prints a check and appends it to the log file"""
+        if entry['tau_change'] is None:
+            change = 'n/a'
+        else:
+            change = '{0:.3f}'.format(entry['tau_change'])
+        print('Step {0}: tau_max = {1:.1f} (need {2:.0f} steps), relative '
+            'change {3}{4}'.format(entry['step'], entry['tau_max'],
+            entry['min_steps'], change,
+            ' -> converged' if entry['converged'] else ''))
+        if self.log_fname is not None:
+            with open(self.log_fname, 'a') as outfile:
+                outfile.write(json.dumps(entry))
+                outfile.write('\n')
+
+
+def read_chain_positions(filename, nwalkers, ndim):
+    """
+    Reads walker positions of every step from a raw chain file
+
+    Parameters
+    ----------
+    filename: string
+        Raw chain file with walker positions and '# New slice' after every
+        step. Positions printed in exponent format can wrap over two lines.
+
+    nwalkers: int
+        Number of walkers
+
+    ndim: int
+        Number of parameters
+
+    Returns
+    ---------
+    positions: array
+        Array of shape (number of steps, nwalkers, ndim)
+    """
+    marker = '# New slice'
+    with open(filename, 'r') as infile:
+        text = infile.read()
+    # Anything after the last marker is an incomplete step
+    text = text[:text.rfind(marker)] if marker in text else ''
+    values = np.array(text.replace(marker, ' ').split(), dtype=float)
+    if values.size % (nwalkers * ndim) != 0:
+        msg = '{0} has {1} values, not a multiple of {2} walkers x {3} '\
+            'parameters'.format(filename, values.size, nwalkers, ndim)
+        raise ValueError(msg)
+    return values.reshape(-1, nwalkers, ndim)
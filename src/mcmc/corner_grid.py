@@ -0,0 +1,399 @@
+"""
+{This module builds corner plots of long chains from compact grids instead of
+ samples. The raw chain file is streamed in chunks of steps after burn-in and
+ thinning, every chunk is binned into fixed-grid 1-D and 2-D histograms, and
+ contours are drawn at the density levels enclosing the requested credible
+ mass. Memory is set by the grid and chunk size, not by the chain length}
+"""
+
+# Built-in/Generic Imports
+from itertools import combinations, islice
+
+# Libs
+from scipy.ndimage import gaussian_filter
+import numpy as np
+
+__author__ = '{Mehnaaz Asad}'
+
+MARKER = '#'
+# Number of lines parsed at once while streaming a chain file
+CHUNK_LINES = 200000
+
+
+def iter_chain_chunks(filename, nwalkers, ndim, burn=0, thin=1, nsteps=None,
+    chunk_lines=CHUNK_LINES):
+    """
+    Streams samples of a raw chain file after burn-in and thinning
+
+    Values are read as a flat stream, so positions wrapped over two lines
+    and files with or without '# New slice' markers are read alike.
+
+    Parameters
+    ----------
+    filename: string
+        Raw chain file with the positions of all walkers after every step, as
+        written while sampling
+
+    nwalkers: int
+        Number of walkers
+
+    ndim: int
+        Number of parameters
+
+    burn: int, optional
+        Number of steps discarded from the start of the chain
+
+    thin: int, optional
+        Keep every thin-th step after burn-in
+
+    nsteps: int, optional
+        Number of steps of a walker-major file (every step of one walker
+        after the other) as written by write_to_files. None for files written
+        while sampling.
+
+    chunk_lines: int, optional
+        Number of lines parsed at once
+
+    Returns
+    ---------
+    chunks: generator
+        Arrays of shape (number of samples, ndim). Walker positions with a
+        non-finite value are dropped.
+    """
+    # A block is one step of all walkers or all steps of one walker
+    if nsteps is None:
+        block_shape = (nwalkers, ndim)
+    else:
+        block_shape = (nsteps, ndim)
+    block_size = block_shape[0] * ndim
+    leftover = np.empty(0)
+    num_read = 0
+    with open(filename, 'r') as infile:
+        while True:
+            raw_lines = list(islice(infile, chunk_lines))
+            if not raw_lines and not leftover.size:
+                return
+            # A chunk of only markers is not the end of the file
+            lines = [line for line in raw_lines if not
+                line.lstrip().startswith(MARKER)]
+            values = np.concatenate([leftover, np.array(' '.join(lines).\
+                split(), dtype=float)])
+            num_blocks = values.size // block_size
+            leftover = values[num_blocks * block_size:]
+            blocks = values[:num_blocks * block_size].reshape((num_blocks,) +
+                block_shape)
+            if nsteps is None:
+                steps = np.arange(num_read, num_read + num_blocks)
+                keep = (steps >= burn) & ((steps - burn) % thin == 0)
+                samples = blocks[keep]
+            else:
+                samples = blocks[:, burn::thin]
+            num_read += num_blocks
+            samples = samples.reshape(-1, ndim)
+            samples = samples[np.all(np.isfinite(samples), axis=1)]
+            if len(samples):
+                yield samples
+            if not raw_lines:
+                # Incomplete last block
+                return
+
+def chain_ranges(chunks, pad=0.05):
+    """
+    Range of each parameter over all chunks, padded on both sides
+
+    Parameters
+    ----------
+    chunks: iterable
+        Arrays of shape (number of samples, ndim)
+
+    pad: float, optional
+        Padding as a fraction of the range
+
+    Returns
+    ---------
+    ranges: array
+        Array of shape (ndim, 2)
+    """
+    lower, upper = None, None
+    for samples in chunks:
+        if lower is None:
+            lower, upper = samples.min(axis=0), samples.max(axis=0)
+        else:
+            lower = np.minimum(lower, samples.min(axis=0))
+            upper = np.maximum(upper, samples.max(axis=0))
+    if lower is None:
+        msg = 'No samples left after burn-in'
+        raise ValueError(msg)
+    width = np.where(upper > lower, upper - lower, 1.)
+    return np.column_stack([lower - pad * width, upper + pad * width])
+
+
+class CornerGrid(object):
+    """
+    1-D and 2-D histograms of a chain on fixed grids
+    """
+    def __init__(self, ranges, bins=60):
+        """
+        Parameters
+        ----------
+        ranges: array
+            Array of shape (ndim, 2) of grid limits of each parameter
+
+        bins: int, optional
+            Number of bins per parameter
+        """
+        self.ranges = np.asarray(ranges, dtype=float)
+        self.bins = bins
+        self.ndim = len(self.ranges)
+        self.pairs = list(combinations(range(self.ndim), 2))
+        self.hist1d = np.zeros((self.ndim, bins))
+        self.hist2d = np.zeros((len(self.pairs), bins, bins))
+        self.num_samples = 0
+        self.num_outside = 0
+
+    def edges(self, idx):
+        """Bin edges of parameter idx"""
+        return np.linspace(*self.ranges[idx], self.bins + 1)
+
+    def add(self, samples, weights=None):
+        """
+        Adds samples to the histograms
+
+        Parameters
+        ----------
+        samples: array
+            Array of shape (number of samples, ndim)
+
+        weights: array, optional
+            Weight of each sample, e.g. importance weights
+        """
+        lower, upper = self.ranges[:, 0], self.ranges[:, 1]
+        idx = np.floor((samples - lower) / (upper - lower) *
+            self.bins).astype(int)
+        inside = np.all((idx >= 0) & (idx < self.bins), axis=1)
+        self.num_samples += len(samples)
+        self.num_outside += int(np.count_nonzero(~inside))
+        idx = idx[inside]
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float)[inside]
+        for dim in range(self.ndim):
+            self.hist1d[dim] += np.bincount(idx[:, dim], weights,
+                minlength=self.bins)
+        for pair, (dim_x, dim_y) in enumerate(self.pairs):
+            # Flat index of the (x, y) cell, y varying fastest
+            flat = idx[:, dim_x] * self.bins + idx[:, dim_y]
+            self.hist2d[pair] += np.bincount(flat, weights,
+                minlength=self.bins**2).reshape(self.bins, self.bins)
+
+    def pair_hist(self, dim_x, dim_y):
+        """2-D histogram of parameters dim_x < dim_y, indexed [x, y]"""
+        return self.hist2d[self.pairs.index((dim_x, dim_y))]
+
+    def save(self, filename):
+        """Writes grids to a .npz file"""
+        np.savez(filename, ranges=self.ranges, hist1d=self.hist1d,
+            hist2d=self.hist2d, num_samples=self.num_samples,
+            num_outside=self.num_outside)
+
+    @classmethod
+    def load(cls, filename):
+        """Reads grids written by save"""
+        with np.load(filename) as saved:
+            grid = cls(saved['ranges'], saved['hist1d'].shape[1])
+            grid.hist1d = saved['hist1d']
+            grid.hist2d = saved['hist2d']
+            grid.num_samples = int(saved['num_samples'])
+            grid.num_outside = int(saved['num_outside'])
+        return grid
+
+def grid_from_chain(filename, nwalkers, ndim, burn=0, thin=1, nsteps=None,
+    bins=60, ranges=None):
+    """
+    Streams a raw chain file into a CornerGrid
+
+    Parameters
+    ----------
+    filename: string
+        Raw chain file, see iter_chain_chunks
+
+    nwalkers, ndim: int
+        Number of walkers and parameters
+
+    burn, thin, nsteps: int, optional
+        Burn-in steps, thinning and layout, see iter_chain_chunks
+
+    bins: int, optional
+        Number of bins per parameter
+
+    ranges: array, optional
+        Grid limits of each parameter. If None, a first pass over the file
+        finds them.
+
+    Returns
+    ---------
+    grid: CornerGrid
+        Histograms of the chain
+    """
+    if ranges is None:
+        ranges = chain_ranges(iter_chain_chunks(filename, nwalkers, ndim,
+            burn, thin, nsteps))
+    grid = CornerGrid(ranges, bins)
+    for samples in iter_chain_chunks(filename, nwalkers, ndim, burn, thin,
+        nsteps):
+        grid.add(samples)
+    return grid
+
+def credible_levels(hist, masses=(0.6827, 0.9545)):
+    """
+    Density levels of a histogram enclosing the given credible masses
+
+    Parameters
+    ----------
+    hist: array
+        Histogram of any shape
+
+    masses: tuple, optional
+        Enclosed fractions, by default 1 and 2 sigma of a 2-D Gaussian in
+        the 1-D sense
+
+    Returns
+    ---------
+    levels: array
+        Level of each mass, highest density first
+    """
+    values = np.sort(hist.ravel())[::-1]
+    cumulative = np.cumsum(values)
+    if cumulative[-1] <= 0:
+        return np.zeros(len(masses))
+    cumulative /= cumulative[-1]
+    idx = np.minimum(np.searchsorted(cumulative, masses), len(values) - 1)
+    return values[idx]
+
+def marginal_summary(hist, edges, pctl=(15.865, 50., 84.135)):
+    """
+    Percentiles of a 1-D histogram, interpolated within bins
+
+    Parameters
+    ----------
+    hist: array
+        1-D histogram
+
+    edges: array
+        Bin edges
+
+    pctl: tuple, optional
+        Percentiles, by default the median and 68% interval
+
+    Returns
+    ---------
+    values: array
+        Parameter value of each percentile
+    """
+    cumulative = np.concatenate([[0.], np.cumsum(hist)])
+    cumulative /= cumulative[-1]
+    return np.interp(np.asarray(pctl) / 100., cumulative, edges)
+
+def plot_corner(grids, labels, names=None, colors=None, truths=None,
+    masses=(0.6827, 0.9545), smooth=1., fig=None):
+    """
+    Corner plot drawn from CornerGrids
+
+    Parameters
+    ----------
+    grids: list
+        CornerGrid of each chain
+
+    labels: list
+        Axis label of each parameter
+
+    names: list, optional
+        Legend entry of each chain
+
+    colors: list, optional
+        Color of each chain
+
+    truths: array, optional
+        Reference value of each parameter drawn as lines
+
+    masses: tuple, optional
+        Credible masses of the 2-D contours
+
+    smooth: float, optional
+        Width in bins of the Gaussian smoothing of the grids (0: off)
+
+    fig: matplotlib figure, optional
+        Figure to draw on
+
+    Returns
+    ---------
+    fig: matplotlib figure
+        Corner plot
+    """
+    import matplotlib.pyplot as plt
+
+    ndim = grids[0].ndim
+    if fig is None:
+        fig = plt.figure(figsize=(2.5 * ndim, 2.5 * ndim))
+    axes = fig.subplots(ndim, ndim, squeeze=False)
+    if colors is None:
+        colors = ['C{0}'.format(idx) for idx in range(len(grids))]
+    if names is None:
+        names = [None] * len(grids)
+
+    for grid, color, name in zip(grids, colors, names):
+        centers = [0.5 * (grid.edges(dim)[1:] + grid.edges(dim)[:-1]) for
+            dim in range(ndim)]
+        for dim in range(ndim):
+            hist = gaussian_filter(grid.hist1d[dim], smooth) if smooth else \
+                grid.hist1d[dim]
+            axes[dim, dim].plot(centers[dim], hist / hist.max(), color=color,
+                label=name)
+            lower, median, upper = marginal_summary(grid.hist1d[dim],
+                grid.edges(dim))
+            axes[dim, dim].axvspan(lower, upper, color=color, alpha=0.15,
+                lw=0)
+            axes[dim, dim].axvline(median, color=color, lw=1)
+        for dim_x, dim_y in grid.pairs:
+            hist = grid.pair_hist(dim_x, dim_y)
+            if smooth:
+                hist = gaussian_filter(hist, smooth)
+            levels = np.unique(credible_levels(hist, masses))
+            if len(levels) and levels[-1] > 0:
+                # Filled from the outermost level up to the peak
+                axes[dim_y, dim_x].contourf(centers[dim_x], centers[dim_y],
+                    hist.T, np.unique(np.append(levels, hist.max())),
+                    colors=[color],
+                    alpha=0.3)
+                axes[dim_y, dim_x].contour(centers[dim_x], centers[dim_y],
+                    hist.T, levels, colors=[color], linewidths=1)
+
+    for row in range(ndim):
+        for col in range(ndim):
+            ax = axes[row, col]
+            if col > row:
+                ax.set_axis_off()
+                continue
+            ax.set_xlim(min(grid.ranges[col, 0] for grid in grids),
+                max(grid.ranges[col, 1] for grid in grids))
+            if col < row:
+                ax.set_ylim(min(grid.ranges[row, 0] for grid in grids),
+                    max(grid.ranges[row, 1] for grid in grids))
+                if truths is not None:
+                    ax.axhline(truths[row], color='k', ls='--', lw=1)
+            else:
+                ax.set_yticks([])
+            if truths is not None:
+                ax.axvline(truths[col], color='k', ls='--', lw=1)
+            if row == ndim - 1:
+                ax.set_xlabel(labels[col])
+            else:
+                ax.set_xticklabels([])
+            if col == 0 and row > 0:
+                ax.set_ylabel(labels[row])
+            elif col > 0:
+                ax.set_yticklabels([])
+    if any(name is not None for name in names):
+        axes[0, 0].legend(*axes[0, 0].get_legend_handles_labels(),
+            loc='upper left', bbox_to_anchor=(ndim - 1, 1), frameon=False)
+    fig.subplots_adjust(hspace=0.05, wspace=0.05)
+    return fig
@@ -0,0 +1,175 @@
+"""
+{This module draws posterior draws of the mass function and SMHM in one
+ artist instead of one plot call per draw: either all curves as a single
+ LineCollection or filled percentile bands computed once from the draws.
+ Text is rendered with matplotlib's mathtext for quick drafts or with LaTeX
+ for final figures}
+"""
+
+# Libs
+from matplotlib.collections import LineCollection
+from matplotlib import rc
+import numpy as np
+
+__author__ = '{Mehnaaz Asad}'
+
+DRAW_MODES = ('lines', 'band')
+TEXT_MODES = ('mathtext', 'latex')
+# Percentile pairs of the bands, inner band first
+BAND_PCTL = ((16, 84), (2.5, 97.5))
+
+text_mode = 'latex'
+
+
+def set_text_mode(mode):
+    """
+    Chooses how text of figures is rendered
+
+    Parameters
+    ----------
+    mode: string
+        'latex' renders with a LaTeX installation (slow, final quality).
+        'mathtext' uses matplotlib's built-in parser (fast, for drafts).
+    """
+    global text_mode
+    if mode not in TEXT_MODES:
+        msg = '`mode` ({0}) not supported! Options: {1}'.format(mode,
+            '/'.join(TEXT_MODES))
+        raise ValueError(msg)
+    text_mode = mode
+    if mode == 'latex':
+        rc('text', usetex=True)
+        rc('text.latex', preamble=r"\usepackage{amsmath}")
+    else:
+        rc('text', usetex=False)
+        rc('mathtext', fontset='dejavusans', default='bf')
+
+def tex_label(text):
+    """
+    Label written for LaTeX in the current text mode. Mathtext has no
+    \\boldmath or \\boldsymbol, its math is set in bold instead.
+    """
+    if text_mode == 'latex':
+        return text
+    return text.replace(r'\boldmath', '').replace(r'\boldsymbol', '')
+
+def stack_draws(result, x_idx, y_idx):
+    """
+    Curves of all posterior draws of the chunks returned by mp_init
+
+    Parameters
+    ----------
+    result: list
+        Output of each chunk
+
+    x_idx, y_idx: int
+        Index of the x-axis and y-axis arrays in the output of a chunk
+
+    Returns
+    ---------
+    x_arr, y_arr: array
+        Arrays of shape (number of draws, number of points)
+    """
+    x_arr = np.concatenate([np.atleast_2d(chunk[x_idx]) for chunk in result])
+    y_arr = np.concatenate([np.atleast_2d(chunk[y_idx]) for chunk in result])
+    return x_arr, y_arr
+
+def percentile_bands(y_arr, pctl=BAND_PCTL):
+    """
+    Percentiles of the draws at every point, ignoring NaNs
+
+    Parameters
+    ----------
+    y_arr: array
+        Array of shape (number of draws, number of points)
+
+    pctl: tuple, optional
+        Percentile pairs of the bands
+
+    Returns
+    ---------
+    bands: list
+        (lower, upper) arrays of each band
+    """
+    return [tuple(np.nanpercentile(y_arr, pair, axis=0)) for pair in pctl]
+
+def plot_bands(ax, x, bands, color, alpha=0.4, label=None, zorder=0):
+    """
+    Fills percentile bands, each outer band fainter than the one inside
+
+    Parameters
+    ----------
+    ax: matplotlib axes
+        Axes to draw on
+
+    x: array
+        x-axis values shared by all draws
+
+    bands: list
+        Output of percentile_bands
+
+    color: string
+        Fill color
+
+    alpha: float, optional
+        Opacity of the innermost band
+
+    label: string, optional
+        Legend entry of the innermost band
+
+    zorder: float, optional
+        Drawing order
+    """
+    for idx, (lower, upper) in enumerate(bands):
+        ax.fill_between(x, lower, upper, color=color, alpha=alpha / (idx + 1),
+            lw=0, zorder=zorder, label=label if idx == 0 else None)
+
+def plot_draws(ax, x_arr, y_arr, color, mode='lines', alpha=0.5, label=None,
+    zorder=0):
+    """
+    Draws all posterior draws with one artist
+
+    Parameters
+    ----------
+    ax: matplotlib axes
+        Axes to draw on
+
+    x_arr: array
+        x-axis values, shape (number of points,) if shared by all draws or
+        (number of draws, number of points)
+
+    y_arr: array
+        Array of shape (number of draws, number of points)
+
+    color: string
+        Line or fill color
+
+    mode: string, optional
+        'lines' draws every curve in a LineCollection, 'band' fills the
+        percentile bands of the draws
+
+    alpha: float, optional
+        Opacity of the lines or the innermost band
+
+    label: string, optional
+        Legend entry
+
+    zorder: float, optional
+        Drawing order
+    """
+    y_arr = np.atleast_2d(y_arr)
+    x_arr = np.broadcast_to(x_arr, y_arr.shape)
+    if mode == 'band':
+        # Draws are measured on fixed bins
+        plot_bands(ax, x_arr[0], percentile_bands(y_arr), color, alpha,
+            label, zorder)
+    elif mode == 'lines':
+        lines = LineCollection(np.stack([x_arr, y_arr], axis=-1),
+            colors=color, alpha=alpha, linestyles='-', zorder=zorder,
+            label=label)
+        ax.add_collection(lines)
+        ax.autoscale_view()
+    else:
+        msg = '`mode` ({0}) not supported! Options: {1}'.format(mode,
+            '/'.join(DRAW_MODES))
+        raise ValueError(msg)
@@ -0,0 +1,442 @@
+"""
+{This module emulates the binned mass functions of the forward model as a
+ function of theta. Forward-model runs on a Latin hypercube design are
+ compressed with PCA and every component is interpolated with a Gaussian
+ process, so a likelihood evaluation costs a few small matrix products
+ instead of a halotools population. The emulator uncertainty enters the
+ likelihood as an extra covariance and an optional refinement stage
+ importance-weights posterior samples with true forward-model evaluations}
+"""
+
+# Built-in/Generic Imports
+import json
+import os
+
+# Libs
+from scipy.linalg import cho_factor, cho_solve, solve_triangular, cholesky
+from scipy.optimize import minimize
+import numpy as np
+
+from src.mcmc.reweight import importance_weights, effective_sample_size
+
+__author__ = '{Mehnaaz Asad}'
+
+# Added to the kernel diagonal to keep Cholesky factorizations stable
+JITTER = 1e-10
+
+
+def latin_hypercube(bounds, num, seed=None):
+    """
+    Space-filling design with exactly one point in each of num equal strata
+    of every parameter
+
+    Parameters
+    ----------
+    bounds: array
+        Array of shape (number of parameters, 2) of lower and upper limits
+
+    num: int
+        Number of design points
+
+    seed: int, optional
+        Seed of random number generator
+
+    Returns
+    ---------
+    design: array
+        Array of shape (num, number of parameters)
+    """
+    bounds = np.asarray(bounds, dtype=float)
+    rng = np.random.default_rng(seed)
+    # Independent random order of strata per parameter, random point inside
+    strata = np.argsort(rng.random((num, len(bounds))), axis=0)
+    unit = (strata + rng.random((num, len(bounds)))) / num
+    return bounds[:, 0] + unit * (bounds[:, 1] - bounds[:, 0])
+
+
+class GaussianProcess(object):
+    """
+    Gaussian process regression of a scalar with a squared exponential
+    kernel, one length scale per input and a white noise term. Parameters
+    are stored as logs of (amplitude, length scales..., noise).
+    """
+    def __init__(self, x_arr, y_arr, log_params=None):
+        """
+        Parameters
+        ----------
+        x_arr: array
+            Array of shape (number of points, number of inputs), inputs
+            scaled to the unit cube
+
+        y_arr: array
+            Values at x_arr
+
+        log_params: array, optional
+            Kernel parameters. Maximum likelihood values are found if None.
+        """
+        self.x_arr = np.asarray(x_arr, dtype=float)
+        self.y_arr = np.asarray(y_arr, dtype=float)
+        if log_params is None:
+            log_params = self.optimize()
+        self.log_params = np.asarray(log_params, dtype=float)
+        self.amp2 = np.exp(2 * self.log_params[0])
+        self.scales = np.exp(self.log_params[1:-1])
+        kernel = self.kernel(self.x_arr, self.x_arr, self.log_params)
+        kernel[np.diag_indices_from(kernel)] += \
+            np.exp(2 * self.log_params[-1]) + JITTER
+        self.chol = cholesky(kernel, lower=True)
+        self.alpha = cho_solve((self.chol, True), self.y_arr)
+
+    @staticmethod
+    def kernel(x1_arr, x2_arr, log_params):
+        """Squared exponential kernel matrix between two sets of points"""
+        amp2 = np.exp(2 * log_params[0])
+        scales = np.exp(log_params[1:-1])
+        diff = x1_arr[:, None, :] / scales - x2_arr[None, :, :] / scales
+        return amp2 * np.exp(-0.5 * np.sum(diff**2, axis=-1))
+
+    def neg_log_likelihood(self, log_params):
+        """Negative log marginal likelihood of training values"""
+        kernel = self.kernel(self.x_arr, self.x_arr, log_params)
+        kernel[np.diag_indices_from(kernel)] += np.exp(2 * log_params[-1]) + \
+            JITTER
+        try:
+            factor = cho_factor(kernel, lower=True)
+        except np.linalg.LinAlgError:
+            return np.inf
+        alpha = cho_solve(factor, self.y_arr)
+        return 0.5 * np.dot(self.y_arr, alpha) + \
+            np.sum(np.log(np.diag(factor[0])))
+
+    def optimize(self):
+        """Maximum likelihood kernel parameters"""
+        ndim = self.x_arr.shape[1]
+        log_std = np.log(max(np.std(self.y_arr), 1e-10))
+        start = np.concatenate([[log_std], np.full(ndim, np.log(0.3)),
+            [log_std + np.log(1e-3)]])
+        bounds = [(log_std - 5, log_std + 5)] + \
+            [(np.log(1e-2), np.log(1e1))] * ndim + \
+            [(log_std + np.log(1e-6), log_std)]
+        result = minimize(self.neg_log_likelihood, start, method='L-BFGS-B',
+            bounds=bounds)
+        return result.x
+
+    def predict(self, x_arr):
+        """
+        Predictive mean and variance of the latent function
+
+        Parameters
+        ----------
+        x_arr: array
+            Array of shape (number of points, number of inputs)
+
+        Returns
+        ---------
+        mean: array
+            Predictive mean at each point
+
+        var: array
+            Predictive variance at each point
+        """
+        k_star = self.kernel(x_arr, self.x_arr, self.log_params)
+        mean = np.dot(k_star, self.alpha)
+        v_arr = solve_triangular(self.chol, k_star.T, lower=True)
+        var = np.maximum(self.amp2 - np.sum(v_arr**2, axis=0), 0)
+        return mean, var
+
+
+class PCAEmulator(object):
+    """
+    Emulator of a vector (e.g. a binned mass function) as a function of theta
+    """
+    def __init__(self, bounds, theta_arr, y_arr, num_components=None,
+        var_frac=0.999, gp_params=None):
+        """
+        Parameters
+        ----------
+        bounds: array
+            Array of shape (number of parameters, 2) of the design limits.
+            The emulator is not used outside of them.
+
+        theta_arr: array
+            Array of shape (number of runs, number of parameters) of design
+            points
+
+        y_arr: array
+            Array of shape (number of runs, number of bins) of forward-model
+            outputs
+
+        num_components: int, optional
+            Number of principal components kept. If None, the fewest that
+            explain var_frac of the standardized variance.
+
+        var_frac: float, optional
+            Fraction of variance explained when num_components is None
+
+        gp_params: array, optional
+            Array of shape (num_components, number of parameters + 2) of
+            kernel parameters of each component, e.g. from a saved emulator
+        """
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.theta_arr = np.asarray(theta_arr, dtype=float)
+        self.y_arr = np.asarray(y_arr, dtype=float)
+
+        self.y_mean = self.y_arr.mean(axis=0)
+        self.y_scale = self.y_arr.std(axis=0)
+        self.y_scale[self.y_scale == 0] = 1
+        y_std = (self.y_arr - self.y_mean) / self.y_scale
+        _, sing_vals, vt_arr = np.linalg.svd(y_std, full_matrices=False)
+        if num_components is None:
+            explained = np.cumsum(sing_vals**2) / np.sum(sing_vals**2)
+            num_components = int(np.searchsorted(explained, var_frac) + 1)
+        self.components = vt_arr[:num_components]
+        scores = np.dot(y_std, self.components.T)
+        # Covariance of what the kept components cannot represent
+        resid = (y_std - np.dot(scores, self.components)) * self.y_scale
+        self.trunc_cov = np.dot(resid.T, resid) / max(len(resid) - 1, 1)
+
+        x_arr = self.to_unit(self.theta_arr)
+        if gp_params is None:
+            gp_params = [None] * num_components
+        self.gps = [GaussianProcess(x_arr, scores[:, idx], gp_params[idx])
+            for idx in range(num_components)]
+
+    def to_unit(self, theta_arr):
+        """Parameters scaled to the unit cube of the design"""
+        return (np.atleast_2d(theta_arr) - self.bounds[:, 0]) / \
+            (self.bounds[:, 1] - self.bounds[:, 0])
+
+    def within_bounds(self, theta):
+        """True if theta lies inside the design"""
+        return bool(np.all(theta >= self.bounds[:, 0]) and
+            np.all(theta <= self.bounds[:, 1]))
+
+    def predict(self, theta):
+        """
+        Emulated output and its uncertainty at one point
+
+        Parameters
+        ----------
+        theta: array
+            Array of parameter values
+
+        Returns
+        ---------
+        y_model: array
+            Emulated forward-model output
+
+        cov_emu: array
+            Covariance of the emulator error of y_model: Gaussian process
+            variance of each component plus PCA truncation covariance
+        """
+        x_arr = self.to_unit(theta)
+        means, variances = zip(*[gp.predict(x_arr) for gp in self.gps])
+        means = np.concatenate(means)
+        variances = np.concatenate(variances)
+        y_model = self.y_mean + self.y_scale * np.dot(means, self.components)
+        scaled = self.components * self.y_scale
+        cov_emu = np.dot(scaled.T * variances, scaled) + self.trunc_cov
+        return y_model, cov_emu
+
+    def save(self, filename, meta=None):
+        """
+        Atomically writes design, outputs and kernel parameters to .npz
+
+        Parameters
+        ----------
+        filename: string
+            Path to emulator file
+
+        meta: dict, optional
+            JSON serializable description of what the emulator was trained
+            on, compared by load
+        """
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'wb') as outfile:
+            np.savez(outfile, bounds=self.bounds, theta=self.theta_arr,
+                y=self.y_arr, gp_params=np.array([gp.log_params for gp in
+                self.gps]), meta=np.array(json.dumps(meta or {},
+                sort_keys=True)))
+        os.replace(tmp_filename, filename)
+
+    @classmethod
+    def load(cls, filename, meta=None):
+        """
+        Rebuilds an emulator written by save without refitting kernels
+
+        Parameters
+        ----------
+        filename: string
+            Path to emulator file
+
+        meta: dict, optional
+            Metadata of the current run. If given, the emulator is only used
+            if it was saved with the same metadata.
+
+        Returns
+        ---------
+        emulator: PCAEmulator or None
+            Saved emulator. None if file does not exist or is stale.
+        """
+        if not os.path.exists(filename):
+            return None
+
+        with np.load(filename, allow_pickle=False) as saved:
+            if meta is not None:
+                saved_meta = {}
+                if 'meta' in saved.files:
+                    saved_meta = json.loads(str(saved['meta']))
+                if saved_meta != json.loads(json.dumps(meta,
+                    sort_keys=True)):
+                    print('Emulator {0} is stale, retraining'.format(
+                        filename))
+                    return None
+            return cls(saved['bounds'], saved['theta'], saved['y'],
+                num_components=len(saved['gp_params']),
+                gp_params=saved['gp_params'])
+
+
+class EmulatedLikelihood(object):
+    """
+    Drop-in replacement of lnprob that uses an emulator instead of
+    populating mocks. Emulator error is added to the data covariance, so the
+    theta dependent normalization of the Gaussian likelihood is kept.
+    """
+    def __init__(self, emulator, data, err_data, inv_corr_mat=None):
+        """
+        Parameters
+        ----------
+        emulator: PCAEmulator
+            Emulator of the model data vector
+
+        data: array
+            Data vector
+
+        err_data: array
+            Error of each element of data vector
+
+        inv_corr_mat: array, optional
+            Inverse of correlation matrix. Uncorrelated errors if None.
+        """
+        self.emulator = emulator
+        self.data = np.asarray(data, dtype=float).ravel()
+        err_data = np.asarray(err_data, dtype=float).ravel()
+        if inv_corr_mat is None:
+            corr_mat = np.eye(len(err_data))
+        else:
+            corr_mat = np.linalg.inv(inv_corr_mat)
+        self.data_cov = corr_mat * np.outer(err_data, err_data)
+        self.data_logdet = np.linalg.slogdet(self.data_cov)[1]
+
+    def __call__(self, theta):
+        """
+        Returns
+        ---------
+        lnp: float
+            Log probability. -inf outside of the emulator design.
+
+        chi2: float
+            Chi-squared with data and emulator covariance
+        """
+        if not self.emulator.within_bounds(theta):
+            return -np.inf, np.inf
+        y_model, cov_emu = self.emulator.predict(theta)
+        chol = cholesky(self.data_cov + cov_emu, lower=True)
+        sol = solve_triangular(chol, self.data - y_model, lower=True)
+        chi2 = float(np.dot(sol, sol))
+        logdet = 2 * np.sum(np.log(np.diag(chol)))
+        lnp = -0.5 * (chi2 + logdet - self.data_logdet)
+        return lnp, chi2
+
+
+def train_emulator(forward_model, bounds, num_design, pool=None, seed=None,
+    **kwargs):
+    """
+    Runs the forward model on a Latin hypercube design and fits an emulator
+
+    Parameters
+    ----------
+    forward_model: callable
+        Function of theta returning the model data vector, or None if the
+        model could not be evaluated
+
+    bounds: array
+        Array of shape (number of parameters, 2) of design limits
+
+    num_design: int
+        Number of forward-model runs
+
+    pool: object, optional
+        Pool whose map runs the forward model. Serial if None.
+
+    seed: int, optional
+        Seed of the design
+
+    kwargs: dict
+        Keyword arguments of PCAEmulator
+
+    Returns
+    ---------
+    emulator: PCAEmulator
+        Emulator fit to the runs that succeeded
+    """
+    design = latin_hypercube(bounds, num_design, seed)
+    mapper = map if pool is None else pool.map
+    y_list = list(mapper(forward_model, design))
+    keep = [idx for idx, y_model in enumerate(y_list) if y_model is not None
+        and np.all(np.isfinite(y_model))]
+    if len(keep) <= len(design[0]):
+        msg = 'Only {0} of {1} forward-model runs succeeded, too few to '\
+            'train an emulator'.format(len(keep), num_design)
+        raise ValueError(msg)
+    print('Training emulator on {0} of {1} design points'.format(len(keep),
+        num_design))
+    return PCAEmulator(bounds, design[keep], np.array([y_list[idx] for idx in
+        keep]), **kwargs)
+
+def refine(samples, emulated_lnprob, true_lnprob, num, pool=None, rng=None):
+    """
+    Importance weights of emulated posterior samples from true forward-model
+    evaluations
+
+    Parameters
+    ----------
+    samples: array
+        Array of shape (number of samples, number of parameters) drawn from
+        the emulated posterior
+
+    emulated_lnprob: callable
+        Emulated likelihood the samples were drawn with
+
+    true_lnprob: callable
+        Likelihood using the forward model. Returns (lnp, blob).
+
+    num: int
+        Number of samples to evaluate with the forward model
+
+    pool: object, optional
+        Pool whose map runs the forward model. Serial if None.
+
+    rng: numpy.random.Generator, optional
+        Random number generator choosing the samples
+
+    Returns
+    ---------
+    refined: dict
+        Chosen samples ('theta'), their emulated and true log probabilities
+        ('lnp_emu', 'lnp_true'), normalized importance weights ('weights')
+        and effective sample size ('ess')
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    samples = np.asarray(samples)
+    idx = rng.choice(len(samples), size=min(num, len(samples)), replace=False)
+    theta_arr = samples[idx]
+    lnp_emu = np.array([emulated_lnprob(theta)[0] for theta in theta_arr])
+    mapper = map if pool is None else pool.map
+    lnp_true = np.array([result[0] for result in mapper(true_lnprob,
+        theta_arr)])
+    weights = importance_weights(lnp_true, lnp_emu)
+    refined = {'theta': theta_arr, 'lnp_emu': lnp_emu, 'lnp_true': lnp_true,
+        'weights': weights, 'ess': effective_sample_size(weights)}
+    return refined
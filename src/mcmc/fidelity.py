@@ -0,0 +1,105 @@
+"""
+{This module builds cheap versions of the halo catalog for the burn-in of the
+ sampler: a spatial sub-box or a mass-stratified subsample of host halos,
+ always keeping hosts together with their subhalos. Every kept host carries
+ the inverse of its selection probability as a weight, so that weighted
+ galaxy counts divided by the full simulation volume estimate the mass
+ function of the full box}
+"""
+
+# Libs
+import numpy as np
+
+__author__ = '{Mehnaaz Asad}'
+
+METHODS = ('subbox', 'stratified')
+# Host halos above this mass [log Msun/h] are always kept by the stratified
+# subsample since they are rare and host the massive end of the mass function
+STRATIFY_LOGMASS = 12.5
+
+
+def host_mask(halo_arrays):
+    """True for host halos, i.e. halos that are their own host"""
+    return halo_arrays['halo_hostid'] == halo_arrays['halo_id']
+
+def subsample_halos(halo_arrays, frac, method='subbox', seed=None):
+    """
+    Subsample of host halos and their subhalos
+
+    Parameters
+    ----------
+    halo_arrays: dict
+        Halo catalog arrays returned by halo_arrays_from_catalog
+
+    frac: float
+        Fraction of the box volume (subbox) or of the hosts below
+        STRATIFY_LOGMASS (stratified) kept, between 0 and 1
+
+    method: string, optional
+        'subbox' keeps hosts inside a corner cube of the box. 'stratified'
+        keeps all hosts above STRATIFY_LOGMASS and a random subsample of the
+        rest.
+
+    seed: int, optional
+        Seed of the stratified subsample
+
+    Returns
+    ---------
+    lowfi_halos: dict
+        'halo_arrays' of the subsample, accepted by UserSuppliedHaloCatalog,
+        and the sorted 'host_ids' of kept hosts with their 'weights'
+    """
+    if not 0 < frac <= 1:
+        msg = '`frac` ({0}) must be in (0, 1]'.format(frac)
+        raise ValueError(msg)
+    hosts = host_mask(halo_arrays)
+    host_ids = halo_arrays['halo_id'][hosts]
+    if method == 'subbox':
+        # Box coordinates are left as they are, only the volume shrinks
+        sides = np.broadcast_to(halo_arrays['Lbox'], 3) * frac**(1. / 3)
+        keep = np.ones(len(host_ids), dtype=bool)
+        for axis, side in zip(('halo_x', 'halo_y', 'halo_z'), sides):
+            keep &= halo_arrays[axis][hosts] < side
+        prob = np.full(len(host_ids), frac)
+    elif method == 'stratified':
+        massive = np.log10(halo_arrays['halo_mvir'][hosts]) >= STRATIFY_LOGMASS
+        prob = np.where(massive, 1., frac)
+        keep = np.random.default_rng(seed).random(len(host_ids)) < prob
+    else:
+        msg = '`method` ({0}) not supported! Options: {1}'.format(method,
+            '/'.join(METHODS))
+        raise ValueError(msg)
+
+    order = np.argsort(host_ids[keep])
+    kept_ids = host_ids[keep][order]
+    rows = np.isin(halo_arrays['halo_hostid'], kept_ids)
+    sub_arrays = {key: value[rows] if np.ndim(value) and len(value) ==
+        len(rows) else value for key, value in halo_arrays.items()}
+    lowfi_halos = {'halo_arrays': sub_arrays, 'host_ids': kept_ids,
+        'weights': 1. / prob[keep][order]}
+    return lowfi_halos
+
+def galaxy_weights(gal_host_ids, lowfi_halos):
+    """
+    Weights of mock galaxies populated on a subsample
+
+    Parameters
+    ----------
+    gal_host_ids: array
+        Host halo id of each galaxy
+
+    lowfi_halos: dict
+        Subsample returned by subsample_halos
+
+    Returns
+    ---------
+    weights: array
+        Inverse selection probability of the host of each galaxy
+    """
+    idx = np.searchsorted(lowfi_halos['host_ids'], gal_host_ids)
+    return lowfi_halos['weights'][idx]
+
+def cost_fraction(halo_arrays, lowfi_halos):
+    """Fraction of the halos of the full catalog kept in the subsample"""
+    return len(lowfi_halos['halo_arrays']['halo_id']) / \
+        len(halo_arrays['halo_id'])
@@ -0,0 +1,294 @@
+"""
+{This module starts walkers near the posterior mode instead of at the end of
+ an old chain. A global optimizer (differential evolution or multi-start
+ Nelder-Mead, both evaluated through the sampler's pool) finds the maximum a
+ posteriori point, a finite difference Hessian there gives the local
+ covariance and walkers are drawn from a Gaussian ball of that shape}
+"""
+
+# Libs
+from scipy.optimize import differential_evolution, minimize
+import numpy as np
+
+from src.mcmc.emulator import latin_hypercube
+
+__author__ = '{Mehnaaz Asad}'
+
+METHODS = ('de', 'nelder-mead')
+# Hessian steps and largest and smallest standard deviation of the walker
+# ball as fractions of the search range of each parameter
+HESSIAN_STEP = 0.02
+MAX_STD = 0.05
+MIN_STD = 1e-3
+# Number of nelder-mead starts without a pool
+NUM_STARTS = 8
+
+
+class NegLnprob(object):
+    """
+    Picklable objective of the optimizers: -lnp of a likelihood returning
+    (lnp, blob), with a large finite penalty where lnp is not finite. The
+    Hessian uses a NaN penalty instead so failed points can be told apart.
+    """
+    def __init__(self, lnprob, penalty=1e25):
+        self.lnprob = lnprob
+        self.penalty = penalty
+
+    def __call__(self, theta):
+        lnp = self.lnprob(np.asarray(theta))[0]
+        if not np.isfinite(lnp):
+            return self.penalty
+        return -lnp
+
+
+class NelderMead(object):
+    """
+    Picklable local search from one starting point
+    """
+    def __init__(self, objective, maxiter):
+        self.objective = objective
+        self.maxiter = maxiter
+
+    def __call__(self, start):
+        result = minimize(self.objective, start, method='Nelder-Mead',
+            options={'maxiter': self.maxiter, 'xatol': 1e-3, 'fatol': 1e-2})
+        return result.x, result.fun
+
+
+def find_map(lnprob, bounds, pool=None, method='de', maxiter=100,
+    num_starts=None, seed=None):
+    """
+    Maximum a posteriori point inside bounds
+
+    Parameters
+    ----------
+    lnprob: callable
+        Likelihood returning (lnp, blob)
+
+    bounds: array
+        Array of shape (number of parameters, 2) of search limits
+
+    pool: object, optional
+        Pool whose map evaluates the likelihood. Serial if None.
+
+    method: string, optional
+        'de' for differential evolution, evaluating each generation in
+        parallel, or 'nelder-mead' for one local search per start in
+        parallel
+
+    maxiter: int, optional
+        Largest number of generations (de) or iterations per start
+
+    num_starts: int, optional
+        Number of Latin hypercube starts of nelder-mead, e.g. the number of
+        pool processes. Defaults to NUM_STARTS.
+
+    seed: int, optional
+        Seed of the optimizer
+
+    Returns
+    ---------
+    theta_map: array
+        Parameters with the highest log probability found
+
+    lnp_map: float
+        Log probability at theta_map
+    """
+    bounds = np.asarray(bounds, dtype=float)
+    objective = NegLnprob(lnprob)
+    if method == 'de':
+        workers = 1 if pool is None else pool.map
+        result = differential_evolution(objective, bounds, maxiter=maxiter,
+            popsize=max(15, 2 * len(bounds)), tol=1e-3, polish=False,
+            updating='deferred', workers=workers, seed=seed)
+        return result.x, -result.fun
+    if method == 'nelder-mead':
+        if num_starts is None:
+            num_starts = NUM_STARTS
+        starts = latin_hypercube(bounds, num_starts, seed)
+        mapper = map if pool is None else pool.map
+        results = list(mapper(NelderMead(objective, maxiter), starts))
+        theta_map, fun = min(results, key=lambda result: result[1])
+        return np.clip(theta_map, bounds[:, 0], bounds[:, 1]), -fun
+    msg = '`method` ({0}) not supported! Options: {1}'.format(method,
+        '/'.join(METHODS))
+    raise ValueError(msg)
+
+def numerical_hessian(lnprob, theta, steps, pool=None):
+    """
+    Hessian of -lnp by central finite differences, with every point of the
+    stencil evaluated in one parallel batch. Entries whose stencil has a
+    point where lnp is not finite are set to 0, i.e. treated as flat.
+
+    Parameters
+    ----------
+    lnprob: callable
+        Likelihood returning (lnp, blob)
+
+    theta: array
+        Point at which Hessian is evaluated
+
+    steps: array
+        Finite difference step of each parameter
+
+    pool: object, optional
+        Pool whose map evaluates the likelihood. Serial if None.
+
+    Returns
+    ---------
+    hessian: array
+        Array of shape (number of parameters, number of parameters)
+    """
+    ndim = len(theta)
+    eye = np.diag(steps)
+    points = [theta]
+    pairs = [(i, j) for i in range(ndim) for j in range(i + 1, ndim)]
+    for i in range(ndim):
+        points.extend([theta + eye[i], theta - eye[i]])
+    for i, j in pairs:
+        points.extend([theta + eye[i] + eye[j], theta + eye[i] - eye[j],
+            theta - eye[i] + eye[j], theta - eye[i] - eye[j]])
+    mapper = map if pool is None else pool.map
+    values = np.array(list(mapper(NegLnprob(lnprob, np.nan), points)))
+
+    hessian = np.zeros((ndim, ndim))
+    center = values[0]
+    for i in range(ndim):
+        plus, minus = values[1 + 2 * i], values[2 + 2 * i]
+        hessian[i, i] = (plus - 2 * center + minus) / steps[i]**2
+    for idx, (i, j) in enumerate(pairs):
+        pp, pm, mp, mm = values[1 + 2 * ndim + 4 * idx:5 + 2 * ndim + 4 * idx]
+        hessian[i, j] = hessian[j, i] = (pp - pm - mp + mm) / \
+            (4 * steps[i] * steps[j])
+    hessian = np.where(np.isfinite(hessian), hessian, 0)
+    # Without its curvature a parameter is flat in every direction
+    flat = np.diag(hessian) == 0
+    hessian[flat, :] = hessian[:, flat] = 0
+    return hessian
+
+def ball_covariance(hessian, widths, max_std=MAX_STD, min_std=MIN_STD):
+    """
+    Covariance of the walker ball from the Hessian of -lnp
+
+    Directions that are flat, curved the wrong way or too noisy to measure
+    get the largest allowed spread, max_std times the search range. Spreads
+    are never below min_std times the search range, so that walkers do not
+    start on a hyperplane the stretch move cannot leave.
+
+    Parameters
+    ----------
+    hessian: array
+        Hessian of -lnp at the mode
+
+    widths: array
+        Search range of each parameter
+
+    max_std: float, optional
+        Largest standard deviation as a fraction of the search range
+
+    min_std: float, optional
+        Smallest standard deviation as a fraction of the search range
+
+    Returns
+    ---------
+    cov: array
+        Covariance matrix of the walker ball
+    """
+    # Work in units of the search range so the floor is the same for all
+    scaled = hessian * np.outer(widths, widths)
+    scaled = 0.5 * (scaled + scaled.T)
+    eigvals, eigvecs = np.linalg.eigh(scaled)
+    eigvals = np.where(np.isfinite(eigvals), eigvals, 0)
+    eigvals = np.clip(eigvals, 1 / max_std**2, 1 / min_std**2)
+    cov_scaled = np.dot(eigvecs / eigvals, eigvecs.T)
+    return cov_scaled * np.outer(widths, widths)
+
+def walker_ball(theta_map, cov, nwalkers, bounds, rng=None):
+    """
+    Starting positions drawn from a Gaussian around the mode, redrawing
+    walkers outside the search limits
+
+    Parameters
+    ----------
+    theta_map: array
+        Centre of the ball
+
+    cov: array
+        Covariance of the ball
+
+    nwalkers: int
+        Number of walkers
+
+    bounds: array
+        Array of shape (number of parameters, 2) of search limits
+
+    rng: numpy.random.Generator, optional
+        Random number generator
+
+    Returns
+    ---------
+    p0: array
+        Array of shape (nwalkers, number of parameters)
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    bounds = np.asarray(bounds, dtype=float)
+    p0 = np.empty((nwalkers, len(theta_map)))
+    num_left = nwalkers
+    while num_left:
+        draws = rng.multivariate_normal(theta_map, cov, size=2 * num_left)
+        inside = np.all((draws > bounds[:, 0]) & (draws < bounds[:, 1]),
+            axis=1)
+        draws = draws[inside][:num_left]
+        p0[nwalkers - num_left:nwalkers - num_left + len(draws)] = draws
+        num_left -= len(draws)
+    return p0
+
+def map_initial_positions(lnprob, bounds, nwalkers, pool=None, method='de',
+    maxiter=100, num_starts=None, seed=None):
+    """
+    Walker positions around the maximum a posteriori point
+
+    Parameters
+    ----------
+    lnprob: callable
+        Likelihood returning (lnp, blob)
+
+    bounds: array
+        Array of shape (number of parameters, 2) of search limits
+
+    nwalkers: int
+        Number of walkers
+
+    pool: object, optional
+        Pool whose map evaluates the likelihood. Serial if None.
+
+    method: string, optional
+        Optimizer, see find_map
+
+    maxiter: int, optional
+        Largest number of optimizer iterations
+
+    num_starts: int, optional
+        Number of nelder-mead starts, see find_map
+
+    seed: int, optional
+        Seed of the optimizer and of the walker ball
+
+    Returns
+    ---------
+    p0: array
+        Array of shape (nwalkers, number of parameters)
+    """
+    bounds = np.asarray(bounds, dtype=float)
+    widths = bounds[:, 1] - bounds[:, 0]
+    theta_map, lnp_map = find_map(lnprob, bounds, pool, method, maxiter,
+        num_starts, seed)
+    print('MAP lnp = {0:.2f} at {1}'.format(lnp_map, theta_map))
+    # Keep the stencil inside the search limits
+    center = np.clip(theta_map, bounds[:, 0] + HESSIAN_STEP * widths,
+        bounds[:, 1] - HESSIAN_STEP * widths)
+    hessian = numerical_hessian(lnprob, center, HESSIAN_STEP * widths, pool)
+    cov = ball_covariance(hessian, widths)
+    return walker_ball(theta_map, cov, nwalkers, bounds,
+        np.random.default_rng(seed))
@@ -0,0 +1,190 @@
+"""
+{This module provides opt-in per-stage timing of the likelihood. Each lnprob
+ call times its stages with a StageTimer and sends the timings back to the
+ parent as part of its emcee blob, where a StageProfile aggregates them into
+ counters and histograms that are dumped every N steps}
+"""
+
+# Built-in/Generic Imports
+from contextlib import contextmanager
+import json
+import time
+
+# Libs
+import numpy as np
+
+__author__ = '{Mehnaaz Asad}'
+
+STAGES = ('populate', 'mask_to_pandas', 'histogram', 'chi2')
+# Layout of timing vector returned by StageTimer.timings
+TOTAL_IDX = len(STAGES)
+REJECTED_IDX = len(STAGES) + 1
+FAILED_IDX = len(STAGES) + 2
+NUM_TIMINGS = len(STAGES) + 3
+
+# Log-spaced duration bins from 10 microseconds to 100 seconds
+HIST_EDGES = np.logspace(-5, 2, 29)
+
+
+class StageTimer(object):
+    """
+    Times the stages of a single likelihood evaluation
+    """
+    def __init__(self):
+        self._t_start = time.perf_counter()
+        self._timings = np.zeros(NUM_TIMINGS)
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager adding wall time of block to stage `name`"""
+        t_stage = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._timings[STAGES.index(name)] += time.perf_counter() - t_stage
+
+    def reject(self):
+        """Marks evaluation as rejected by the prior"""
+        self._timings[REJECTED_IDX] = 1
+
+    def fail(self):
+        """Marks evaluation as failed (-inf from warnings or NaN chi2)"""
+        self._timings[FAILED_IDX] = 1
+
+    def timings(self):
+        """Returns stage timings, total time and rejected/failed flags"""
+        self._timings[TOTAL_IDX] = time.perf_counter() - self._t_start
+        return self._timings
+
+    def blob(self, chi2):
+        """Returns emcee blob carrying chi2 and timings of evaluation"""
+        return chi2, self.timings()
+
+
+class NullTimer(object):
+    """
+    Drop-in StageTimer that does nothing, used when profiling is disabled
+    """
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def reject(self):
+        pass
+
+    def fail(self):
+        pass
+
+    def blob(self, chi2):
+        return chi2
+
+
+NULL_TIMER = NullTimer()
+
+
+def split_blobs(blobs):
+    """
+    Splits blobs of one step into chi2 values and stage timings
+
+    Parameters
+    ----------
+    blobs: list
+        Blobs of all walkers returned by emcee for one step
+
+    Returns
+    ---------
+    chi2: array
+        Chi-squared value of each walker
+
+    timings: array or None
+        Array of shape (nwalkers, NUM_TIMINGS). None if profiling is disabled.
+    """
+    if len(blobs) > 0 and isinstance(blobs[0], tuple):
+        chi2 = np.array([blob[0] for blob in blobs])
+        timings = np.array([blob[1] for blob in blobs])
+        return chi2, timings
+    return np.array(blobs), None
+
+
+class StageProfile(object):
+    """
+    Counters and duration histograms of likelihood stages aggregated over
+    all walkers and workers
+    """
+    def __init__(self, hist_edges=HIST_EDGES):
+        self.hist_edges = np.asarray(hist_edges)
+        self.num_evals = 0
+        self.num_rejected = 0
+        self.num_failed = 0
+        self.wall_time = 0.
+        names = STAGES + ('total',)
+        self.counts = dict.fromkeys(names, 0)
+        self.totals = dict.fromkeys(names, 0.)
+        self.hists = {name: np.zeros(len(self.hist_edges) - 1, dtype=int)
+            for name in names}
+        self._t_last = time.perf_counter()
+
+    def add(self, timings):
+        """
+        Adds timings of one step
+
+        Parameters
+        ----------
+        timings: array
+            Array of shape (nwalkers, NUM_TIMINGS) returned by split_blobs
+        """
+        timings = np.atleast_2d(timings)
+        rejected = timings[:, REJECTED_IDX] > 0
+        self.num_evals += len(timings)
+        self.num_rejected += int(rejected.sum())
+        self.num_failed += int((timings[:, FAILED_IDX] > 0).sum())
+        # Prior rejections never reach the forward model
+        evaluated = timings[~rejected]
+        for idx, name in enumerate(STAGES + ('total',)):
+            values = evaluated[:, idx]
+            self.counts[name] += len(values)
+            self.totals[name] += float(values.sum())
+            self.hists[name] += np.histogram(values,
+                bins=self.hist_edges)[0]
+        t_now = time.perf_counter()
+        self.wall_time += t_now - self._t_last
+        self._t_last = t_now
+
+    def summary(self):
+        """Returns JSON serializable summary of profile"""
+        stages = {}
+        for name in STAGES + ('total',):
+            count = self.counts[name]
+            stages[name] = {
+                'count': count,
+                'total_s': self.totals[name],
+                'mean_s': self.totals[name] / count if count else None,
+                'hist': self.hists[name].tolist(),
+            }
+        summary = {
+            'num_evals': self.num_evals,
+            'num_rejected': self.num_rejected,
+            'num_failed': self.num_failed,
+            'wall_time_s': self.wall_time,
+            'hist_edges_s': self.hist_edges.tolist(),
+            'stages': stages,
+        }
+        return summary
+
+    def dump(self, filename, step):
+        """
+        Appends cumulative summary at a given step as one JSON line
+
+        Parameters
+        ----------
+        filename: string
+            Path to profile file
+
+        step: int
+            Number of steps taken so far
+        """
+        summary = self.summary()
+        summary['step'] = step
+        with open(filename, 'a') as outfile:
+            outfile.write(json.dumps(summary))
+            outfile.write('\n')
@@ -9,18 +9,75 @@ import warnings
 import time
 import os
 
+# Start of process used to report time to first sample
+t_process_start = time.time()
+
 # Libs
-from halotools.empirical_models import PrebuiltSubhaloModelFactory
-from halotools.sim_manager import CachedHaloCatalog
-from cosmo_utils.utils import work_paths as cwpaths
-from multiprocessing import Pool
+# halotools, cosmo_utils and emcee are imported where they are used so that
+# Pool workers and runs restarted from a prepared run do not pay for them
+from src.data.surveys import get_survey, data_mask, measure_mf
+from scipy.linalg import block_diag
+from src.mcmc.prepared_run import prepared_run_meta, load_prepared_run, \
+    save_prepared_run, halo_arrays_from_catalog
+from src.mcmc.instrumentation import StageTimer, StageProfile, NULL_TIMER, \
+    split_blobs
+from src.mcmc.checkpoint import save_checkpoint, load_checkpoint, \
+    truncate_outputs
+from src.data.mock_suite import MockSuite, mass_function
+from src.mcmc.convergence import ConvergenceMonitor, read_chain_positions
+from src.data.mass_conversion import to_h1, log_bary_mass
+from src.mcmc.pools import add_pool_args, open_pool, is_master, broadcast
+from src.mcmc.blobs import BlobWriter, SMHM_BINS, BLOB_STATS, \
+    pack_record, smhm_summary, blob_fname
+from src.mcmc.emulator import PCAEmulator, EmulatedLikelihood, \
+    train_emulator, refine
+from src.mcmc.initialize import map_initial_positions, METHODS
+from src.mcmc import fidelity
+from src.mcmc.monitor import RunMonitor
+from contextlib import nullcontext, closing
+from functools import partial
 import pandas as pd
 import numpy as np
-import emcee 
 import math
 
 __author__ = '[Mehnaaz Asad]'
 
+# Dump lnprob stage profile every this many steps (0 disables profiling)
+profile_every = 0
+# Serve run status on this localhost port (None disables the monitor, 0
+# picks a free port)
+monitor_port = None
+# Snapshot sampler state every this many steps (0 disables checkpointing)
+checkpoint_every = 10
+# Check autocorrelation time every this many steps and stop once converged
+# (0 runs all nsteps)
+converge_every = 0
+tau_factor = 50
+tau_rtol = 0.01
+# Optimizer and its largest number of iterations used to start walkers
+init_method = 'de'
+map_maxiter = 50
+# Store model mass function and SMHM summary of every sample
+store_blobs = False
+# Subsample of the halo catalog used for burn-in and its mock model (None
+# runs on the full catalog only)
+lowfi_halos = None
+model_lowfi = None
+# Seed of the run. With common random numbers every population reuses the
+# same scatter deviates, otherwise the deviates are keyed on theta.
+run_seed = 12
+crn = False
+# Separates the surveys of a joint fit, e.g. eco+resolveb
+SURVEY_SEP = '+'
+# Parallel backend of the sampler and arguments of worker_init for dask
+pool_backend = 'multiprocessing'
+dask_address = None
+worker_args = ()
+# Search limits of the MAP optimizer and design limits of the emulator (also
+# its prior): (mhalo_c, mstellar_c, lowmass_slope, highmass_slope, scatter)
+PARAM_BOUNDS = [(11.5, 13.5), (10.0, 11.5), (0.1, 1.0), (0.1, 1.5),
+    (0.1, 0.5)]
+
 def read_data_catl(path_to_file, survey):
     """
     Reads survey catalog from file
@@ -44,6 +101,7 @@ def read_data_catl(path_to_file, survey):
     z_median: `float`
         Median redshift of survey
     """
+    survey_def = get_survey(survey)
     if survey == 'eco':
         columns = ['name', 'radeg', 'dedeg', 'cz', 'grpcz', 'absrmag', 
                     'logmstar', 'logmgas', 'grp', 'grpn', 'logmh', 'logmh_s', 
@@ -53,19 +111,8 @@ def read_data_catl(path_to_file, survey):
         eco_buff = pd.read_csv(path_to_file,delimiter=",", header=0, \
             usecols=columns)
 
-        if mf_type == 'smf':
-            # 6456 galaxies                       
-            catl = eco_buff.loc[(eco_buff.grpcz.values >= 3000) & 
-                (eco_buff.grpcz.values <= 7000) & 
-                (eco_buff.absrmag.values <= -17.33) &
-                (eco_buff.logmstar.values >= 8.9)]
-        elif mf_type == 'bmf':
-            catl = eco_buff.loc[(eco_buff.grpcz.values >= 3000) & 
-                (eco_buff.grpcz.values <= 7000) & 
-                (eco_buff.absrmag.values <= -17.33)] 
-
-        volume = 151829.26 # Survey volume without buffer [Mpc/h]^3
-        # cvar = 0.125
+        # 6456 galaxies (smf)
+        catl = eco_buff.loc[data_mask(eco_buff, survey_def, mf_type)]
         z_median = np.median(catl.grpcz.values) / (3 * 10**5)
         
     elif survey == 'resolvea' or survey == 'resolveb':
@@ -76,40 +123,11 @@ def read_data_catl(path_to_file, survey):
         resolve_live18 = pd.read_csv(path_to_file, delimiter=",", header=0, \
             usecols=columns)
 
-        if survey == 'resolvea':
-            if mf_type == 'smf':
-                catl = resolve_live18.loc[(resolve_live18.f_a.values == 1) & 
-                    (resolve_live18.grpcz.values >= 4500) & 
-                    (resolve_live18.grpcz.values <= 7000) & 
-                    (resolve_live18.absrmag.values <= -17.33) & 
-                    (resolve_live18.logmstar.values >= 8.9)]
-            elif mf_type == 'bmf':
-                catl = resolve_live18.loc[(resolve_live18.f_a.values == 1) & 
-                    (resolve_live18.grpcz.values >= 4500) & 
-                    (resolve_live18.grpcz.values <= 7000) & 
-                    (resolve_live18.absrmag.values <= -17.33)]
-
-            volume = 13172.384  # Survey volume without buffer [Mpc/h]^3
-            # cvar = 0.30
-            z_median = np.median(resolve_live18.grpcz.values) / (3 * 10**5)
-        
-        elif survey == 'resolveb':
-            if mf_type == 'smf':
-                # 487 - cz, 369 - grpcz
-                catl = resolve_live18.loc[(resolve_live18.f_b.values == 1) & 
-                    (resolve_live18.grpcz.values >= 4500) & 
-                    (resolve_live18.grpcz.values <= 7000) & 
-                    (resolve_live18.absrmag.values <= -17) & 
-                    (resolve_live18.logmstar.values >= 8.7)]
-            elif mf_type == 'bmf':
-                catl = resolve_live18.loc[(resolve_live18.f_b.values == 1) & 
-                    (resolve_live18.grpcz.values >= 4500) & 
-                    (resolve_live18.grpcz.values <= 7000) & 
-                    (resolve_live18.absrmag.values <= -17)]
-
-            volume = 4709.8373  # *2.915 #Survey volume without buffer [Mpc/h]^3
-            # cvar = 0.58
-            z_median = np.median(resolve_live18.grpcz.values) / (3 * 10**5)
+        catl = resolve_live18.loc[data_mask(resolve_live18, survey_def,
+            mf_type)]
+        z_median = np.median(resolve_live18.grpcz.values) / (3 * 10**5)
+
+    volume = survey_def.volume # Survey volume without buffer [Mpc/h]^3
 
     return catl, volume, z_median
 
@@ -182,7 +200,7 @@ def reading_catls(filename, catl_format='.hdf5'):
 
     return mock_pd
 
-def diff_smf(mstar_arr, volume, h1_bool):
+def diff_smf(mstar_arr, volume, h1_bool, survey_name=None):
     """
     Calculates differential stellar mass function in units of h=1.0
 
@@ -197,6 +215,9 @@ def diff_smf(mstar_arr, volume, h1_bool):
     h1_bool: boolean
         True if units of masses are h=1, False if units of masses are not h=1
 
+    survey_name: string, optional
+        Survey whose bins are used, the survey of the run if None
+
     Returns
     ---------
     maxis: array
@@ -213,41 +234,22 @@ def diff_smf(mstar_arr, volume, h1_bool):
     """
     if not h1_bool:
         # changing from h=0.7 to h=1 assuming h^-2 dependence
-        logmstar_arr = np.log10((10**mstar_arr) / 2.041)
+        logmstar_arr = to_h1(mstar_arr)
     else:
         logmstar_arr = np.log10(mstar_arr)
 
-    if survey == 'eco' or survey == 'resolvea':
-        bin_min = np.round(np.log10((10**8.9) / 2.041), 1)
-        if survey == 'eco':
-            bin_max = np.round(np.log10((10**11.8) / 2.041), 1)
-        elif survey == 'resolvea':
-            # different to avoid nan in inverse corr mat
-            bin_max = np.round(np.log10((10**11.5) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)
-    elif survey == 'resolveb':
-        bin_min = np.round(np.log10((10**8.7) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.8) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)
-    # Unnormalized histogram and bin edges
-    counts, edg = np.histogram(logmstar_arr, bins=bins)  # paper used 17 bins
-    dm = edg[1] - edg[0]  # Bin width
-    maxis = 0.5 * (edg[1:] + edg[:-1])  # Mass axis i.e. bin centers
-    # Normalized to volume and bin width
-    err_poiss = np.sqrt(counts) / (volume * dm)
-    err_tot = err_poiss
-    phi = counts / (volume * dm)  # not a log quantity
-
+    bins = get_survey(survey_name or survey).bins('smf')
+    maxis, phi, err_tot, counts = measure_mf(logmstar_arr, volume, bins)
     phi = np.log10(phi)
 
     return maxis, phi, err_tot, bins, counts
 
 def calc_bary(logmstar_arr, logmgas_arr):
     """Calculates baryonic mass of galaxies from survey"""
-    logmbary = np.log10((10**logmstar_arr) + (10**logmgas_arr))
+    logmbary = log_bary_mass(logmstar_arr, logmgas_arr)
     return logmbary
 
-def diff_bmf(mass_arr, volume, h1_bool):
+def diff_bmf(mass_arr, volume, h1_bool, survey_name=None):
     """
     Calculates differential baryonic mass function
 
@@ -262,6 +264,9 @@ def diff_bmf(mass_arr, volume, h1_bool):
     sim_bool: boolean
         True if masses are from mock
 
+    survey_name: string, optional
+        Survey whose bins are used, the survey of the run if None
+
     Returns
     ---------
     maxis: array
@@ -278,33 +283,17 @@ def diff_bmf(mass_arr, volume, h1_bool):
     """
     if not h1_bool:
         # changing from h=0.7 to h=1 assuming h^-2 dependence
-        logmbary_arr = np.log10((10**mass_arr) / 2.041)
-        # print("Data ", logmbary_arr.min(), logmbary_arr.max())
+        logmbary_arr = to_h1(mass_arr)
     else:
         logmbary_arr = np.log10(mass_arr)
-        # print(logmbary_arr.min(), logmbary_arr.max())
-    if survey == 'eco' or survey == 'resolvea':
-        bin_min = np.round(np.log10((10**9.4) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.5) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)
-    elif survey == 'resolveb':
-        bin_min = np.round(np.log10((10**9.1) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.5) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)
-    # Unnormalized histogram and bin edges
-    counts, edg = np.histogram(logmbary_arr, bins=bins)  # paper used 17 bins
-    dm = edg[1] - edg[0]  # Bin width
-    maxis = 0.5 * (edg[1:] + edg[:-1])  # Mass axis i.e. bin centers
-    # Normalized to volume and bin width
-    err_poiss = np.sqrt(counts) / (volume * dm)
-    err_tot = err_poiss
-
-    phi = counts / (volume * dm)  # not a log quantity
+
+    bins = get_survey(survey_name or survey).bins('bmf')
+    maxis, phi, err_tot, counts = measure_mf(logmbary_arr, volume, bins)
     phi = np.log10(phi)
 
     return maxis, phi, err_tot, bins, counts
 
-def get_err_data(survey, path):
+def get_err_data(survey, path, nproc=1):
     """
     Calculate error in data SMF from mocks
 
@@ -314,6 +303,8 @@ def get_err_data(survey, path):
         Name of survey
     path: string
         Path to mock catalogs
+    nproc: int, optional
+        Number of processes used to read mocks
 
     Returns
     ---------
@@ -325,70 +316,15 @@ def get_err_data(survey, path):
         Standard deviation of phi values between all mocks and for blue galaxies
     """
 
-    if survey == 'eco':
-        mock_name = 'ECO'
-        num_mocks = 8
-        min_cz = 3000
-        max_cz = 7000
-        mag_limit = -17.33
-        mstar_limit = 8.9
-        volume = 151829.26 # Survey volume without buffer [Mpc/h]^3
-    elif survey == 'resolvea':
-        mock_name = 'A'
-        num_mocks = 59
-        min_cz = 4500
-        max_cz = 7000
-        mag_limit = -17.33
-        mstar_limit = 8.9
-        volume = 13172.384  # Survey volume without buffer [Mpc/h]^3 
-    elif survey == 'resolveb':
-        mock_name = 'B'
-        num_mocks = 104
-        min_cz = 4500
-        max_cz = 7000
-        mag_limit = -17
-        mstar_limit = 8.7
-        volume = 4709.8373  # Survey volume without buffer [Mpc/h]^3
-
-    phi_arr_total = []
-    box_id_arr = np.linspace(5001,5008,8)
-    for box in box_id_arr:
-        box = int(box)
-        temp_path = path + '{0}/{1}_m200b_catls/'.format(box, 
-            mock_name) 
-        # print(box)
-        for num in range(num_mocks):
-            filename = temp_path + '{0}_cat_{1}_Planck_memb_cat.hdf5'.\
-                format(mock_name, num)
-            mock_pd = reading_catls(filename) 
-
-            if mf_type == 'smf':
-                # Using the same survey definition as data
-                mock_pd = mock_pd.loc[(mock_pd.cz.values >= min_cz) & 
-                    (mock_pd.cz.values <= max_cz) & 
-                    (mock_pd.M_r.values <= mag_limit) &
-                    (mock_pd.logmstar.values >= mstar_limit)]
-
-                logmstar_arr = mock_pd.logmstar.values 
-                #Measure SMF of mock using diff_smf function
-                max_total, phi_total, err_total, bins_total, counts_total = \
-                    diff_smf(logmstar_arr, volume, False)
-            elif mf_type == 'bmf':
-                # Using the same survey definition as data - *no mstar cut*
-                mock_pd = mock_pd.loc[(mock_pd.cz.values >= min_cz) & 
-                    (mock_pd.cz.values <= max_cz) & 
-                    (mock_pd.M_r.values <= mag_limit)]
-
-                logmstar_arr = mock_pd.logmstar.values 
-                mhi_arr = mock_pd.mhi.values
-                logmgas_arr = np.log10(1.4 * mhi_arr)
-                logmbary_arr = calc_bary(logmstar_arr, logmgas_arr)
-                max_total, phi_total, err_total, bins_total, counts_total = \
-                    diff_bmf(logmbary_arr, volume, False)
-
-            phi_arr_total.append(phi_total)
-
-    phi_arr_total = np.array(phi_arr_total)
+    survey_def = get_survey(survey)
+    volume = survey_def.volume # Survey volume without buffer [Mpc/h]^3
+
+    # Using the same survey definition as data
+    suite = MockSuite(path, survey_def, mf_type, columns=['logmstar', 'mhi'])
+    reducer = partial(mass_function, mf_type=mf_type, volume=volume,
+        bins=survey_def.bins(mf_type))
+    phi_arr_total = np.log10(suite.map(reducer, nproc)[1])
+
     # np.std(phi_arr_total, axis=0)
     # Covariance matrix
     # A variable here is a bin so each row is a bin and each column is one 
@@ -401,7 +337,41 @@ def get_err_data(survey, path):
     corr_mat_inv = np.linalg.inv(corr_mat)
     return stddev, corr_mat_inv
 
-def halocat_init(halo_catalog, z_median):
+def fit_surveys():
+    """Names of the surveys fit by this run, several for a joint fit"""
+    return tuple(survey.split(SURVEY_SEP))
+
+def join_data(data_list):
+    """
+    Data vector, errors and inverse correlation matrix of a joint fit
+
+    Surveys are treated as independent, so the inverse correlation matrix is
+    block diagonal and the chi-squared is the sum of the chi-squared values
+    of the surveys.
+
+    Parameters
+    ----------
+    data_list: list
+        Data arrays of each survey from prepare_data or a prepared run
+
+    Returns
+    ---------
+    phi: array
+        Concatenated data mass functions
+
+    err: array
+        Concatenated errors
+
+    inv_corr_mat: array
+        Block diagonal inverse correlation matrix
+    """
+    phi = np.concatenate([data_arrays['phi'] for data_arrays in data_list])
+    err = np.concatenate([data_arrays['err'] for data_arrays in data_list])
+    inv_corr_mat = block_diag(*[data_arrays['inv_corr_mat'] for data_arrays
+        in data_list])
+    return phi, err, inv_corr_mat
+
+def halocat_init(halo_catalog, z_median, halo_arrays=None):
     """
     Initial population of halo catalog using populate_mock function
 
@@ -413,19 +383,131 @@ def halocat_init(halo_catalog, z_median):
     z_median: float
         Median redshift of survey
 
+    halo_arrays: dict, optional
+        Halo catalog arrays from a prepared run. If given, the halotools cache
+        is not read.
+
     Returns
     ---------
     model: halotools model instance
         Model based on behroozi 2010 SMHM
+
+    halocat: halotools halo catalog instance
+        Halo catalog that was populated
     """
-    halocat = CachedHaloCatalog(fname=halo_catalog, update_cached_fname=True)
+    from halotools.empirical_models import PrebuiltSubhaloModelFactory
+    if halo_arrays is None:
+        from halotools.sim_manager import CachedHaloCatalog
+        halocat = CachedHaloCatalog(fname=halo_catalog,
+            update_cached_fname=True)
+    else:
+        from halotools.sim_manager import UserSuppliedHaloCatalog
+        halocat = UserSuppliedHaloCatalog(**halo_arrays)
     model = PrebuiltSubhaloModelFactory('behroozi10', redshift=z_median, \
         prim_haloprop_key='halo_macc')
     model.populate_mock(halocat,seed=5)
 
-    return model
+    return model, halocat
+
+def worker_init(survey_, mf_type_, profile_every_, store_blobs_,
+    halo_catalog, z_median, halo_arrays, lowfi_halos_=None, crn_=False,
+    run_seed_=12, monitor_port_=None):
+    """
+    Sets the module state lnprob needs in a dask worker, which unlike forked
+    and MPI workers does not run main()
+
+    Parameters
+    ----------
+    survey_: string
+        Name of survey, or names joined by SURVEY_SEP for a joint fit
+
+    mf_type_: string
+        Type of mass function (smf/bmf)
+
+    profile_every_: int
+        Profiling interval, only checked for being non-zero by lnprob
+
+    store_blobs_: boolean
+        True if lnprob returns model predictions as blobs
+
+    halo_catalog: string
+        Path to halo catalog
+
+    z_median: float
+        Median redshift of survey
+
+    halo_arrays: dict
+        Halo catalog arrays from the prepared run
+
+    lowfi_halos_: dict, optional
+        Subsample of the halo catalog for burn-in from subsample_halos
+
+    crn_: boolean, optional
+        True to populate with common random numbers
+
+    run_seed_: int, optional
+        Seed of the run
+
+    monitor_port_: int, optional
+        Port of the run monitor, only checked for being set by lnprob
+    """
+    global model_init
+    global model_lowfi
+    global lowfi_halos
+    global crn
+    global run_seed
+    global monitor_port
+    global survey
+    global mf_type
+    global profile_every
+    global store_blobs
+    survey = survey_
+    mf_type = mf_type_
+    profile_every = profile_every_
+    store_blobs = store_blobs_
+    crn = crn_
+    run_seed = run_seed_
+    monitor_port = monitor_port_
+    model_init, _ = halocat_init(halo_catalog, z_median, halo_arrays)
+    lowfi_halos = lowfi_halos_
+    if lowfi_halos is not None:
+        model_lowfi, _ = halocat_init(halo_catalog, z_median,
+            lowfi_halos['halo_arrays'])
+
+def for_pool(func):
+    """
+    Function as seen by pool workers. Dask pickles functions of __main__ by
+    value, so its workers get the function of the importable module whose
+    state worker_init sets.
+    """
+    if pool_backend != 'dask':
+        return func
+    from src.mcmc import mcmc as module
+    return getattr(module, func.__name__)
+
+def run_fnames(tag=''):
+    """
+    Names of the chain, chi-squared and checkpoint files of a run
+
+    Parameters
+    ----------
+    tag: string, optional
+        '' for the production chain, '_emu' for the emulated chain and
+        '_lowfi' for the low-fidelity burn-in
 
-def mcmc(nproc, nwalkers, nsteps, phi, err, inv_corr_mat):
+    Returns
+    ---------
+    chain_fname, chi2_fname, checkpoint_fname: string
+        Paths to the files
+    """
+    chain_fname = "mcmc_{0}_raw_bmf986{1}.txt".format(survey, tag)
+    chi2_fname = "{0}_chi2_bmf986{1}.txt".format(survey, tag)
+    checkpoint_fname = "mcmc_{0}_{1}{2}_checkpoint.pkl".format(survey,
+        mf_type, tag)
+    return chain_fname, chi2_fname, checkpoint_fname
+
+def mcmc(nproc, nwalkers, nsteps, phi, err, inv_corr_mat, resume=False,
+    emulator=None, lowfi=False, p0=None):
     """
     MCMC analysis
 
@@ -438,7 +520,8 @@ def mcmc(nproc, nwalkers, nsteps, phi, err, inv_corr_mat):
         Number of walkers to use
     
     nsteps: int
-        Number of steps to run MCMC for
+        Number of steps to run MCMC for. With convergence checks enabled this
+        is the largest number of steps.
     
     phi: array
         Array of y-axis values of mass function
@@ -446,64 +529,156 @@ def mcmc(nproc, nwalkers, nsteps, phi, err, inv_corr_mat):
     err: array
         Array of error per bin of mass function
 
+    resume: boolean, optional
+        True to continue from the last checkpoint of this survey
+
+    emulator: PCAEmulator, optional
+        Emulator of the mass function. If given, the chain is sampled
+        serially with the emulated likelihood and written to files tagged
+        '_emu'.
+
+    lowfi: boolean, optional
+        True to sample on the halo subsample lowfi_halos, writing to files
+        tagged '_lowfi'
+
+    p0: array, optional
+        Starting positions of the walkers of a new run, e.g. the last
+        positions of the low-fidelity burn-in. Found from the MAP if None.
+
     Returns
     ---------
     sampler: multidimensional array
-        Result of running emcee 
+        Result of running emcee. None on MPI worker ranks.
 
     """
-    behroozi10_param_vals = [12.35,10.72,0.44,0.57,0.15]
-    bmf_resume = [12.03949177, 10.65053122, 0.50320246, 0.26588596, 0.22353107]
-    ndim = 5
-    p0 = bmf_resume + 0.1*np.random.rand(ndim*nwalkers).\
-        reshape((nwalkers, ndim))
+    if not is_master(pool_backend):
+        # MPI workers only evaluate lnprob for the master until it finishes
+        with open_pool(pool_backend, nproc):
+            return None
 
-    colnames = ['mhalo_c','mstellar_c','lowmass_slope','highmass_slope',\
-        'scatter']
-    
-    emcee_table = pd.read_csv('../../data/processed/bmhm_run3/mcmc_eco_raw.txt', names=colnames, 
-        delim_whitespace=True, header=None)
-
-    emcee_table = emcee_table[emcee_table.mhalo_c.values != '#']
-    emcee_table.mhalo_c = emcee_table.mhalo_c.astype(np.float64)
-    emcee_table.mstellar_c = emcee_table.mstellar_c.astype(np.float64)
-    emcee_table.lowmass_slope = emcee_table.lowmass_slope.astype(np.float64)
-
-    # Cases where last parameter was a NaN and its value was being written to 
-    # the first element of the next line followed by 4 NaNs for the other 
-    # parameters
-    for idx,row in enumerate(emcee_table.values):
-        if np.isnan(row)[4] == True and np.isnan(row)[3] == False:
-            scatter_val = emcee_table.values[idx+1][0]
-            row[4] = scatter_val
-    
-    # Cases where rows of NANs appear
-    emcee_table = emcee_table.dropna(axis='index', how='any').\
-        reset_index(drop=True)
+    import emcee
 
-    p0 = emcee_table[-250:]
-
-    with Pool(processes=nproc) as pool:
-        sampler = emcee.EnsembleSampler(nwalkers, ndim, lnprob, 
-            args=(phi, err, inv_corr_mat), pool=pool)
+    ndim = 5
+    if emulator is not None:
+        tag = '_emu'
+    elif lowfi:
+        tag = '_lowfi'
+    else:
+        tag = ''
+    chain_fname, chi2_fname, checkpoint_fname = run_fnames(tag)
+    output_fnames = [chain_fname, chi2_fname]
+
+    sample_kwargs = {}
+    start_iteration = 0
+    if resume:
+        state = load_checkpoint(checkpoint_fname, nwalkers, ndim,
+            checkpoint_meta())
+        truncate_outputs(state)
+        p0 = state['position']
+        start_iteration = state['iteration']
+        sample_kwargs = {'lnprob0': state['lnprob'],
+            'rstate0': state['rstate'], 'blobs0': state['blobs']}
+        print('Resuming from {0} at iteration {1}'.format(checkpoint_fname,
+            start_iteration))
+
+    profile = None
+    if (profile_every or monitor_port is not None) and emulator is None:
+        profile = StageProfile()
+        profile_fname = "{0}{1}_lnprob_profile.jsonl".format(survey, tag)
+
+    monitor = None
+    if converge_every:
+        monitor = ConvergenceMonitor(nwalkers, ndim, converge_every,
+            tau_factor, tau_rtol,
+            "mcmc_{0}_{1}{2}_convergence.jsonl".format(survey, mf_type, tag))
+        if resume:
+            monitor.load_history(read_chain_positions(chain_fname, nwalkers,
+                ndim))
+
+    blob_writer = None
+    if store_blobs and emulator is None:
+        blob_file = blob_fname(survey, mf_type, tag)
+        blob_writer = BlobWriter(blob_file, nwalkers, [('chi2', ()),
+            ('phi', (len(phi),)),
+            ('smhm', (len(BLOB_STATS), len(SMHM_BINS) - 1))],
+            {'survey': survey, 'mf_type': mf_type, 'stats': BLOB_STATS,
+            'smhm_bins': SMHM_BINS.tolist()})
+        output_fnames.append(blob_file)
+
+    if emulator is None:
+        log_prob = partial(for_pool(lnprob), phi=phi, err_tot=err,
+            inv_corr_mat=inv_corr_mat, lowfi=lowfi)
+        pool_context = open_pool(pool_backend, nproc, for_pool(worker_init),
+            worker_args, dask_address)
+    else:
+        # Emulated likelihood is cheaper than sending walkers to workers
+        log_prob = EmulatedLikelihood(emulator, phi, err, inv_corr_mat)
+        pool_context = nullcontext()
+
+    monitor_context = nullcontext()
+    if monitor_port is not None:
+        monitor_context = closing(RunMonitor(monitor_port,
+            1 if emulator is not None else nproc,
+            {'survey': survey, 'mf_type': mf_type, 'tag': tag,
+            'nwalkers': nwalkers},
+            "mcmc_{0}_{1}{2}_monitor.url".format(survey, mf_type, tag)))
+
+    with pool_context as pool, monitor_context as run_monitor:
+        if p0 is None:
+            print('Finding MAP to initialize walkers')
+            t_map = time.time()
+            p0 = map_initial_positions(log_prob, PARAM_BOUNDS, nwalkers, pool,
+                init_method, map_maxiter, nproc, run_seed)
+            print('Walkers initialized in {0:.1f} seconds'.format(
+                time.time() - t_map))
+        sampler = emcee.EnsembleSampler(nwalkers, ndim, log_prob, pool=pool)
+        # Stretch moves of a new run are reproducible, a resumed run
+        # continues from the random state of its checkpoint
+        sampler.random_state = np.random.RandomState(run_seed).get_state()
         start = time.time()
-        for i,result in enumerate(sampler.sample(p0, iterations=nsteps, 
-            storechain=False)):
+        for i,result in enumerate(sampler.sample(p0,
+            iterations=nsteps - start_iteration, storechain=False,
+            **sample_kwargs), start_iteration):
+            if i == start_iteration:
+                print("Time to first sample: {0:.1f} seconds".format(
+                    time.time() - t_process_start))
             position = result[0]
-            chi2 = np.array(result[3])
-            # print(chi2)
+            blobs = result[3]
+            if blob_writer is not None:
+                blobs, records = zip(*blobs)
+                blob_writer.write(records)
+            chi2, timings = split_blobs(list(blobs))
+            converged = False
+            if monitor is not None:
+                monitor.add(position)
+                converged = monitor.check()
+            if profile is not None:
+                profile.add(timings)
+                if profile_every and ((i+1) % profile_every == 0 or
+                    i+1 == nsteps or converged):
+                    profile.dump(profile_fname, i+1)
+            if run_monitor is not None:
+                run_monitor.update(i+1, nsteps, sampler.acceptance_fraction,
+                    chi2, None if monitor is None else monitor.tau, profile)
             print("Iteration number {0} of {1}".format(i+1,nsteps))
-            chain_fname = open("mcmc_{0}_raw_bmf986.txt".format(survey), "a")
-            chi2_fname = open("{0}_chi2_bmf986.txt".format(survey), "a")
+            chain_file = open(chain_fname, "a")
+            chi2_file = open(chi2_fname, "a")
             for k in range(position.shape[0]):
-                chain_fname.write(str(position[k]).strip("[]"))
-                chain_fname.write("\n")
-            chain_fname.write("# New slice\n")
+                chain_file.write(str(position[k]).strip("[]"))
+                chain_file.write("\n")
+            chain_file.write("# New slice\n")
             for k in range(chi2.shape[0]):
-                chi2_fname.write(str(chi2[k]).strip("[]"))
-                chi2_fname.write("\n")
-            chain_fname.close()
-            chi2_fname.close()
+                chi2_file.write(str(chi2[k]).strip("[]"))
+                chi2_file.write("\n")
+            chain_file.close()
+            chi2_file.close()
+            if checkpoint_every and ((i+1) % checkpoint_every == 0 or
+                i+1 == nsteps or converged):
+                save_checkpoint(checkpoint_fname, result, i+1, output_fnames,
+                    checkpoint_meta())
+            if converged:
+                print("Chain converged after {0} steps, stopping".format(i+1))
+                break
         # sampler.run_mcmc(p0, nsteps)
         end = time.time()
         multi_time = end - start
@@ -511,7 +686,190 @@ def mcmc(nproc, nwalkers, nsteps, phi, err, inv_corr_mat):
     
     return sampler
 
-def populate_mock(theta, model):
+def forward_model(theta):
+    """
+    Model mass function used to train the emulator
+
+    Parameters
+    ----------
+    theta: array
+        Array of parameter values
+
+    Returns
+    ---------
+    phi_model: array or None
+        Array of y-axis values of mass function. None if the population
+        failed or the mass function has empty bins.
+    """
+    warnings.simplefilter("error", (UserWarning, RuntimeWarning))
+    try:
+        phi_model, _ = model_mf(theta)
+        if not np.all(np.isfinite(phi_model)):
+            raise ValueError
+    except (ValueError, RuntimeWarning, UserWarning):
+        phi_model = None
+    return phi_model
+
+def get_emulator(nproc, num_design, emulator_fname, meta, rebuild=False):
+    """
+    Loads emulator of the mass function or trains it on forward-model runs
+
+    Parameters
+    ----------
+    nproc: int
+        Number of processes running the forward model
+
+    num_design: int
+        Number of forward-model runs of the design
+
+    emulator_fname: string
+        Path to saved emulator
+
+    meta: dict
+        Metadata the emulator is keyed on, see emulator_meta. A saved
+        emulator with different metadata is retrained.
+
+    rebuild: boolean, optional
+        True to train even if a saved emulator exists
+
+    Returns
+    ---------
+    emulator: PCAEmulator or None
+        Emulator of the mass function. None on MPI worker ranks.
+    """
+    master = is_master(pool_backend)
+    emulator = None
+    if master and not rebuild:
+        emulator = PCAEmulator.load(emulator_fname, meta)
+    if not broadcast(pool_backend, emulator is None):
+        if not master:
+            return None
+        print('Using emulator {0}'.format(emulator_fname))
+        return emulator
+
+    t_train = time.time()
+    with open_pool(pool_backend, nproc, for_pool(worker_init), worker_args,
+        dask_address) as pool:
+        if not master:
+            return None
+        emulator = train_emulator(for_pool(forward_model), PARAM_BOUNDS,
+            num_design, pool, seed=num_design)
+    emulator.save(emulator_fname, meta)
+    print('Emulator written to {0} in {1:.1f} seconds'.format(emulator_fname,
+        time.time() - t_train))
+    return emulator
+
+def emulator_meta(num_design, run_metas):
+    """
+    Builds the metadata an emulator is keyed on
+
+    Parameters
+    ----------
+    num_design: int
+        Number of forward-model runs of the design
+
+    run_metas: list
+        Metadata of the prepared run of every fitted survey, see
+        prepared_run_meta
+
+    Returns
+    ---------
+    meta: dict
+        JSON serializable description of the design limits, mass function
+        bins, population seeds and inputs the emulator was trained on
+    """
+    meta = {
+        'bounds': PARAM_BOUNDS,
+        'num_design': num_design,
+        'bins': {survey_name: get_survey(survey_name).bins(mf_type).tolist()
+            for survey_name in fit_surveys()},
+        'populate': checkpoint_meta(),
+        'prepared_runs': run_metas,
+    }
+    return meta
+
+def refine_chain(nproc, nwalkers, num_refine, phi, err, inv_corr_mat,
+    emulator):
+    """
+    Importance weights of the emulated chain from true likelihood
+    evaluations, written to mcmc_<survey>_<mf_type>_refined.npz
+
+    Parameters
+    ----------
+    nproc: int
+        Number of processes running the forward model
+
+    nwalkers: int
+        Number of walkers of the emulated chain
+
+    num_refine: int
+        Number of samples from the second half of the emulated chain that
+        are evaluated with the forward model
+
+    phi, err, inv_corr_mat: array
+        Data mass function, its errors and inverse correlation matrix
+
+    emulator: PCAEmulator
+        Emulator the chain was sampled with. None on MPI worker ranks.
+
+    Returns
+    ---------
+    refined: dict or None
+        Output of emulator.refine. None on MPI worker ranks.
+    """
+    with open_pool(pool_backend, nproc, for_pool(worker_init), worker_args,
+        dask_address) as pool:
+        if pool is None:
+            return None
+        positions = read_chain_positions(run_fnames('_emu')[0], nwalkers, 5)
+        samples = positions[len(positions) // 2:].reshape(-1, 5)
+        true_lnprob = partial(for_pool(lnprob), phi=phi, err_tot=err,
+            inv_corr_mat=inv_corr_mat)
+        refined = refine(samples, EmulatedLikelihood(emulator, phi, err,
+            inv_corr_mat), true_lnprob, num_refine, pool,
+            np.random.default_rng(num_refine))
+    refined_fname = "mcmc_{0}_{1}_refined.npz".format(survey, mf_type)
+    np.savez(refined_fname, **refined)
+    print('Effective sample size of {0} refined samples: {1:.1f}'.format(
+        len(refined['weights']), refined['ess']))
+    return refined
+
+def checkpoint_meta():
+    """
+    Settings the mock populations depend on. A resumed run with the same
+    settings repopulates every point like the uninterrupted run would.
+    """
+    return {'run_seed': run_seed, 'crn': crn}
+
+def populate_seed(theta):
+    """
+    Seed of the scatter deviates of one mock population
+
+    With common random numbers the seed is fixed by the run seed, so chi2 is
+    a deterministic function of theta and identical in every worker.
+    Otherwise the seed is keyed on the run seed and the exact bits of theta,
+    so different proposals get independent deviates while a run with the
+    same seed, or a resumed run, repopulates every point the same way no
+    matter which worker evaluates it.
+
+    Parameters
+    ----------
+    theta: array
+        Array of parameter values
+
+    Returns
+    ---------
+    seed: int
+        Seed passed to populate
+    """
+    if crn:
+        return int(np.random.SeedSequence(run_seed).generate_state(1)[0])
+    theta_bits = np.ascontiguousarray(theta, dtype=np.float64).view(
+        np.uint64)
+    return int(np.random.SeedSequence(run_seed, spawn_key=tuple(
+        int(bits) for bits in theta_bits)).generate_state(1)[0])
+
+def populate_mock(theta, model, timer=NULL_TIMER):
     """
     Populate mock based on five SMHM parameter values and model
 
@@ -523,6 +881,9 @@ def populate_mock(theta, model):
     model: halotools model instance
         Model based on behroozi 2010 SMHM
 
+    timer: StageTimer, optional
+        Timer of likelihood stages
+
     Returns
     ---------
     gals_df: pandas dataframe
@@ -538,21 +899,16 @@ def populate_mock(theta, model):
     model.param_dict['smhm_delta_0'] = mhigh_slope
     model.param_dict['scatter_model_param1'] = mstellar_scatter
 
-    model.mock.populate()
-
-    if survey == 'eco' or survey == 'resolvea':
-        if mf_type == 'smf':
-            limit = np.round(np.log10((10**8.9) / 2.041), 1)
-        elif mf_type == 'bmf':
-            limit = np.round(np.log10((10**9.4) / 2.041), 1)
-    elif survey == 'resolveb':
-        if mf_type == 'smf':
-            limit = np.round(np.log10((10**8.7) / 2.041), 1)
-        elif mf_type == 'bmf':
-            limit = np.round(np.log10((10**9.1) / 2.041), 1)
-    sample_mask = model_init.mock.galaxy_table['stellar_mass'] >= 10**limit
-    gals = model.mock.galaxy_table[sample_mask]
-    gals_df = gals.to_pandas()
+    with timer.stage('populate'):
+        model.mock.populate(seed=populate_seed(theta))
+
+    with timer.stage('mask_to_pandas'):
+        # Lowest limit of all surveys fit, each statistic applies its own
+        limit = min(get_survey(name).model_limit(mf_type) for name in
+            fit_surveys())
+        sample_mask = model.mock.galaxy_table['stellar_mass'] >= 10**limit
+        gals = model.mock.galaxy_table[sample_mask]
+        gals_df = gals.to_pandas()
 
     return gals_df
 
@@ -586,7 +942,47 @@ def chi_squared(data, model, err_data, inv_corr_mat):
     chi_squared = np.dot(np.dot(first_term,inv_corr_mat),third_term)
     return chi_squared[0][0]
 
-def lnprob(theta, phi, err_tot, inv_corr_mat):
+def model_mf(theta, timer=NULL_TIMER, lowfi=False):
+    """
+    Populates mock once and measures the model mass function of every
+    survey fit from it
+
+    Parameters
+    ----------
+    theta: array
+        Array of parameter values
+
+    timer: StageTimer, optional
+        Timer of likelihood stages
+
+    lowfi: boolean, optional
+        True to populate the halo subsample lowfi_halos, weighting galaxies
+        so that the mass function is normalized to the full box
+
+    Returns
+    ---------
+    phi_model: array
+        Array of y-axis values of mass function, concatenated over surveys
+        for a joint fit
+
+    gals_df: pandas dataframe
+        Dataframe of mock catalog
+    """
+    gals_df = populate_mock(theta, model_lowfi if lowfi else model_init,
+        timer)
+    v_sim = 130**3
+    with timer.stage('histogram'):
+        weights = None
+        if lowfi:
+            weights = fidelity.galaxy_weights(gals_df.halo_hostid.values,
+                lowfi_halos)
+        logmass_arr = np.log10(gals_df.stellar_mass.values)
+        phi_model = np.concatenate([np.log10(measure_mf(logmass_arr, v_sim,
+            get_survey(name).bins(mf_type), weights)[1]) for name in
+            fit_surveys()])
+    return phi_model, gals_df
+
+def lnprob(theta, phi, err_tot, inv_corr_mat, lowfi=False):
     """
     Calculates log probability for emcee
 
@@ -601,50 +997,52 @@ def lnprob(theta, phi, err_tot, inv_corr_mat):
     err_tot: array
         Array of error values of mass function
 
+    lowfi: boolean, optional
+        True to evaluate the model on the halo subsample
+
     Returns
     ---------
     lnp: float
         Log probability given a model
 
-    chi2: float
-        Value of chi-squared given a model 
+    chi2: float or tuple
+        Value of chi-squared given a model. If stage profiling is enabled,
+        tuple of chi-squared and stage timings of evaluation. If model blobs
+        are stored, tuple of the above and the blob record (None if the
+        evaluation was rejected or failed).
         
     """
-    if theta[0] < 0:
+    timer = StageTimer() if profile_every or monitor_port is not None else \
+        NULL_TIMER
+    record = None
+    if theta[0] < 0 or theta[1] < 0 or theta[2] < 0 or theta[3] < 0 or \
+        theta[4] < 0.1:
         chi2 = -np.inf
-        return -np.inf, chi2
-    if theta[1] < 0:
-        chi2 = -np.inf
-        return -np.inf, chi2
-    if theta[2] < 0:
-        chi2 = -np.inf
-        return -np.inf, chi2
-    if theta[3] < 0:
-        chi2 = -np.inf
-        return -np.inf, chi2       
-    if theta[4] < 0.1:
-        chi2 = -np.inf
-        return -np.inf, chi2
+        timer.reject()
+        return -np.inf, with_record(timer.blob(chi2), record)
     warnings.simplefilter("error", (UserWarning, RuntimeWarning))
     try:
-        gals_df = populate_mock(theta, model_init)
-        v_sim = 130**3
-        mstellar_mock = gals_df.stellar_mass.values 
-        if mf_type == 'smf':
-            max_model, phi_model, err_tot_model, bins_model, counts_model = \
-                diff_smf(mstellar_mock, v_sim, True)
-        elif mf_type == 'bmf':
-            max_model, phi_model, err_tot_model, bins_model, counts_model = \
-                diff_bmf(mstellar_mock, v_sim, True)           
-        chi2 = chi_squared(phi, phi_model, err_tot, inv_corr_mat)
+        phi_model, gals_df = model_mf(theta, timer, lowfi)
+        with timer.stage('chi2'):
+            chi2 = chi_squared(phi, phi_model, err_tot, inv_corr_mat)
         lnp = -chi2 / 2
         if math.isnan(lnp):
             raise ValueError
+        if store_blobs:
+            record = pack_record(chi2, phi_model, smhm_summary(gals_df))
     except (ValueError, RuntimeWarning, UserWarning):
         lnp = -np.inf
         chi2 = np.inf
+        record = None
+        timer.fail()
 
-    return lnp, chi2
+    return lnp, with_record(timer.blob(chi2), record)
+
+def with_record(blob, record):
+    """Adds blob record of model predictions to blob if they are stored"""
+    if store_blobs:
+        return blob, record
+    return blob
 
 def write_to_files(sampler):
     """
@@ -685,6 +1083,87 @@ def write_to_files(sampler):
             outfile.write(str(value))
             outfile.write("\n")
     
+def prepare_data(survey_name, catl_file, path_to_mocks, nproc=1):
+    """
+    Measures data mass function and its errors from mocks
+
+    Parameters
+    ----------
+    survey_name: string
+        Name of survey
+
+    catl_file: string
+        Path to survey catalog file
+
+    path_to_mocks: string
+        Path to mock catalogs
+
+    nproc: int, optional
+        Number of processes used to read mocks
+
+    Returns
+    ---------
+    data_arrays: dict
+        Data mass function, error from mocks, inverse correlation matrix and
+        median redshift of survey
+    """
+    print('Reading catalog')
+    catl, volume, z_median = read_data_catl(catl_file, survey_name)
+
+    print('Retrieving stellar mass from catalog')
+    stellar_mass_arr = catl.logmstar.values
+    if mf_type == 'smf':
+        maxis_data, phi_data, err_data, bins_data, counts_data = \
+            diff_smf(stellar_mass_arr, volume, False, survey_name)
+    elif mf_type == 'bmf':
+        gas_mass_arr = catl.logmgas.values
+        bary_mass_arr = calc_bary(stellar_mass_arr, gas_mass_arr)
+        maxis_data, phi_data, err_data, bins_data, counts_data = \
+            diff_bmf(bary_mass_arr, volume, False, survey_name)
+
+    print('Measuring error in data from mocks')
+    err_data, inv_corr_mat = get_err_data(survey_name, path_to_mocks, nproc)
+
+    data_arrays = {'phi': phi_data, 'err': err_data,
+        'inv_corr_mat': inv_corr_mat, 'z_median': z_median}
+    return data_arrays
+
+def survey_files(survey_name, dict_of_paths):
+    """
+    Paths to the data catalog and mocks of a survey
+
+    Parameters
+    ----------
+    survey_name: string
+        Name of survey
+
+    dict_of_paths: dict
+        Paths from cosmo_utils cookiecutter_paths
+
+    Returns
+    ---------
+    catl_file: string
+        Path to data catalog
+
+    path_to_mocks: string
+        Path to directory of mock catalogs
+    """
+    path_to_raw = dict_of_paths['raw_dir']
+    if survey_name == 'eco':
+        catl_file = path_to_raw + "eco/eco_all.csv"
+        path_to_mocks = dict_of_paths['data_dir'] + 'mocks/m200b/eco/'
+    elif survey_name == 'resolvea':
+        catl_file = path_to_raw + "RESOLVE_liveJune2018.csv"
+        path_to_mocks = dict_of_paths['ext_dir'] + 'RESOLVE_A_mvir_catls/'
+    elif survey_name == 'resolveb':
+        catl_file = path_to_raw + "RESOLVE_liveJune2018.csv"
+        path_to_mocks = dict_of_paths['ext_dir'] + 'RESOLVE_B_mvir_catls/'
+    else:
+        msg = 'Survey {0} not supported! Options: eco/resolvea/resolveb'.\
+            format(survey_name)
+        raise ValueError(msg)
+    return catl_file, path_to_mocks
+
 def args_parser():
     """
     Parsing arguments passed to script
@@ -699,7 +1178,8 @@ def args_parser():
     parser.add_argument('machine', type=str, \
         help='Options: mac/bender')
     parser.add_argument('survey', type=str, \
-        help='Options: eco/resolvea/resolveb')
+        help='Options: eco/resolvea/resolveb, or several joined by + for a '
+        'joint fit (e.g. eco+resolveb)')
     parser.add_argument('mf_type', type=str, \
         help='Options: smf/bmf')
     parser.add_argument('nproc', type=int, nargs='?', 
@@ -708,6 +1188,57 @@ def args_parser():
         help='Number of walkers', default=250)
     parser.add_argument('nsteps', type=int, nargs='?', help='Number of steps',
         default=1000)
+    parser.add_argument('--rebuild', action='store_true',
+        help='Ignore cached prepared run and rebuild it from catalogs')
+    parser.add_argument('--profile', type=int, default=0, metavar='N',
+        help='Time lnprob stages and dump profile every N steps (0: off)')
+    parser.add_argument('--monitor', type=int, default=None, metavar='PORT',
+        help='Serve run status as text (/) and JSON (/json) on localhost:PORT'
+        ', 0 picks a free port written to mcmc_<survey>_<mf_type>_monitor.url')
+    parser.add_argument('--checkpoint', type=int, default=10, metavar='N',
+        help='Snapshot sampler state every N steps (0: off)')
+    parser.add_argument('--resume', action='store_true',
+        help='Continue from last checkpoint instead of starting a new chain. '
+        'Continues the chain exactly if --seed and --crn are those of the '
+        'interrupted run, which is checked')
+    parser.add_argument('--converge', type=int, default=0, metavar='K',
+        help='Estimate autocorrelation time every K steps and stop once '
+        'converged, nsteps becomes the maximum (0: off)')
+    parser.add_argument('--tau_factor', type=float, default=50, metavar='M',
+        help='Converged chains are longer than M times autocorrelation time')
+    parser.add_argument('--tau_rtol', type=float, default=0.01,
+        help='Largest relative change of autocorrelation time between checks'
+        ' of a converged chain')
+    parser.add_argument('--emulator', type=int, default=0, metavar='N',
+        help='Sample with an emulator trained on N forward-model runs '
+        '(0: off)')
+    parser.add_argument('--refine', type=int, default=0, metavar='M',
+        help='Importance weight M samples of the emulated chain with the '
+        'forward model (0: off)')
+    parser.add_argument('--init_method', type=str, default='de',
+        choices=METHODS, help='Optimizer finding the MAP that walkers start '
+        'around')
+    parser.add_argument('--map_maxiter', type=int, default=50,
+        help='Largest number of optimizer iterations')
+    parser.add_argument('--blobs', action='store_true',
+        help='Store model mass function and binned SMHM of every sample '
+        'next to the chain')
+    parser.add_argument('--seed', type=int, default=12,
+        help='Seed of the run (walker moves, MAP search, subsamples and mock '
+        'populations)')
+    parser.add_argument('--crn', action='store_true',
+        help='Populate every mock with the same scatter deviates (common '
+        'random numbers), making chi2 a deterministic function of theta')
+    parser.add_argument('--lowfi', type=float, default=0, metavar='F',
+        help='Burn in on a subsample of fraction F of the halo catalog, then '
+        'continue on the full catalog from the last walker positions (0: off)')
+    parser.add_argument('--lowfi_method', type=str, default='subbox',
+        choices=fidelity.METHODS, help='Spatial sub-box or mass-stratified '
+        'subsample of host halos')
+    parser.add_argument('--lowfi_steps', type=int, default=None, metavar='N',
+        help='Largest number of burn-in steps, ended earlier by --converge '
+        '(default: nsteps)')
+    add_pool_args(parser)
     args = parser.parse_args()
     return args
 
@@ -725,7 +1256,23 @@ def main(args):
     global survey
     global path_to_proc
     global mf_type
-    rseed = 12
+    global profile_every
+    global checkpoint_every
+    global converge_every
+    global tau_factor
+    global tau_rtol
+    global pool_backend
+    global dask_address
+    global worker_args
+    global store_blobs
+    global init_method
+    global map_maxiter
+    global model_lowfi
+    global lowfi_halos
+    global crn
+    global run_seed
+    global monitor_port
+    rseed = args.seed
     np.random.seed(rseed)
 
     survey = args.survey
@@ -734,12 +1281,24 @@ def main(args):
     nwalkers = args.nwalkers
     nsteps = args.nsteps
     mf_type = args.mf_type
+    profile_every = args.profile
+    monitor_port = args.monitor
+    checkpoint_every = args.checkpoint
+    converge_every = args.converge
+    tau_factor = args.tau_factor
+    tau_rtol = args.tau_rtol
+    store_blobs = args.blobs
+    init_method = args.init_method
+    map_maxiter = args.map_maxiter
+    pool_backend = args.pool
+    crn = args.crn
+    run_seed = rseed
+    dask_address = args.dask_address
     
+    from cosmo_utils.utils import work_paths as cwpaths
     dict_of_paths = cwpaths.cookiecutter_paths()
     path_to_raw = dict_of_paths['raw_dir']
     path_to_proc = dict_of_paths['proc_dir']
-    path_to_external = dict_of_paths['ext_dir']
-    path_to_data = dict_of_paths['data_dir']
 
     if machine == 'bender':
         halo_catalog = '/home/asadm2/.astropy/cache/halotools/halo_catalogs/'\
@@ -747,39 +1306,97 @@ def main(args):
     elif machine == 'mac':
         halo_catalog = path_to_raw + 'vishnu_rockstar_test.hdf5'
 
-    if survey == 'eco':
-        catl_file = path_to_raw + "eco/eco_all.csv"
-    elif survey == 'resolvea' or survey == 'resolveb':
-        catl_file = path_to_raw + "RESOLVE_liveJune2018.csv"
-
-    if survey == 'eco':
-        path_to_mocks = path_to_data + 'mocks/m200b/eco/'
-    elif survey == 'resolvea':
-        path_to_mocks = path_to_external + 'RESOLVE_A_mvir_catls/'
-    elif survey == 'resolveb':
-        path_to_mocks = path_to_external + 'RESOLVE_B_mvir_catls/'
-
-    print('Reading catalog')
-    catl, volume, z_median = read_data_catl(catl_file, survey)
-
-    print('Retrieving stellar mass from catalog')
-    stellar_mass_arr = catl.logmstar.values
-    if mf_type == 'smf':
-        maxis_data, phi_data, err_data, bins_data, counts_data = \
-            diff_smf(stellar_mass_arr, volume, False)
-    elif mf_type == 'bmf':
-        gas_mass_arr = catl.logmgas.values
-        bary_mass_arr = calc_bary(stellar_mass_arr, gas_mass_arr)
-        maxis_data, phi_data, err_data, bins_data, counts_data = \
-            diff_bmf(bary_mass_arr, volume, False)
-    print('Initial population of halo catalog')
-    model_init = halocat_init(halo_catalog, z_median)
-
-    print('Measuring error in data from mocks')
-    err_data, inv_corr_mat = get_err_data(survey, path_to_mocks)
+    # Under MPI only the master builds the prepared runs, the other ranks
+    # read them once the master has written them
+    master = is_master(pool_backend)
+    data_list, halo_arrays, model_init, model_z = [], None, None, None
+    run_metas = []
+    for survey_name in fit_surveys():
+        catl_file, path_to_mocks = survey_files(survey_name, dict_of_paths)
+        prepared_fname = path_to_proc + 'prepared_run_{0}_{1}.npz'.format(
+            survey_name, mf_type)
+        meta = prepared_run_meta(get_survey(survey_name), mf_type, catl_file,
+            halo_catalog, path_to_mocks)
+        run_metas.append(meta)
+        data_arrays, survey_halos = None, None
+        if master and not args.rebuild:
+            data_arrays, survey_halos = load_prepared_run(prepared_fname,
+                meta)
+            if data_arrays is not None:
+                print('Using prepared run {0}'.format(prepared_fname))
+
+        if master and data_arrays is None:
+            t_prepare = time.time()
+            data_arrays = prepare_data(survey_name, catl_file, path_to_mocks,
+                nproc)
+            if halo_arrays is None:
+                print('Initial population of halo catalog')
+                model_z = float(data_arrays['z_median'])
+                model_init, halocat = halocat_init(halo_catalog, model_z)
+                halo_arrays = halo_arrays_from_catalog(halocat)
+            save_prepared_run(prepared_fname, meta, data_arrays, halo_arrays)
+            print('Prepared run written to {0} in {1:.1f} seconds'.format(
+                prepared_fname, time.time() - t_prepare))
+        broadcast(pool_backend, None)
+
+        if not master:
+            data_arrays, survey_halos = load_prepared_run(prepared_fname,
+                meta)
+        if halo_arrays is None:
+            halo_arrays = survey_halos
+        data_list.append(data_arrays)
+
+    # One model redshift, that of the first survey, for a joint fit
+    z_median = float(data_list[0]['z_median'])
+    if model_init is None or model_z != z_median:
+        print('Initial population of halo catalog')
+        model_init, halocat = halocat_init(halo_catalog, z_median,
+            halo_arrays)
+    if args.lowfi:
+        if args.emulator:
+            msg = '--lowfi and --emulator cannot be combined'
+            raise ValueError(msg)
+        lowfi_halos = fidelity.subsample_halos(halo_arrays, args.lowfi,
+            args.lowfi_method, seed=rseed)
+        print('Burn-in halo subsample keeps {0:.1%} of halos'.format(
+            fidelity.cost_fraction(halo_arrays, lowfi_halos)))
+        model_lowfi, _ = halocat_init(halo_catalog, z_median,
+            lowfi_halos['halo_arrays'])
+    worker_args = (survey, mf_type, profile_every, store_blobs, halo_catalog,
+        z_median, halo_arrays, lowfi_halos, crn, run_seed, monitor_port)
+
+    phi_data, err_data, inv_corr_mat = join_data(data_list)
     print(err_data, inv_corr_mat)
-    print('Running MCMC')
-    sampler = mcmc(nproc, nwalkers, nsteps, phi_data, err_data, inv_corr_mat)
+    if not args.emulator:
+        p0 = None
+        resume = args.resume
+        # A resumed run whose production chain has started skips burn-in
+        if args.lowfi and not (resume and
+            os.path.exists(run_fnames()[2])):
+            print('Running burn-in on halo subsample')
+            mcmc(nproc, nwalkers, args.lowfi_steps or nsteps, phi_data,
+                err_data, inv_corr_mat, resume, lowfi=True)
+            if master:
+                p0 = read_chain_positions(run_fnames('_lowfi')[0], nwalkers,
+                    5)[-1]
+            resume = False
+        print('Running MCMC')
+        sampler = mcmc(nproc, nwalkers, nsteps, phi_data, err_data,
+            inv_corr_mat, resume, p0=p0)
+        return
+
+    emulator_fname = path_to_proc + 'emulator_{0}_{1}_{2}.npz'.format(survey,
+        mf_type, args.emulator)
+    emulator = get_emulator(nproc, args.emulator, emulator_fname,
+        emulator_meta(args.emulator, run_metas), args.rebuild)
+    if master:
+        print('Running MCMC with emulator')
+        sampler = mcmc(nproc, nwalkers, nsteps, phi_data, err_data,
+            inv_corr_mat, args.resume, emulator)
+    if args.refine:
+        print('Refining emulated chain with forward model')
+        refine_chain(nproc, nwalkers, args.refine, phi_data, err_data,
+            inv_corr_mat, emulator)
 
 
 # Main function
@@ -10,7 +10,15 @@ import time
 from halotools.empirical_models import PrebuiltSubhaloModelFactory
 from halotools.sim_manager import CachedHaloCatalog
 from cosmo_utils.utils import work_paths as cwpaths
-from multiprocessing import Pool
+from src.mcmc.pools import add_pool_args, open_pool, is_master, broadcast
+from src.mcmc.emulator import PCAEmulator, EmulatedLikelihood, \
+    train_emulator, refine
+from src.mcmc.convergence import read_chain_positions
+from src.mcmc.blobs import BlobWriter, pack_record, blob_fname
+from src.mcmc.prepared_run import prepared_run_meta
+from src.data.surveys import get_survey
+from contextlib import nullcontext
+from functools import partial
 import pandas as pd
 import numpy as np
 import argparse
@@ -21,6 +29,15 @@ import os
 
 __author__ = '[Mehnaaz Asad]'
 
+# Design limits of the emulator, also its prior: (Mstar_q, Mh_q, mu, nu)
+EMULATOR_BOUNDS = [(10**10, 10**11), (10**13, 10**14.5), (0.2, 1.5),
+    (0.05, 0.5)]
+# Store model red and blue SMFs of every sample
+store_blobs = False
+# Mock galaxies of lnprob and forward_model in dask workers, set by
+# worker_init so that they are not sent with every task
+worker_gals_df = None
+
 def reading_catls(filename, catl_format='.hdf5'):
     """
     Function to read ECO/RESOLVE catalogues.
@@ -431,7 +448,70 @@ def halocat_init(halo_catalog, z_median):
 
     return model
 
-def mcmc(nproc, nwalkers, nsteps, phi_red, phi_blue, err_red, err_blue, gals_df):
+def worker_init(survey_, store_blobs_, gals_df):
+    """
+    Sets the module state lnprob and forward_model need in a dask worker,
+    which unlike forked and MPI workers does not run main()
+
+    Parameters
+    ----------
+    survey_: string
+        Name of survey, sets the SMF bins
+
+    store_blobs_: boolean
+        True if lnprob returns model SMFs as blobs
+
+    gals_df: pandas dataframe
+        Mock catalog populated with best fit SMHM parameters
+    """
+    global survey
+    global store_blobs
+    global worker_gals_df
+
+    survey = survey_
+    store_blobs = store_blobs_
+    worker_gals_df = gals_df
+
+def for_pool(func):
+    """
+    Function as seen by pool workers. Dask pickles functions of __main__ by
+    value, so its workers get the function of the importable module whose
+    state worker_init sets.
+    """
+    if pool_backend != 'dask':
+        return func
+    from src.mcmc import mcmc_colour as module
+    return getattr(module, func.__name__)
+
+def open_model_pool(nproc, gals_df):
+    """
+    Opens the pool evaluating lnprob or forward_model
+
+    Parameters
+    ----------
+    nproc: int
+        Number of processes or local dask workers
+
+    gals_df: pandas dataframe
+        Mock catalog populated with best fit SMHM parameters
+
+    Returns
+    ---------
+    pool_context: context manager
+        Context of open_pool
+
+    gals_kwargs: dict
+        Keyword arguments of lnprob and forward_model passing gals_df. Empty
+        for dask, whose workers get gals_df once from worker_init.
+    """
+    if pool_backend == 'dask':
+        return open_pool(pool_backend, nproc, for_pool(worker_init),
+            (survey, store_blobs, gals_df), dask_address), {}
+    return open_pool(pool_backend, nproc, address=dask_address), \
+        {'gals_df': gals_df}
+
+def mcmc(nproc, nwalkers, nsteps, phi_red, phi_blue, err_red, err_blue, gals_df,
+    emulator=None):
     """
     MCMC analysis
 
@@ -452,12 +532,22 @@ def mcmc(nproc, nwalkers, nsteps, phi_red, phi_blue, err_red, err_blue, gals_df)
     err: array
         Array of error per bin of mass function
 
+    emulator: PCAEmulator, optional
+        Emulator of the red and blue SMFs. If given, the chain is sampled
+        serially with the emulated likelihood and written to files tagged
+        '_emu'.
+
     Returns
     ---------
     sampler: multidimensional array
-        Result of running emcee 
+        Result of running emcee. None on MPI worker ranks.
 
     """
+    if not is_master(pool_backend):
+        # MPI workers only evaluate lnprob for the master until it finishes
+        with open_pool(pool_backend, nproc):
+            return None
+
     Mstar_q = 10**10.5 # Msun/h
     Mh_q = 10**13.76 # Msun/h
     mu = 0.69
@@ -469,17 +559,42 @@ def mcmc(nproc, nwalkers, nsteps, phi_red, phi_blue, err_red, err_blue, gals_df)
     p0 = hybrid_param_vals + 0.1*np.random.rand(ndim*nwalkers).\
         reshape((nwalkers, ndim))
 
-    with Pool(processes=nproc) as pool:
-        sampler = emcee.EnsembleSampler(nwalkers, ndim, lnprob, 
-            args=(phi_red, phi_blue, err_red, err_blue, gals_df), pool=pool)
+    tag = '' if emulator is None else '_emu'
+    if emulator is None:
+        # lnprob also reads survey and store_blobs, which forked and MPI
+        # workers inherit and dask workers get from worker_init
+        pool_context, gals_kwargs = open_model_pool(nproc, gals_df)
+        log_prob = partial(for_pool(lnprob), phi_red=phi_red,
+            phi_blue=phi_blue, err_red=err_red, err_blue=err_blue,
+            **gals_kwargs)
+    else:
+        # Emulated likelihood is cheaper than sending walkers to workers
+        log_prob = EmulatedLikelihood(emulator, np.append(phi_red, phi_blue),
+            np.append(err_red, err_blue))
+        pool_context = nullcontext()
+
+    blob_writer = None
+    if store_blobs and emulator is None:
+        blob_writer = BlobWriter(blob_fname(survey, 'colour'), nwalkers,
+            [('chi2', ()), ('phi_red', (len(phi_red),)),
+            ('phi_blue', (len(phi_blue),))], {'survey': survey})
+
+    with pool_context as pool:
+        sampler = emcee.EnsembleSampler(nwalkers, ndim, log_prob, pool=pool)
         start = time.time()
         for i,result in enumerate(sampler.sample(p0, iterations=nsteps, 
             storechain=False)):
             position = result[0]
-            chi2 = np.array(result[3])
+            blobs = result[3]
+            if blob_writer is not None:
+                blobs, records = zip(*blobs)
+                blob_writer.write(records)
+            chi2 = np.array(blobs)
             print("Iteration number {0} of {1}".format(i+1,nsteps))
-            chain_fname = open("mcmc_{0}_colour_raw.txt".format(survey), "a")
-            chi2_fname = open("{0}_colour_chi2.txt".format(survey), "a")
+            chain_fname = open("mcmc_{0}_colour_raw{1}.txt".format(survey,
+                tag), "a")
+            chi2_fname = open("{0}_colour_chi2{1}.txt".format(survey, tag),
+                "a")
             for k in range(position.shape[0]):
                 chain_fname.write(str(position[k]).strip("[]"))
                 chain_fname.write("\n")
@@ -496,6 +611,172 @@ def mcmc(nproc, nwalkers, nsteps, phi_red, phi_blue, err_red, err_blue, gals_df)
     
     return sampler
 
+def forward_model(theta, gals_df=None):
+    """
+    Model red and blue SMFs used to train the emulator
+
+    Parameters
+    ----------
+    theta: array
+        Array of parameter values
+
+    gals_df: pandas dataframe, optional
+        Mock catalog populated with best fit SMHM parameters. Defaults to
+        the one set by worker_init.
+
+    Returns
+    ---------
+    phi_model: array or None
+        Red SMF followed by blue SMF. None if the model has empty bins.
+    """
+    if gals_df is None:
+        gals_df = worker_gals_df
+    warnings.simplefilter("error", (UserWarning, RuntimeWarning))
+    try:
+        f_red_cen, f_red_sat = hybrid_quenching_model(theta, gals_df)
+        gals_df = assign_colour_label_mock(f_red_cen, f_red_sat, gals_df)
+        v_sim = 130**3
+        total_model, red_model, blue_model = measure_all_smf(gals_df, v_sim,
+            False)
+        phi_model = np.append(red_model[1], blue_model[1])
+        if not np.all(np.isfinite(phi_model)):
+            raise ValueError
+    except (ValueError, RuntimeWarning, UserWarning):
+        phi_model = None
+    return phi_model
+
+def get_emulator(nproc, num_design, emulator_fname, gals_df, meta,
+    rebuild=False):
+    """
+    Loads emulator of the red and blue SMFs or trains it on forward-model
+    runs
+
+    Parameters
+    ----------
+    nproc: int
+        Number of processes running the forward model
+
+    num_design: int
+        Number of forward-model runs of the design
+
+    emulator_fname: string
+        Path to saved emulator
+
+    gals_df: pandas dataframe
+        Mock catalog populated with best fit SMHM parameters
+
+    meta: dict
+        Metadata the emulator is keyed on, see emulator_meta. A saved
+        emulator with different metadata is retrained.
+
+    rebuild: boolean, optional
+        True to train even if a saved emulator exists
+
+    Returns
+    ---------
+    emulator: PCAEmulator or None
+        Emulator of the SMFs. None on MPI worker ranks.
+    """
+    master = is_master(pool_backend)
+    emulator = None
+    if master and not rebuild:
+        emulator = PCAEmulator.load(emulator_fname, meta)
+    if not broadcast(pool_backend, emulator is None):
+        if not master:
+            return None
+        print('Using emulator {0}'.format(emulator_fname))
+        return emulator
+
+    pool_context, gals_kwargs = open_model_pool(nproc, gals_df)
+    with pool_context as pool:
+        if pool is None:
+            return None
+        emulator = train_emulator(partial(for_pool(forward_model),
+            **gals_kwargs), EMULATOR_BOUNDS, num_design, pool,
+            seed=num_design)
+    emulator.save(emulator_fname, meta)
+    print('Emulator written to {0}'.format(emulator_fname))
+    return emulator
+
+def emulator_meta(num_design, bf_params, run_meta):
+    """
+    Builds the metadata an emulator is keyed on
+
+    Parameters
+    ----------
+    num_design: int
+        Number of forward-model runs of the design
+
+    bf_params: array
+        SMHM parameters the mock of the forward model is populated with
+
+    run_meta: dict
+        Metadata of the survey, catalogs and mocks, see prepared_run_meta
+
+    Returns
+    ---------
+    meta: dict
+        JSON serializable description of the design limits and inputs the
+        emulator was trained on
+    """
+    meta = {
+        'bounds': EMULATOR_BOUNDS,
+        'num_design': num_design,
+        'bf_params': np.asarray(bf_params, dtype=float).tolist(),
+        'run': run_meta,
+    }
+    return meta
+
+def refine_chain(nproc, nwalkers, num_refine, phi_red, phi_blue, err_red,
+    err_blue, gals_df, emulator):
+    """
+    Importance weights of the emulated chain from true likelihood
+    evaluations, written to mcmc_<survey>_colour_refined.npz
+
+    Parameters
+    ----------
+    nproc: int
+        Number of processes running the forward model
+
+    nwalkers: int
+        Number of walkers of the emulated chain
+
+    num_refine: int
+        Number of samples from the second half of the emulated chain that
+        are evaluated with the forward model
+
+    phi_red, phi_blue, err_red, err_blue: array
+        Data SMFs of red and blue galaxies and their errors
+
+    gals_df: pandas dataframe
+        Mock catalog populated with best fit SMHM parameters
+
+    emulator: PCAEmulator
+        Emulator the chain was sampled with. None on MPI worker ranks.
+
+    Returns
+    ---------
+    refined: dict or None
+        Output of emulator.refine. None on MPI worker ranks.
+    """
+    pool_context, gals_kwargs = open_model_pool(nproc, gals_df)
+    with pool_context as pool:
+        if pool is None:
+            return None
+        positions = read_chain_positions(
+            "mcmc_{0}_colour_raw_emu.txt".format(survey), nwalkers, 4)
+        samples = positions[len(positions) // 2:].reshape(-1, 4)
+        true_lnprob = partial(for_pool(lnprob), phi_red=phi_red,
+            phi_blue=phi_blue, err_red=err_red, err_blue=err_blue,
+            **gals_kwargs)
+        refined = refine(samples, EmulatedLikelihood(emulator,
+            np.append(phi_red, phi_blue), np.append(err_red, err_blue)),
+            true_lnprob, num_refine, pool, np.random.default_rng(num_refine))
+    np.savez("mcmc_{0}_colour_refined.npz".format(survey), **refined)
+    print('Effective sample size of {0} refined samples: {1:.1f}'.format(
+        len(refined['weights']), refined['ess']))
+    return refined
+
 def populate_mock(theta, model):
     """
     Populate mock based on five SMHM parameter values and model
@@ -657,7 +938,7 @@ def chi_squared(data, model, err_data):
 
     return chi_squared
 
-def lnprob(theta, phi_red, phi_blue, err_red, err_blue, gals_df):
+def lnprob(theta, phi_red, phi_blue, err_red, err_blue, gals_df=None):
     """
     Calculates log probability for emcee
 
@@ -672,28 +953,36 @@ def lnprob(theta, phi_red, phi_blue, err_red, err_blue, gals_df):
     err_tot: array
         Array of error values of mass function
 
+    gals_df: pandas dataframe, optional
+        Mock catalog populated with best fit SMHM parameters. Defaults to
+        the one set by worker_init.
+
     Returns
     ---------
     lnp: float
         Log probability given a model
 
-    chi2: float
-        Value of chi-squared given a model 
+    chi2: float or tuple
+        Value of chi-squared given a model. If model blobs are stored, tuple
+        of chi-squared and the blob record of red and blue SMFs (None if the
+        evaluation was rejected or failed).
         
     """
     if theta[0] < 0:
         chi2 = -np.inf
-        return -np.inf, chi2
+        return -np.inf, with_record(chi2, None)
     if theta[1] < 0:
         chi2 = -np.inf
-        return -np.inf, chi2
+        return -np.inf, with_record(chi2, None)
     if theta[2] < 0:
         chi2 = -np.inf
-        return -np.inf, chi2
+        return -np.inf, with_record(chi2, None)
     if theta[3] < 0:
         chi2 = -np.inf
-        return -np.inf, chi2       
+        return -np.inf, with_record(chi2, None)
 
+    if gals_df is None:
+        gals_df = worker_gals_df
     warnings.simplefilter("error", (UserWarning, RuntimeWarning))
     try:
         f_red_cen, f_red_sat = hybrid_quenching_model(theta, gals_df)
@@ -719,11 +1008,19 @@ def lnprob(theta, phi_red, phi_blue, err_red, err_blue, gals_df):
         lnp = -chi2 / 2
         if math.isnan(lnp):
             raise ValueError
+        record = pack_record(chi2, red_model[1], blue_model[1])
     except (ValueError, RuntimeWarning, UserWarning):
         lnp = -np.inf
         chi2 = np.inf
+        record = None
 
-    return lnp, chi2
+    return lnp, with_record(chi2, record)
+
+def with_record(chi2, record):
+    """Adds blob record of model predictions to blob if they are stored"""
+    if store_blobs:
+        return chi2, record
+    return chi2
 
 def hybrid_quenching_model(theta, gals_df):
     """
@@ -1046,6 +1343,18 @@ def args_parser():
         help='Number of walkers', default=260)
     parser.add_argument('nsteps', type=int, nargs='?', help='Number of steps',
         default=1000)
+    parser.add_argument('--emulator', type=int, default=0, metavar='N',
+        help='Sample with an emulator trained on N forward-model runs '
+        '(0: off)')
+    parser.add_argument('--refine', type=int, default=0, metavar='M',
+        help='Importance weight M samples of the emulated chain with the '
+        'forward model (0: off)')
+    parser.add_argument('--rebuild', action='store_true',
+        help='Train emulator even if a saved one exists')
+    parser.add_argument('--blobs', action='store_true',
+        help='Store model red and blue SMFs of every sample next to the '
+        'chain')
+    add_pool_args(parser)
     args = parser.parse_args()
     return args
 
@@ -1063,6 +1372,9 @@ def main(args):
     global survey
     global path_to_proc
     global mf_type
+    global pool_backend
+    global dask_address
+    global store_blobs
     rseed = 12
     np.random.seed(rseed)
 
@@ -1072,6 +1384,9 @@ def main(args):
     nwalkers = args.nwalkers
     nsteps = args.nsteps
     mf_type = args.mf_type
+    pool_backend = args.pool
+    dask_address = args.dask_address
+    store_blobs = args.blobs
     
     dict_of_paths = cwpaths.cookiecutter_paths()
     path_to_raw = dict_of_paths['raw_dir']
@@ -1128,9 +1443,26 @@ def main(args):
     gals_df_ = populate_mock(bf_params, model_init)
     gals_df_ = assign_cen_sat_flag(gals_df_)
 
-    print('Running MCMC')
-    sampler = mcmc(nproc, nwalkers, nsteps, red_data[1], blue_data[1], 
-        red_data[2], blue_data[2], gals_df_)
+    if not args.emulator:
+        print('Running MCMC')
+        sampler = mcmc(nproc, nwalkers, nsteps, red_data[1], blue_data[1],
+            red_data[2], blue_data[2], gals_df_)
+        return
+
+    emulator_fname = path_to_proc + 'emulator_{0}_colour_{1}.npz'.format(
+        survey, args.emulator)
+    meta = emulator_meta(args.emulator, bf_params, prepared_run_meta(
+        get_survey(survey), 'smf', catl_file, halo_catalog, path_to_mocks))
+    emulator = get_emulator(nproc, args.emulator, emulator_fname, gals_df_,
+        meta, args.rebuild)
+    if is_master(pool_backend):
+        print('Running MCMC with emulator')
+        sampler = mcmc(nproc, nwalkers, nsteps, red_data[1], blue_data[1],
+            red_data[2], blue_data[2], gals_df_, emulator)
+    if args.refine:
+        print('Refining emulated chain with forward model')
+        refine_chain(nproc, nwalkers, args.refine, red_data[1], blue_data[1],
+            red_data[2], blue_data[2], gals_df_, emulator)
 
 # Main function
 if __name__ == '__main__':
@@ -10,7 +10,7 @@ import time
 from halotools.empirical_models import PrebuiltSubhaloModelFactory
 from halotools.sim_manager import CachedHaloCatalog
 from cosmo_utils.utils import work_paths as cwpaths
-from multiprocessing import Pool
+from src.mcmc.pools import open_pool, is_master
 import pandas as pd
 import numpy as np
 import emcee
@@ -126,16 +126,24 @@ behroozi10_param_vals = [12.25,10.62,0.54,0.67,0.3]
 
 nwalkers = 250
 ndim = 5
+nproc = 20
+# multiprocessing, mpi (run with mpirun -n N) or dask, see src.mcmc.pools
+pool_backend = 'multiprocessing'
+dask_address = None
 p0 = behroozi10_param_vals + 0.1*np.random.rand(ndim*nwalkers).\
     reshape((nwalkers,ndim))
-with Pool(processes=20) as pool:
-    sampler = emcee.EnsembleSampler(nwalkers, ndim, lnprob, args=(fake_y, \
-            fake_err),pool=pool)
-    start = time.time()
-    sampler.run_mcmc(p0, 500)
-    end = time.time()
-    multi_time = end - start
-    print("Multiprocessing took {0:.1f} seconds".format(multi_time))
+with open_pool(pool_backend, nproc, address=dask_address) as pool:
+    # MPI worker ranks only serve the master
+    if pool is not None:
+        sampler = emcee.EnsembleSampler(nwalkers, ndim, lnprob,
+            args=(fake_y, fake_err), pool=pool)
+        start = time.time()
+        sampler.run_mcmc(p0, 500)
+        end = time.time()
+        multi_time = end - start
+        print("Multiprocessing took {0:.1f} seconds".format(multi_time))
+if not is_master(pool_backend):
+    raise SystemExit
 
 print("Writing chain to file")
 chain = sampler.flatchain
@@ -0,0 +1,204 @@
+"""
+{This module serves the live state of a running chain on localhost: steps per
+ second, mean duration of the likelihood stages, acceptance fraction,
+ autocorrelation times, best chi-squared and worker utilization. The sampler
+ publishes after every step and a background thread answers HTTP requests
+ with a text summary (/) or JSON (/json), so stalled or slow chains on shared
+ nodes are found without reading their chain files}
+"""
+
+# Built-in/Generic Imports
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import socket
+import threading
+import time
+
+# Libs
+import numpy as np
+
+from src.mcmc.instrumentation import STAGES
+
+__author__ = '{Mehnaaz Asad}'
+
+HOST = '127.0.0.1'
+# Number of recent steps the current step rate is measured over
+RATE_WINDOW = 20
+
+
+def _finite(value):
+    """Float of value, None if it is missing or not finite"""
+    if value is None or not np.isfinite(value):
+        return None
+    return float(value)
+
+
+class RunMonitor(object):
+    """
+    Thread-safe run status served over HTTP on localhost
+    """
+    def __init__(self, port=0, nworkers=1, info=None, url_fname=None):
+        """
+        Parameters
+        ----------
+        port: int, optional
+            Port to listen on, 0 picks a free port
+
+        nworkers: int, optional
+            Number of processes evaluating the likelihood
+
+        info: dict, optional
+            JSON serializable description of the run, e.g. survey and
+            number of walkers
+
+        url_fname: string, optional
+            File the URL of the monitor is written to, so that monitors of
+            chains sharing a node can be found
+        """
+        self.nworkers = max(nworkers, 1)
+        self.info = dict(info or {}, pid=os.getpid(),
+            host=socket.gethostname())
+        self._lock = threading.Lock()
+        self._t_start = time.time()
+        self._recent = deque(maxlen=RATE_WINDOW + 1)
+        self._busy_last = None
+        self._status = {'step': 0, 'updated': self._t_start}
+
+        monitor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') == '/json':
+                    body = json.dumps(monitor.status()).encode()
+                    content_type = 'application/json'
+                elif self.path in ('', '/'):
+                    body = monitor.text().encode()
+                    content_type = 'text/plain; charset=utf-8'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((HOST, port), Handler)
+        self._server.daemon_threads = True
+        self.url = 'http://{0}:{1}/'.format(HOST, self._server.server_port)
+        self._thread = threading.Thread(target=self._server.serve_forever,
+            daemon=True)
+        self._thread.start()
+        if url_fname is not None:
+            with open(url_fname, 'w') as outfile:
+                outfile.write(self.url + '\n')
+        print('Monitor serving at {0}'.format(self.url))
+
+    def update(self, step, nsteps, acceptance, chi2, tau=None, profile=None):
+        """
+        Publishes the state after a step
+
+        Parameters
+        ----------
+        step: int
+            Number of steps taken so far
+
+        nsteps: int
+            Largest number of steps of the run
+
+        acceptance: array
+            Acceptance fraction of each walker
+
+        chi2: array
+            Chi-squared of each walker at this step
+
+        tau: array, optional
+            Latest autocorrelation time estimate of each parameter
+
+        profile: StageProfile, optional
+            Stage timings aggregated so far
+        """
+        t_now = time.time()
+        self._recent.append((t_now, step))
+        t_first, step_first = self._recent[0]
+        rate = (step - step_first) / (t_now - t_first) if \
+            t_now > t_first else None
+        finite_chi2 = np.asarray(chi2, dtype=float)
+        finite_chi2 = finite_chi2[np.isfinite(finite_chi2)]
+        best_chi2 = _finite(finite_chi2.min()) if len(finite_chi2) else None
+        acceptance = np.asarray(acceptance, dtype=float)
+
+        stages, utilization = None, None
+        if profile is not None:
+            summary = profile.summary()['stages']
+            stages = {name: summary[name]['mean_s'] for name in STAGES +
+                ('total',)}
+            # Share of worker time spent in the likelihood since last step
+            busy = (summary['total']['total_s'], t_now)
+            if self._busy_last is not None and busy[1] > self._busy_last[1]:
+                utilization = (busy[0] - self._busy_last[0]) / \
+                    ((busy[1] - self._busy_last[1]) * self.nworkers)
+            self._busy_last = busy
+
+        with self._lock:
+            previous = self._status.get('best_chi2')
+            if previous is not None and (best_chi2 is None or
+                previous < best_chi2):
+                best_chi2 = previous
+            self._status = {
+                'step': step,
+                'nsteps': nsteps,
+                'elapsed_s': t_now - self._t_start,
+                'steps_per_s': rate,
+                'acceptance_fraction': {
+                    'mean': _finite(acceptance.mean()),
+                    'min': _finite(acceptance.min()),
+                    'max': _finite(acceptance.max())},
+                'tau': None if tau is None else [_finite(value) for value
+                    in tau],
+                'best_chi2': best_chi2,
+                'stage_mean_s': stages,
+                'worker_utilization': _finite(utilization),
+                'updated': t_now,
+            }
+
+    def status(self):
+        """Returns JSON serializable status with the age of the last step"""
+        with self._lock:
+            status = dict(self._status, info=self.info)
+        status['seconds_since_update'] = time.time() - status['updated']
+        return status
+
+    def text(self):
+        """Returns human readable status"""
+        status = self.status()
+        lines = ['{0}'.format(' '.join('{0}={1}'.format(key, value) for
+            key, value in sorted(status['info'].items())))]
+        lines.append('step {0} of {1}, last step {2:.0f} s ago'.format(
+            status['step'], status.get('nsteps'),
+            status['seconds_since_update']))
+        for key in ('steps_per_s', 'best_chi2', 'worker_utilization'):
+            if status.get(key) is not None:
+                lines.append('{0}: {1:.4g}'.format(key, status[key]))
+        acceptance = status.get('acceptance_fraction')
+        if acceptance and acceptance['mean'] is not None:
+            lines.append('acceptance fraction: {mean:.3f} (min {min:.3f}, '
+                'max {max:.3f})'.format(**acceptance))
+        if status.get('tau'):
+            lines.append('tau: {0}'.format(', '.join('n/a' if value is None
+                else '{0:.1f}'.format(value) for value in status['tau'])))
+        if status.get('stage_mean_s'):
+            lines.append('mean stage time [s]: {0}'.format(', '.join(
+                '{0} {1:.3g}'.format(name, value) for name, value in
+                status['stage_mean_s'].items() if value is not None)))
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        """Stops serving"""
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,140 @@
+"""
+{This module opens the process pool that evaluates the likelihood of the
+ samplers (or the posterior predictive draws) on one of three backends:
+ local multiprocessing, MPI across nodes (mpi4py) or a dask cluster. All pools
+ only expose map(func, iterable), which is all emcee needs}
+"""
+
+# Built-in/Generic Imports
+from contextlib import contextmanager
+from multiprocessing import Pool
+
+__author__ = '{Mehnaaz Asad}'
+
+BACKENDS = ('multiprocessing', 'mpi', 'dask')
+
+
+def add_pool_args(parser):
+    """Adds backend selection arguments to an argument parser"""
+    parser.add_argument('--pool', type=str, default='multiprocessing',
+        choices=BACKENDS, help='Parallel backend. mpi needs the script to be '
+        'started with mpirun -n N, dask starts a local cluster of nproc '
+        'workers unless --dask_address is given')
+    parser.add_argument('--dask_address', type=str, default=None,
+        help='Address of a running dask scheduler')
+
+def check_backend(backend):
+    """Raises ValueError for unknown backends"""
+    if backend not in BACKENDS:
+        msg = '`backend` ({0}) not supported! Options: {1}'.format(backend,
+            '/'.join(BACKENDS))
+        raise ValueError(msg)
+
+def is_master(backend):
+    """
+    True in the process that drives the run: rank 0 under MPI and the only
+    process otherwise
+    """
+    check_backend(backend)
+    if backend != 'mpi':
+        return True
+    from mpi4py import MPI
+    return MPI.COMM_WORLD.Get_rank() == 0
+
+def broadcast(backend, value):
+    """
+    Value of the master on every MPI rank, also a barrier. Returns value
+    unchanged for other backends.
+    """
+    check_backend(backend)
+    if backend != 'mpi':
+        return value
+    from mpi4py import MPI
+    return MPI.COMM_WORLD.bcast(value, root=0)
+
+
+class ExecutorPool(object):
+    """
+    Pool interface over a concurrent.futures style MPI executor
+    """
+    def __init__(self, executor):
+        self.executor = executor
+
+    def map(self, func, iterable):
+        return list(self.executor.map(func, iterable))
+
+
+class DaskPool(object):
+    """
+    Pool interface over a dask distributed client
+    """
+    def __init__(self, client):
+        self.client = client
+
+    def map(self, func, iterable):
+        futures = self.client.map(func, list(iterable), pure=False)
+        return self.client.gather(futures)
+
+
+@contextmanager
+def open_pool(backend, nproc, initializer=None, initargs=(), address=None):
+    """
+    Opens a pool on the chosen backend
+
+    Parameters
+    ----------
+    backend: string
+        One of BACKENDS
+
+    nproc: int
+        Number of local processes (multiprocessing) or local dask workers.
+        Ignored under MPI where the number of ranks is set by mpirun.
+
+    initializer: callable, optional
+        Called with initargs once in every dask worker. Dask workers do not
+        start from the state of the parent process the way forked and MPI
+        workers do, so module level state used by the mapped function has
+        to be rebuilt there. Must be importable by the workers.
+
+    initargs: tuple, optional
+        Arguments of initializer
+
+    address: string, optional
+        Address of a running dask scheduler. A local cluster of nproc
+        workers is started if None.
+
+    Yields
+    ---------
+    pool: object or None
+        Object with a map(func, iterable) method. None on MPI worker ranks,
+        which have already served the master until it closed the pool.
+    """
+    check_backend(backend)
+    if backend == 'multiprocessing':
+        with Pool(processes=nproc) as pool:
+            yield pool
+
+    elif backend == 'mpi':
+        from mpi4py import MPI
+        from mpi4py.futures import MPICommExecutor
+        # Workers block in here serving tasks until the master leaves
+        with MPICommExecutor(MPI.COMM_WORLD, root=0) as executor:
+            yield None if executor is None else ExecutorPool(executor)
+
+    elif backend == 'dask':
+        from dask.distributed import Client, LocalCluster
+        if address is None:
+            cluster = LocalCluster(n_workers=nproc, threads_per_worker=1,
+                processes=True)
+            client = Client(cluster)
+        else:
+            cluster = None
+            client = Client(address)
+        try:
+            if initializer is not None:
+                client.run(initializer, *initargs)
+            yield DaskPool(client)
+        finally:
+            client.close()
+            if cluster is not None:
+                cluster.close()
@@ -0,0 +1,173 @@
+"""
+{This module caches everything the MCMC needs before its first step (data
+ mass function, errors and inverse correlation matrix from mocks, and the
+ halo catalog arrays) so that restarted runs skip reading the survey catalog,
+ every mock and the halotools cache}
+"""
+
+# Built-in/Generic Imports
+import json
+import os
+
+# Libs
+import numpy as np
+
+from src.data.mock_suite import discover_mocks
+
+__author__ = '{Mehnaaz Asad}'
+
+HALOCAT_ATTRS = ('Lbox', 'particle_mass', 'redshift')
+
+
+def prepared_run_meta(survey_def, mf_type, catl_file, halo_catalog,
+    path_to_mocks):
+    """
+    Builds the metadata a prepared run is keyed on
+
+    Parameters
+    ----------
+    survey_def: SurveyDefinition
+        Survey definition used to select data and mocks
+
+    mf_type: string
+        Mass function type (smf/bmf)
+
+    catl_file: string
+        Path to survey catalog file
+
+    halo_catalog: string
+        Path to halo catalog
+
+    path_to_mocks: string
+        Path to mock catalogs
+
+    Returns
+    ---------
+    meta: dict
+        JSON serializable description of the inputs of the run, including
+        the size and modification time of every mock so that errors are
+        rebuilt when mocks are regenerated, added or removed
+    """
+    meta = {
+        'survey_def': repr(survey_def),
+        'mf_type': mf_type,
+        'catl_file': os.path.abspath(catl_file),
+        'catl_mtime': _mtime(catl_file),
+        'halo_catalog': os.path.abspath(halo_catalog),
+        'halo_catalog_mtime': _mtime(halo_catalog),
+        'path_to_mocks': os.path.abspath(path_to_mocks),
+        'mocks': _mock_listing(path_to_mocks, survey_def),
+    }
+    return meta
+
+def _mock_listing(path_to_mocks, survey_def):
+    """Relative path, size and modification time of every mock"""
+    try:
+        mocks = discover_mocks(path_to_mocks, survey_def)
+    except ValueError:
+        return []
+    return [[os.path.relpath(filename, path_to_mocks),
+        os.path.getsize(filename), os.path.getmtime(filename)] for _, _,
+        filename in mocks]
+
+def _mtime(filename):
+    """Modification time of file or None if it does not exist"""
+    if os.path.exists(filename):
+        return os.path.getmtime(filename)
+    return None
+
+def halo_arrays_from_catalog(halocat):
+    """
+    Extracts halo table columns and box properties from a halo catalog
+
+    Parameters
+    ----------
+    halocat: halotools halo catalog instance
+        Catalog returned by CachedHaloCatalog
+
+    Returns
+    ---------
+    halo_arrays: dict
+        Keyword arguments accepted by UserSuppliedHaloCatalog
+    """
+    halo_table = halocat.halo_table
+    halo_arrays = {key: np.asarray(halo_table[key]) for key in
+        halo_table.colnames}
+    for attr in HALOCAT_ATTRS:
+        halo_arrays[attr] = np.asarray(getattr(halocat, attr))
+    return halo_arrays
+
+def save_prepared_run(filename, meta, data_arrays, halo_arrays):
+    """
+    Atomically writes prepared run to a .npz file
+
+    Parameters
+    ----------
+    filename: string
+        Path to prepared run file
+
+    meta: dict
+        Metadata returned by prepared_run_meta
+
+    data_arrays: dict
+        Data vector, errors, inverse correlation matrix and z_median
+
+    halo_arrays: dict
+        Halo catalog arrays returned by halo_arrays_from_catalog
+
+    Returns
+    ---------
+    Nothing; prepared run written to file
+    """
+    arrays = {'meta': np.array(json.dumps(meta, sort_keys=True))}
+    for key, value in data_arrays.items():
+        arrays['data_' + key] = np.asarray(value)
+    for key, value in halo_arrays.items():
+        arrays['halo_' + key] = np.asarray(value)
+
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as outfile:
+        np.savez(outfile, **arrays)
+    os.replace(tmp_filename, filename)
+
+def load_prepared_run(filename, meta):
+    """
+    Reads prepared run from file if it was built from the same inputs
+
+    Parameters
+    ----------
+    filename: string
+        Path to prepared run file
+
+    meta: dict
+        Metadata returned by prepared_run_meta for the current run
+
+    Returns
+    ---------
+    data_arrays: dict or None
+        Data vector, errors, inverse correlation matrix and z_median. None if
+        file does not exist or was built from different inputs.
+
+    halo_arrays: dict or None
+        Halo catalog arrays
+    """
+    if not os.path.exists(filename):
+        return None, None
+
+    with np.load(filename, allow_pickle=False) as prepared:
+        saved_meta = json.loads(str(prepared['meta']))
+        if saved_meta != json.loads(json.dumps(meta, sort_keys=True)):
+            print('Prepared run {0} is stale, rebuilding'.format(filename))
+            return None, None
+        data_arrays = {}
+        halo_arrays = {}
+        for key in prepared.files:
+            if key.startswith('data_'):
+                data_arrays[key[len('data_'):]] = prepared[key]
+            elif key.startswith('halo_'):
+                halo_arrays[key[len('halo_'):]] = prepared[key]
+
+    for attr in HALOCAT_ATTRS:
+        if halo_arrays[attr].ndim == 0:
+            halo_arrays[attr] = halo_arrays[attr].item()
+    return data_arrays, halo_arrays
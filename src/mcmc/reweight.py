@@ -0,0 +1,125 @@
+"""
+{This module turns a sample drawn from one posterior into a weighted sample
+ of another by importance sampling, and measures how many independent
+ samples the weights leave. With model vectors stored for every sample, a
+ chain is reweighted to new data or a new covariance with one matrix product}
+"""
+
+# Libs
+import numpy as np
+
+__author__ = '{Mehnaaz Asad}'
+
+
+def importance_weights(lnp_new, lnp_old):
+    """
+    Normalized importance weights of samples drawn from the old posterior
+
+    Parameters
+    ----------
+    lnp_new: array
+        Log posterior of each sample under the target posterior. Samples
+        with -inf or NaN get zero weight.
+
+    lnp_old: array
+        Log posterior of each sample under the posterior it was drawn from
+
+    Returns
+    ---------
+    weights: array
+        Weights summing to 1. All zero if no sample has a finite weight.
+    """
+    log_weights = np.asarray(lnp_new, dtype=float) - \
+        np.asarray(lnp_old, dtype=float)
+    finite = np.isfinite(log_weights)
+    weights = np.zeros(len(log_weights))
+    if not np.any(finite):
+        return weights
+    # Shift by the largest log weight so exp cannot overflow
+    weights[finite] = np.exp(log_weights[finite] - log_weights[finite].max())
+    weights /= weights.sum()
+    return weights
+
+def effective_sample_size(weights):
+    """
+    Kish effective sample size (sum w)^2 / sum w^2 of weighted samples
+
+    Parameters
+    ----------
+    weights: array
+        Importance weights, normalized or not
+
+    Returns
+    ---------
+    ess: float
+        Effective number of samples, 0 if all weights are zero
+    """
+    weights = np.asarray(weights, dtype=float)
+    sum_sq = np.sum(weights**2)
+    if sum_sq == 0:
+        return 0.
+    return float(np.sum(weights)**2 / sum_sq)
+
+def batched_chi2(model_arr, data, err_data, inv_corr_mat=None):
+    """
+    Chi-squared of many model vectors against one data vector in a single
+    matrix operation
+
+    Parameters
+    ----------
+    model_arr: array
+        Array of shape (number of samples, number of bins) of model vectors.
+        Rows with non-finite values get infinite chi-squared.
+
+    data: array
+        Data vector
+
+    err_data: array
+        Error of each element of data vector
+
+    inv_corr_mat: array, optional
+        Inverse of correlation matrix. Uncorrelated errors if None.
+
+    Returns
+    ---------
+    chi2: array
+        Chi-squared of each model vector
+    """
+    model_arr = np.atleast_2d(model_arr)
+    resid = (np.asarray(data) - model_arr) / np.asarray(err_data)
+    valid = np.all(np.isfinite(resid), axis=1)
+    chi2 = np.full(len(model_arr), np.inf)
+    if inv_corr_mat is None:
+        chi2[valid] = np.sum(resid[valid]**2, axis=1)
+    else:
+        chi2[valid] = np.sum(np.dot(resid[valid], inv_corr_mat) *
+            resid[valid], axis=1)
+    return chi2
+
+def reweight_chi2(chi2_old, chi2_new):
+    """
+    Importance weights and effective sample size of a chain sampled with
+    chi2_old under a likelihood with chi2_new
+
+    Parameters
+    ----------
+    chi2_old: array
+        Chi-squared of each sample used by the sampler. Non-finite values
+        (rejected or failed samples) get zero weight.
+
+    chi2_new: array
+        Chi-squared of each sample under the new data or covariance
+
+    Returns
+    ---------
+    weights: array
+        Normalized importance weights
+
+    ess: float
+        Effective sample size
+    """
+    chi2_old = np.asarray(chi2_old, dtype=float)
+    lnp_old = np.where(np.isfinite(chi2_old), -0.5 * chi2_old, np.nan)
+    weights = importance_weights(-0.5 * np.asarray(chi2_new, dtype=float),
+        lnp_old)
+    return weights, effective_sample_size(weights)
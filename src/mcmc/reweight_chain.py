@@ -0,0 +1,147 @@
+"""
+{This script reweights a finished chain to a new data vector or error model
+ (e.g. jackknife instead of mock errors) using the model mass functions the
+ sampler stored as blobs, and reports whether the weighted chain has enough
+ effective samples or a new run is needed}
+"""
+
+# Built-in/Generic Imports
+import argparse
+import sys
+
+# Libs
+import numpy as np
+
+from src.mcmc.blobs import read_blobs
+from src.mcmc.reweight import batched_chi2, reweight_chi2
+
+__author__ = '{Mehnaaz Asad}'
+
+
+def read_target(filename):
+    """
+    Reads the data vector, errors and inverse correlation matrix to reweight
+    to
+
+    Parameters
+    ----------
+    filename: string
+        Path to .npz file with phi, err and optionally inv_corr_mat arrays,
+        or a prepared run written by mcmc.py (keys prefixed with 'data_')
+
+    Returns
+    ---------
+    phi: array
+        Data mass function
+
+    err: array
+        Error per bin
+
+    inv_corr_mat: array or None
+        Inverse of correlation matrix. None for uncorrelated errors.
+    """
+    with np.load(filename, allow_pickle=False) as target:
+        prefix = 'data_' if 'data_phi' in target.files else ''
+        phi = target[prefix + 'phi']
+        err = target[prefix + 'err']
+        inv_corr_mat = None
+        if prefix + 'inv_corr_mat' in target.files:
+            inv_corr_mat = target[prefix + 'inv_corr_mat']
+    return phi, err, inv_corr_mat
+
+def reweight_blobs(blob_file, chi2_file, target_file, burn_frac=0.5):
+    """
+    Importance weights of the chain under the target data and errors
+
+    Parameters
+    ----------
+    blob_file: string
+        Path to blob file written by mcmc.py --blobs
+
+    chi2_file: string
+        Path to chi-squared file of the same run
+
+    target_file: string
+        Path to target data, see read_target
+
+    burn_frac: float, optional
+        Fraction of steps discarded from the start of the chain
+
+    Returns
+    ---------
+    weights: array
+        Array of shape (number of steps kept, nwalkers) of normalized weights
+
+    chi2_new: array
+        Chi-squared under the target, same shape as weights
+
+    ess: float
+        Effective sample size of the weighted chain
+    """
+    phi_model = read_blobs(blob_file)['phi']
+    num_steps, nwalkers, num_bins = phi_model.shape
+    chi2_old = np.loadtxt(chi2_file, ndmin=1)[:num_steps * nwalkers].\
+        reshape(num_steps, nwalkers)
+    first_step = int(burn_frac * num_steps)
+    phi_model = phi_model[first_step:].reshape(-1, num_bins)
+    chi2_old = chi2_old[first_step:].ravel()
+
+    phi, err, inv_corr_mat = read_target(target_file)
+    chi2_new = batched_chi2(phi_model, phi, err, inv_corr_mat)
+    weights, ess = reweight_chi2(chi2_old, chi2_new)
+    return weights.reshape(-1, nwalkers), chi2_new.reshape(-1, nwalkers), ess
+
+def args_parser():
+    """
+    Parsing arguments passed to script
+
+    Returns
+    -------
+    args:
+        Input arguments to the script
+    """
+    print('Parsing in progress')
+    parser = argparse.ArgumentParser()
+    parser.add_argument('blob_file', type=str,
+        help='Blob file of the chain (mcmc.py --blobs)')
+    parser.add_argument('chi2_file', type=str,
+        help='Chi-squared file of the chain')
+    parser.add_argument('target_file', type=str,
+        help='.npz with phi, err and inv_corr_mat, or a prepared run')
+    parser.add_argument('--burn', type=float, default=0.5,
+        help='Fraction of steps discarded as burn-in')
+    parser.add_argument('--min_ess', type=float, default=1000,
+        help='Smallest effective sample size accepted without a new run')
+    parser.add_argument('--out', type=str, default=None,
+        help='Path to .npz of weights and new chi-squared values')
+    args = parser.parse_args()
+    return args
+
+def main(args):
+    """
+    Main function that calls all other functions
+
+    Parameters
+    ----------
+    args:
+        Input arguments to the script
+
+    """
+    weights, chi2_new, ess = reweight_blobs(args.blob_file, args.chi2_file,
+        args.target_file, args.burn)
+    num_samples = np.count_nonzero(np.isfinite(chi2_new))
+    print('Effective sample size {0:.1f} of {1} samples ({2:.1%})'.format(
+        ess, num_samples, ess / max(num_samples, 1)))
+    if args.out is not None:
+        np.savez(args.out, weights=weights, chi2=chi2_new, ess=ess)
+        print('Weights written to {0}'.format(args.out))
+    if ess < args.min_ess:
+        print('Effective sample size below {0:.0f}, run mcmc.py with the new '
+            'data or errors instead'.format(args.min_ess))
+        return 1
+    return 0
+
+# Main function
+if __name__ == '__main__':
+    args = args_parser()
+    sys.exit(main(args))
@@ -13,8 +13,14 @@ from halotools.empirical_models import PrebuiltSubhaloModelFactory
 from cosmo_utils.utils.stats_funcs import Stats_one_arr
 from halotools.sim_manager import CachedHaloCatalog
 from cosmo_utils.utils import work_paths as cwpaths
+from src.data.surveys import get_survey, mock_mask, measure_mf
+from src.data.binned_stats import binned_stats, binned_stats_batch, STATS
+from src.mcmc.draw_plots import plot_draws, stack_draws, set_text_mode, \
+    tex_label, DRAW_MODES, TEXT_MODES
+from src.mcmc.blobs import SMHM_BINS, read_blobs, posterior_draws, \
+    expand_summary, blob_fname
+from src.mcmc.pools import add_pool_args, open_pool, is_master
 from collections import OrderedDict
-from multiprocessing import Pool
 import matplotlib.pyplot as plt
 from matplotlib import rc
 import pandas as pd
@@ -28,8 +34,11 @@ import os
 __author__ = '{Mehnaaz Asad}'
 
 rc('font', **{'family': 'sans-serif', 'sans-serif': ['Helvetica']}, size=20)
-rc('text', usetex=True)
-rc('text.latex', preamble=[r"\usepackage{amsmath}"])
+set_text_mode('latex')
+# Posterior draws as one collection of lines or as percentile bands
+draw_mode = 'lines'
+# Model predictions of posterior draws stored with the chain or populated
+POSTERIOR_SOURCES = ('blobs', 'populate')
 
 def read_chi2(path_to_file):
     """
@@ -336,27 +345,8 @@ def diff_smf(mstar_arr, volume, h1_bool):
         logmstar_arr = np.log10((10**mstar_arr) / 2.041)
     else:
         logmstar_arr = np.log10(mstar_arr)
-    if survey == 'eco' or survey == 'resolvea':
-        bin_min = np.round(np.log10((10**8.9) / 2.041), 1)
-        if survey == 'eco':
-            bin_max = np.round(np.log10((10**11.8) / 2.041), 1)
-        elif survey == 'resolvea':
-            # different to avoid nan in inverse corr mat
-            bin_max = np.round(np.log10((10**11.5) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)
-    elif survey == 'resolveb':
-        bin_min = np.round(np.log10((10**8.7) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.8) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7) 
-    # Unnormalized histogram and bin edges
-    counts, edg = np.histogram(logmstar_arr, bins=bins)  # paper used 17 bins
-    dm = edg[1] - edg[0]  # Bin width
-    maxis = 0.5 * (edg[1:] + edg[:-1])  # Mass axis i.e. bin centers
-    # Normalized to volume and bin width
-    err_poiss = np.sqrt(counts) / (volume * dm)
-    err_tot = err_poiss
-
-    phi = counts / (volume * dm)  # not a log quantity
+    bins = get_survey(survey).bins('smf')
+    maxis, phi, err_tot, counts = measure_mf(logmstar_arr, volume, bins)
     phi = np.log10(phi)
 
     return maxis, phi, err_tot, bins, counts
@@ -400,26 +390,8 @@ def diff_bmf(mass_arr, volume, h1_bool):
     else:
         logmbary_arr = np.log10(mass_arr)
         # print(logmbary_arr.min(), logmbary_arr.max())
-    if survey == 'eco' or survey == 'resolvea':
-        bin_min = np.round(np.log10((10**9.4) / 2.041), 1)
-        if survey == 'eco':
-            bin_max = np.round(np.log10((10**11.8) / 2.041), 1)
-        elif survey == 'resolvea':
-            bin_max = np.round(np.log10((10**11.5) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)
-    elif survey == 'resolveb':
-        bin_min = np.round(np.log10((10**9.1) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.5) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)
-    # Unnormalized histogram and bin edges
-    counts, edg = np.histogram(logmbary_arr, bins=bins)  # paper used 17 bins
-    dm = edg[1] - edg[0]  # Bin width
-    maxis = 0.5 * (edg[1:] + edg[:-1])  # Mass axis i.e. bin centers
-    # Normalized to volume and bin width
-    err_poiss = np.sqrt(counts) / (volume * dm)
-    err_tot = err_poiss
-
-    phi = counts / (volume * dm)  # not a log quantity
+    bins = get_survey(survey).bins('bmf')
+    maxis, phi, err_tot, counts = measure_mf(logmbary_arr, volume, bins)
     phi = np.log10(phi)
 
     return maxis, phi, err_tot, bins, counts
@@ -558,16 +530,7 @@ def populate_mock(theta):
 
     model_init.mock.populate()
 
-    if survey == 'eco' or survey == 'resolvea':
-        if mf_type == 'smf':
-            limit = np.round(np.log10((10**8.9) / 2.041), 1)
-        elif mf_type == 'bmf':
-            limit = np.round(np.log10((10**9.4) / 2.041), 1)
-    elif survey == 'resolveb':
-        if mf_type == 'smf':
-            limit = np.round(np.log10((10**8.7) / 2.041), 1)
-        elif mf_type == 'bmf':
-            limit = np.round(np.log10((10**9.1) / 2.041), 1)
+    limit = get_survey(survey).model_limit(mf_type)
     sample_mask = model_init.mock.galaxy_table['stellar_mass'] >= 10**limit
     gals = model_init.mock.galaxy_table[sample_mask]
     gals_df = gals.to_pandas()
@@ -594,11 +557,9 @@ def mp_func(a_list):
     err_tot_model_arr: array
         Array of error values per bin
 
-    cen_gals_arr: array
-        Array of central galaxy masses
-
-    cen_halos_arr: array
-        Array of central halo masses
+    smhm_stats_arr: array
+        Array of shape (number of draws, len(STATS), number of bins) of
+        binned SMHM statistics on SMHM_BINS
     """
     v_sim = 130**3
 
@@ -625,7 +586,11 @@ def mp_func(a_list):
         cen_gals_arr.append(cen_gals)
         cen_halos_arr.append(cen_halos)
 
-    return [maxis_arr, phi_arr, err_tot_arr, cen_gals_arr, cen_halos_arr]
+    # Raw centrals stay in the worker, only the binned relation is returned
+    smhm_stats_arr = binned_stats_batch(cen_halos_arr, cen_gals_arr,
+        SMHM_BINS)
+
+    return [maxis_arr, phi_arr, err_tot_arr, smhm_stats_arr]
 
 def mp_init(mcmc_table_pctl,nproc):
     """
@@ -637,24 +602,58 @@ def mp_init(mcmc_table_pctl,nproc):
         Mcmc chain dataframe of 1000 random samples
 
     nproc: int
-        Number of processes to use in multiprocessing
+        Number of processes (multiprocessing) or local dask workers
 
     Returns
     ---------
     result: multidimensional array
-        Array of smf and smhm data
+        Array of smf and smhm data. None on MPI worker ranks.
     """
     start = time.time()
     chunks = np.array([mcmc_table_pctl.iloc[:,:5].values[i::5] \
         for i in range(5)])
-    pool = Pool(processes=nproc)
-    result = pool.map(mp_func, chunks)
+    with open_pool(pool_backend, nproc, address=dask_address) as pool:
+        if pool is None:
+            # MPI worker rank, the master holds the result
+            return None
+        result = pool.map(mp_func, chunks)
     end = time.time()
     multi_time = end - start
     print("Multiprocessing took {0:.1f} seconds".format(multi_time))
 
     return result
 
+def blob_init(blob_file, maxis_bf, num_chunks=5):
+    """
+    SMF and SMHM of posterior draws from model predictions stored by the
+    sampler, without populating mocks
+
+    Parameters
+    ----------
+    blob_file: string
+        Path to blob file written by mcmc.py --blobs, see blob_fname
+
+    maxis_bf: array
+        Array of x-axis mass values shared by all draws
+
+    num_chunks: int, optional
+        Number of chunks of draws, as returned by mp_init
+
+    Returns
+    ---------
+    result: multidimensional array
+        Array of smf and smhm data in the layout of mp_init
+    """
+    # Draws are ranked by the chi^2 stored with each record, which is in the
+    # step-major order of the blob file
+    draws = posterior_draws(read_blobs(blob_file))
+    smhm_stats_arr = expand_summary(draws['smhm'])
+    result = []
+    for idx in np.array_split(np.arange(len(draws['phi'])), num_chunks):
+        result.append([[maxis_bf] * len(idx), list(draws['phi'][idx]),
+            [None] * len(idx), smhm_stats_arr[idx]])
+    return result
+
 def get_best_fit_model(best_fit_params):
     """
     Get SMF and SMHM information of best fit model given a survey
@@ -828,7 +827,7 @@ def jackknife(catl, volume):
 
 def get_xmhm_mocks(survey, path, mf_type):
     """
-    Calculate error in data SMF from mocks
+    Calculate SMHM (or BMHM) statistics of survey mocks
 
     Parameters
     ----------
@@ -839,39 +838,19 @@ def get_xmhm_mocks(survey, path, mf_type):
 
     Returns
     ---------
-    err_total: array
-        Standard deviation of phi values between samples of 8 mocks
+    xmhm_stats_arr: array
+        Array of shape (number of mocks, len(STATS), number of bins) of
+        binned statistics on SMHM_BINS
     """
 
-    if survey == 'eco':
-        mock_name = 'ECO'
-        num_mocks = 8
-        min_cz = 3000
-        max_cz = 7000
-        mag_limit = -17.33
-        mstar_limit = 8.9
-        volume = 151829.26 # Survey volume without buffer [Mpc/h]^3
-    elif survey == 'resolvea':
-        mock_name = 'A'
-        num_mocks = 59
-        min_cz = 4500
-        max_cz = 7000
-        mag_limit = -17.33
-        mstar_limit = 8.9
-        volume = 13172.384  # Survey volume without buffer [Mpc/h]^3 
-    elif survey == 'resolveb':
-        mock_name = 'B'
-        num_mocks = 104
-        min_cz = 4500
-        max_cz = 7000
-        mag_limit = -17
-        mstar_limit = 8.7
-        volume = 4709.8373  # Survey volume without buffer [Mpc/h]^3
-
-
-    x_arr = []
-    y_arr = []
-    y_std_err_arr = []
+    survey_def = get_survey(survey)
+    mock_name = survey_def.mock_name
+    num_mocks = survey_def.num_mocks
+    volume = survey_def.volume # Survey volume without buffer [Mpc/h]^3
+
+
+    cen_gals_arr = []
+    cen_halos_arr = []
     for num in range(num_mocks):
         filename = path + '{0}_cat_{1}_Planck_memb_cat.hdf5'.format(
             mock_name, num)
@@ -880,52 +859,33 @@ def get_xmhm_mocks(survey, path, mf_type):
         # Using the same survey definition as in mcmc smf i.e excluding the 
         # buffer
         if mf_type == 'smf':
-            mock_pd = mock_pd.loc[(mock_pd.cz.values >= min_cz) & \
-                (mock_pd.cz.values <= max_cz) & \
-                (mock_pd.M_r.values <= mag_limit) & \
-                (mock_pd.logmstar.values >= mstar_limit)]
+            mock_pd = mock_pd.loc[mock_mask(mock_pd, survey_def, 'smf')]
             cen_gals = np.log10(10**(mock_pd.logmstar.loc
                 [mock_pd.cs_flag == 1])/2.041)
             cen_halos = mock_pd.M_group.loc[mock_pd.cs_flag == 1]
 
-            x,y,y_std,y_std_err = Stats_one_arr(cen_halos, cen_gals, base=0.4,
-                bin_statval='center')
-
         elif mf_type == 'bmf':
-            mock_pd = mock_pd.loc[(mock_pd.cz.values >= min_cz) & \
-                (mock_pd.cz.values <= max_cz) & \
-                (mock_pd.M_r.values <= mag_limit)]
+            mock_pd = mock_pd.loc[mock_mask(mock_pd, survey_def, 'bmf')]
             cen_gals_stellar = np.log10(10**(mock_pd.logmstar.loc
                 [mock_pd.cs_flag == 1])/2.041)
             cen_gals_gas = mock_pd.mhi.loc[mock_pd.cs_flag == 1]
             cen_gals_gas = np.log10((1.4 * cen_gals_gas)/2.041)
             cen_gals_bary = calc_bary(cen_gals_stellar, cen_gals_gas)
             mock_pd['cen_gals_bary'] = cen_gals_bary
-            if survey == 'eco' or survey == 'resolvea':
-                limit = np.log10((10**9.4) / 2.041)
-                cen_gals_bary = mock_pd.cen_gals_bary.loc\
-                    [mock_pd.cen_gals_bary >= limit]
-                cen_halos = mock_pd.M_group.loc[(mock_pd.cs_flag == 1) & 
-                    (mock_pd.cen_gals_bary >= limit)]
-            elif survey == 'resolveb':
-                limit = np.log10((10**9.1) / 2.041)
-                cen_gals_bary = mock_pd.cen_gals_bary.loc\
-                    [mock_pd.cen_gals_bary >= limit]
-                cen_halos = mock_pd.M_group.loc[(mock_pd.cs_flag == 1) & 
-                    (mock_pd.cen_gals_bary >= limit)]
-
-            x,y,y_std,y_std_err = Stats_one_arr(cen_halos, cen_gals_bary, 
-                base=0.4, bin_statval='center')        
-
-        x_arr.append(x)
-        y_arr.append(y)
-        y_std_err_arr.append(y_std_err)
-
-    x_arr = np.array(x_arr)
-    y_arr = np.array(y_arr)
-    y_std_err_arr = np.array(y_std_err_arr)
-
-    return [x_arr, y_arr, y_std_err_arr]
+            limit = np.log10((10**survey_def.mbary_limit) / 2.041)
+            cen_gals_bary = mock_pd.cen_gals_bary.loc\
+                [mock_pd.cen_gals_bary >= limit]
+            cen_halos = mock_pd.M_group.loc[(mock_pd.cs_flag == 1) &
+                (mock_pd.cen_gals_bary >= limit)]
+            cen_gals = cen_gals_bary
+
+        cen_gals_arr.append(cen_gals.values)
+        cen_halos_arr.append(cen_halos.values)
+
+    xmhm_stats_arr = binned_stats_batch(cen_halos_arr, cen_gals_arr,
+        SMHM_BINS)
+
+    return xmhm_stats_arr
 
 def plot_mf(result, max_model_bf, phi_model_bf, err_tot_model_bf, maxis_data, 
     phi_data, err_data, bf_chi2):
@@ -982,21 +942,9 @@ def plot_mf(result, max_model_bf, phi_model_bf, err_tot_model_bf, maxis_data,
     plt.errorbar(maxis_data,phi_data,yerr=asymmetric_err,color='k',fmt='s',
         ecolor='k',markersize=5,capsize=5,capthick=0.5,
         label='data',zorder=10)
-    for idx in range(len(result[0][0])):
-        plt.plot(result[0][0][idx],result[0][1][idx],color='lightgray',
-            linestyle='-',alpha=0.5,zorder=0,label='model')
-    for idx in range(len(result[1][0])):
-        plt.plot(result[1][0][idx],result[1][1][idx],color='lightgray',
-            linestyle='-',alpha=0.5,zorder=1)
-    for idx in range(len(result[2][0])):
-        plt.plot(result[2][0][idx],result[2][1][idx],color='lightgray',
-            linestyle='-',alpha=0.5,zorder=2)
-    for idx in range(len(result[3][0])):
-        plt.plot(result[3][0][idx],result[3][1][idx],color='lightgray',
-            linestyle='-',alpha=0.5,zorder=3)
-    for idx in range(len(result[4][0])):
-        plt.plot(result[4][0][idx],result[4][1][idx],color='lightgray',
-            linestyle='-',alpha=0.5,zorder=4)
+    maxis_arr, phi_arr = stack_draws(result, 0, 1)
+    plot_draws(plt.gca(), maxis_arr, phi_arr, 'lightgray', draw_mode,
+        label='model')
     lower_err = np.log10((10**phi_model_bf) - err_tot_model_bf)
     upper_err = np.log10((10**phi_model_bf) + err_tot_model_bf)
     lower_err = phi_model_bf - lower_err
@@ -1008,14 +956,14 @@ def plot_mf(result, max_model_bf, phi_model_bf, err_tot_model_bf, maxis_data,
         capsize=5,capthick=0.5,label='best fit',zorder=10)
     plt.ylim(-4,-1)
     if mf_type == 'smf':
-        plt.xlabel(r'\boldmath$\log_{10}\ M_\star \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$', fontsize=20)
+        plt.xlabel(tex_label(r'\boldmath$\log_{10}\ M_\star \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'), fontsize=20)
     elif mf_type == 'bmf':
-        plt.xlabel(r'\boldmath$\log_{10}\ M_{b} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$', fontsize=20)
-    plt.ylabel(r'\boldmath$\Phi \left[\mathrm{dex}^{-1}\,\mathrm{Mpc}^{-3}\,\mathrm{h}^{3} \right]$', fontsize=20)
+        plt.xlabel(tex_label(r'\boldmath$\log_{10}\ M_{b} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'), fontsize=20)
+    plt.ylabel(tex_label(r'\boldmath$\Phi \left[\mathrm{dex}^{-1}\,\mathrm{Mpc}^{-3}\,\mathrm{h}^{3} \right]$'), fontsize=20)
     handles, labels = plt.gca().get_legend_handles_labels()
     by_label = OrderedDict(zip(labels, handles))
     plt.legend(by_label.values(), by_label.keys(), loc='best',prop={'size': 20})
-    plt.annotate(r'$\boldsymbol\chi ^2 \approx$ {0}'.format(np.round(bf_chi2,2)), 
+    plt.annotate(tex_label(r'$\boldsymbol\chi ^2 \approx$ {0}').format(np.round(bf_chi2,2)),
         xy=(0.1, 0.1), xycoords='axes fraction', bbox=dict(boxstyle="square", 
         ec='k', fc='lightgray', alpha=0.5), size=15)
     if mf_type == 'smf':
@@ -1032,7 +980,7 @@ def plot_xmhm(result, gals_bf, halos_bf, gals_data, halos_data, gals_b10, \
     Parameters
     ----------
     result: multidimensional array
-        Array of central galaxy and halo masses
+        Array of SMF and binned SMHM information from mp_init
     
     gals_bf: array
         Array of y-axis stellar mass values for best fit SMHM
@@ -1063,63 +1011,36 @@ def plot_xmhm(result, gals_bf, halos_bf, gals_data, halos_data, gals_b10, \
     elif survey == 'eco':
         line_label = 'ECO'
     
-    x_bf,y_bf,y_std_bf,y_std_err_bf = Stats_one_arr(halos_bf,\
-    gals_bf,base=0.4,bin_statval='center')
-    x_b10,y_b10,y_std_b10,y_std_err_b10 = Stats_one_arr(halos_b10,\
-        gals_b10,base=0.4,bin_statval='center')
-    x_data,y_data,y_std_data,y_std_err_data = Stats_one_arr(halos_data,\
-        gals_data,base=0.4,bin_statval='center')
+    x_smhm = 0.5 * (SMHM_BINS[1:] + SMHM_BINS[:-1])
+    y_bf = binned_stats(halos_bf, gals_bf, SMHM_BINS)[STATS.index('mean')]
+    y_b10 = binned_stats(halos_b10, gals_b10, SMHM_BINS)[STATS.index('mean')]
+    y_data = binned_stats(halos_data, gals_data, SMHM_BINS)[
+        STATS.index('mean')]
     # y_std_err_data = err_data
 
     fig1 = plt.figure(figsize=(10,10))
     # NOT PLOTTING DATA RELATION
-    # plt.errorbar(x_data,y_data,yerr=y_std_err_data,color='k',fmt='-s',\
+    # plt.errorbar(x_smhm,y_data,yerr=y_std_err_data,color='k',fmt='-s',\
     #     ecolor='k',markersize=4,capsize=5,capthick=0.5,\
     #         label='{0}'.format(line_label),zorder=10)
 
-    plt.errorbar(x_b10,y_b10, color='k',fmt='--s',\
+    plt.errorbar(x_smhm,y_b10, color='k',fmt='--s',\
         markersize=3, label='Behroozi10', zorder=10, alpha=0.7)
 
-    for idx in range(len(result[0][0])):
-        x_model,y_model,y_std_model,y_std_err_model = \
-            Stats_one_arr(result[0][4][idx],result[0][3][idx],base=0.4,\
-                bin_statval='center')
-        plt.plot(x_model,y_model,color='lightgray',linestyle='-',alpha=0.5,\
-            zorder=0,label='model')
-    for idx in range(len(result[1][0])):
-        x_model,y_model,y_std_model,y_std_err_model = \
-            Stats_one_arr(result[1][4][idx],result[1][3][idx],base=0.4,\
-                bin_statval='center')
-        plt.plot(x_model,y_model,color='lightgray',linestyle='-',alpha=0.5,\
-            zorder=1)
-    for idx in range(len(result[2][0])):
-        x_model,y_model,y_std_model,y_std_err_model = \
-            Stats_one_arr(result[2][4][idx],result[2][3][idx],base=0.4,\
-                bin_statval='center')
-        plt.plot(x_model,y_model,color='lightgray',linestyle='-',alpha=0.5,\
-            zorder=2)
-    for idx in range(len(result[3][0])):
-        x_model,y_model,y_std_model,y_std_err_model = \
-            Stats_one_arr(result[3][4][idx],result[3][3][idx],base=0.4,\
-                bin_statval='center')
-        plt.plot(x_model,y_model,color='lightgray',linestyle='-',alpha=0.5,\
-            zorder=3)
-    for idx in range(len(result[4][0])):
-        x_model,y_model,y_std_model,y_std_err_model = \
-            Stats_one_arr(result[4][4][idx],result[4][3][idx],base=0.4,\
-                bin_statval='center')
-        plt.plot(x_model,y_model,color='lightgray',linestyle='-',alpha=0.5,\
-            zorder=4)
+    smhm_stats_arr = np.concatenate([chunk[3] for chunk in result])
+    y_model_arr = smhm_stats_arr[:, STATS.index('mean'), :]
+    plot_draws(plt.gca(), x_smhm, y_model_arr, 'lightgray', draw_mode,
+        label='model')
 
     # REMOVED ERROR BAR ON BEST FIT
-    plt.errorbar(x_bf,y_bf,color='mediumorchid',fmt='-s',ecolor='mediumorchid',\
+    plt.errorbar(x_smhm,y_bf,color='mediumorchid',fmt='-s',ecolor='mediumorchid',\
         markersize=4,capsize=5,capthick=0.5,label='best fit',zorder=10)
 
     if survey == 'resolvea' and mf_type == 'smf':
         plt.xlim(10,14)
     else:
         plt.xlim(10,)
-    plt.xlabel(r'\boldmath$\log_{10}\ M_{h} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$',fontsize=20)
+    plt.xlabel(tex_label(r'\boldmath$\log_{10}\ M_{h} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'),fontsize=20)
     if mf_type == 'smf':
         if survey == 'eco':
             plt.ylim(np.log10((10**8.9)/2.041),)
@@ -1127,17 +1048,17 @@ def plot_xmhm(result, gals_bf, halos_bf, gals_data, halos_data, gals_b10, \
             plt.ylim(np.log10((10**8.9)/2.041),13)
         elif survey == 'resolveb':
             plt.ylim(np.log10((10**8.7)/2.041),)
-        plt.ylabel(r'\boldmath$\log_{10}\ M_\star \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$',fontsize=20)
+        plt.ylabel(tex_label(r'\boldmath$\log_{10}\ M_\star \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'),fontsize=20)
     elif mf_type == 'bmf':
         if survey == 'eco' or survey == 'resolvea':
             plt.ylim(np.log10((10**9.4)/2.041),)
         elif survey == 'resolveb':
             plt.ylim(np.log10((10**9.1)/2.041),)
-        plt.ylabel(r'\boldmath$\log_{10}\ M_{b} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$',fontsize=20)
+        plt.ylabel(tex_label(r'\boldmath$\log_{10}\ M_{b} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'),fontsize=20)
     handles, labels = plt.gca().get_legend_handles_labels()
     by_label = OrderedDict(zip(labels, handles))
     plt.legend(by_label.values(), by_label.keys(), loc='best',prop={'size': 20})
-    plt.annotate(r'$\boldsymbol\chi ^2 \approx$ {0}'.format(np.round(bf_chi2,2)), 
+    plt.annotate(tex_label(r'$\boldsymbol\chi ^2 \approx$ {0}').format(np.round(bf_chi2,2)),
         xy=(0.8, 0.1), xycoords='axes fraction', bbox=dict(boxstyle="square", 
         ec='k', fc='lightgray', alpha=0.5), size=15)
     if mf_type == 'smf':
@@ -1148,41 +1069,39 @@ def plot_xmhm(result, gals_bf, halos_bf, gals_data, halos_data, gals_b10, \
 def plot_xmhm_data_mocks(gals_data, halos_data, xmhm_mocks, 
     gals_bf, halos_bf):
     """ This function plots mass relations from survey mocks and data"""
-    x_bf,y_bf,y_std_bf,y_std_err_bf = Stats_one_arr(halos_bf,
-    gals_bf,base=0.4,bin_statval='center')
-    x_data,y_data,y_std_data,y_std_err_data = Stats_one_arr(halos_data,
-        gals_data, base=0.4, bin_statval='center')
+    x_smhm = 0.5 * (SMHM_BINS[1:] + SMHM_BINS[:-1])
+    y_bf = binned_stats(halos_bf, gals_bf, SMHM_BINS)[STATS.index('mean')]
+    y_data = binned_stats(halos_data, gals_data, SMHM_BINS)[
+        STATS.index('mean')]
     # y_std_err_data = err_data
 
     fig1 = plt.figure(figsize=(10,10))
-    x_mocks, y_mocks, y_std_err_mocks = xmhm_mocks[0], xmhm_mocks[1], \
-        xmhm_mocks[2]
-    y_std_err_data = np.std(y_mocks, axis=0)
-    # for i in range(len(x_mocks)):
-    #     plt.errorbar(x_mocks[i],y_mocks[i],yerr=y_std_err_mocks[i],
-    #         color='lightgray',fmt='-s', ecolor='lightgray', markersize=4, 
-    #         capsize=5, capthick=0.5, label=r'mocks',zorder=5)
-    plt.errorbar(x_data,y_data,yerr=y_std_err_data,color='k',fmt='s',
+    # Scatter of mean relation between mocks
+    y_std_err_data = np.nanstd(xmhm_mocks[:, STATS.index('mean'), :], axis=0)
+    # y_mocks_lo, y_mocks_hi = stat_band(xmhm_mocks, 'mean', (16, 84))
+    # plt.fill_between(x_smhm, y_mocks_lo, y_mocks_hi, color='lightgray',
+    #     alpha=0.5, label=r'mocks', zorder=5)
+    plt.errorbar(x_smhm,y_data,yerr=y_std_err_data,color='k',fmt='s',
         ecolor='k',markersize=5,capsize=5,capthick=0.5,\
             label=r'data',zorder=10)
-    plt.errorbar(x_bf,y_bf,color='mediumorchid',fmt='-s',
+    plt.errorbar(x_smhm,y_bf,color='mediumorchid',fmt='-s',
         ecolor='mediumorchid',markersize=5,capsize=5,capthick=0.5,\
             label=r'best-fit',zorder=20)
 
 
-    plt.xlabel(r'\boldmath$\log_{10}\ M_{h} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$',fontsize=20)
+    plt.xlabel(tex_label(r'\boldmath$\log_{10}\ M_{h} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'),fontsize=20)
     if mf_type == 'smf':
         if survey == 'eco' or survey == 'resolvea':
             plt.ylim(np.log10((10**8.9)/2.041),)
         elif survey == 'resolveb':
             plt.ylim(np.log10((10**8.7)/2.041),)
-        plt.ylabel(r'\boldmath$\log_{10}\ M_\star \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$',fontsize=20)
+        plt.ylabel(tex_label(r'\boldmath$\log_{10}\ M_\star \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'),fontsize=20)
     elif mf_type == 'bmf':
         if survey == 'eco' or survey == 'resolvea':
             plt.ylim(np.log10((10**9.4)/2.041),)
         elif survey == 'resolveb':
             plt.ylim(np.log10((10**9.1)/2.041),)
-        plt.ylabel(r'\boldmath$\log_{10}\ M_{b} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$',fontsize=20)
+        plt.ylabel(tex_label(r'\boldmath$\log_{10}\ M_{b} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'),fontsize=20)
     handles, labels = plt.gca().get_legend_handles_labels()
     by_label = OrderedDict(zip(labels, handles))
     plt.legend(by_label.values(), by_label.keys(), loc='best',prop={'size': 15})
@@ -1235,8 +1154,8 @@ def debug_xmhm():
         markersize=4,capsize=5,capthick=0.5,label=r'stellar',zorder=20)
     plt.errorbar(x_b10,y_b10,yerr=y_std_err_b10,color='k',fmt='-s',ecolor='k',\
             markersize=4,capsize=5,capthick=0.5,label=r'Behroozi10',zorder=30)
-    plt.xlabel(r'\boldmath$\log_{10}\ M_{h} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$',fontsize=15)
-    plt.ylabel(r'\boldmath$\log_{10}\ M_\star \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$',fontsize=15)
+    plt.xlabel(tex_label(r'\boldmath$\log_{10}\ M_{h} \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'),fontsize=15)
+    plt.ylabel(tex_label(r'\boldmath$\log_{10}\ M_\star \left[\mathrm{M_\odot}\, \mathrm{h}^{-1} \right]$'),fontsize=15)
     plt.legend(loc='best',prop={'size': 10})
     plt.show()
 
@@ -1259,6 +1178,19 @@ def args_parser():
         help='Options: smf/bmf')
     parser.add_argument('nproc', type=int, help='Number of processes',\
         default=1)
+    parser.add_argument('--draws', type=str, default='lines',
+        choices=DRAW_MODES, help='Posterior draws as lines or percentile '
+        'bands')
+    parser.add_argument('--text', type=str, default='latex',
+        choices=TEXT_MODES, help='mathtext for fast drafts, latex for final '
+        'figures')
+    parser.add_argument('--posterior', type=str, default=None,
+        choices=POSTERIOR_SOURCES, help='Also plot the MF and SMHM of '
+        'posterior draws, from model predictions stored by mcmc.py --blobs '
+        'or from a new mock population per draw. Defaults to blobs if the '
+        'blob file of the chain (mcmc_<survey>_<mf_type>_blobs.f4, moved '
+        'next to the chain file) exists.')
+    add_pool_args(parser)
     args = parser.parse_args()
     return args
 
@@ -1276,11 +1208,18 @@ def main(args):
     global survey
     global path_to_figures
     global mf_type
+    global draw_mode
+    global pool_backend
+    global dask_address
 
     survey = args.survey
     machine = args.machine
     nproc = args.nproc
     mf_type = args.mf_type
+    draw_mode = args.draws
+    pool_backend = args.pool
+    dask_address = args.dask_address
+    set_text_mode(args.text)
 
     dict_of_paths = cwpaths.cookiecutter_paths()
     path_to_raw = dict_of_paths['raw_dir']
@@ -1327,36 +1266,35 @@ def main(args):
     mcmc_table_pctl, bf_params, bf_chi2 = \
         get_paramvals_percentile(mcmc_table, 68, chi2)
 
-    # print('Retrieving stellar mass from catalog')
-    # stellar_mass_arr = catl.logmstar.values
-    # if mf_type == 'smf':
-    #     maxis_data, phi_data, err_data_, bins_data, counts_data = \
-    #         diff_smf(stellar_mass_arr, volume, False)
-    # elif mf_type == 'bmf':
-    #     gas_mass_arr = catl.logmgas.values
-    #     bary_mass_arr = calc_bary(stellar_mass_arr, gas_mass_arr)
-    #     maxis_data, phi_data, err_data_, bins_data, counts_data = \
-    #         diff_bmf(bary_mass_arr, volume, False)
-    # print('Jackknife survey')
-    # err_data_mf, err_data_xmhm = jackknife(catl, volume)
+    blob_file = blob_fname(survey, mf_type, path=path_to_proc)
+    posterior = args.posterior
+    if posterior is None and os.path.exists(blob_file):
+        posterior = 'blobs'
+
+    if posterior is not None:
+        print('Retrieving stellar mass from catalog')
+        stellar_mass_arr = catl.logmstar.values
+        if mf_type == 'smf':
+            maxis_data, phi_data, err_data_, bins_data, counts_data = \
+                diff_smf(stellar_mass_arr, volume, False)
+        elif mf_type == 'bmf':
+            gas_mass_arr = catl.logmgas.values
+            bary_mass_arr = calc_bary(stellar_mass_arr, gas_mass_arr)
+            maxis_data, phi_data, err_data_, bins_data, counts_data = \
+                diff_bmf(bary_mass_arr, volume, False)
+        print('Jackknife survey')
+        err_data_mf, err_data_xmhm = jackknife(catl, volume)
     print('Initial population of halo catalog')
     model_init = halocat_init(halo_catalog, z_median)
 
-    # print('Retrieving Behroozi 2010 centrals')
-    # model_init.mock.populate()
-    # if survey == 'eco' or survey == 'resolvea':
-    #     if mf_type == 'smf':
-    #         limit = np.round(np.log10((10**8.9) / 2.041), 1)
-    #     elif mf_type == 'bmf':
-    #         limit = np.round(np.log10((10**9.4) / 2.041), 1)
-    # elif survey == 'resolveb':
-    #     if mf_type == 'smf':
-    #         limit = np.round(np.log10((10**8.7) / 2.041), 1)
-    #     elif mf_type == 'bmf':
-    #         limit = np.round(np.log10((10**9.1) / 2.041), 1)
-    # sample_mask = model_init.mock.galaxy_table['stellar_mass'] >= 10**limit
-    # gals_b10 = model_init.mock.galaxy_table[sample_mask]
-    # cen_gals_b10, cen_halos_b10 = get_centrals_mock(gals_b10)
+    if posterior is not None:
+        print('Retrieving Behroozi 2010 centrals')
+        model_init.mock.populate()
+        limit = get_survey(survey).model_limit(mf_type)
+        sample_mask = model_init.mock.galaxy_table['stellar_mass'] >= \
+            10**limit
+        gals_b10 = model_init.mock.galaxy_table[sample_mask]
+        cen_gals_b10, cen_halos_b10 = get_centrals_mock(gals_b10)
 
     print('Retrieving survey centrals')
     cen_gals_data, cen_halos_data = get_centrals_data(catl)
@@ -1365,19 +1303,27 @@ def main(args):
     cen_halos_data = np.array(list(cen_halos_data.values[:65]) + list(cen_halos_data.values[66:]))
     cen_gals_data = np.array(list(cen_gals_data.values[:65]) + list(cen_gals_data.values[66:]))
 
-    # print('Multiprocessing')
-    # result = mp_init(mcmc_table_pctl, nproc)
+    if posterior == 'populate':
+        print('Multiprocessing')
+        result = mp_init(mcmc_table_pctl, nproc)
+        if not is_master(pool_backend):
+            return
     print('Getting best fit model and centrals')
     maxis_bf, phi_bf, err_tot_bf, counts_bf, cen_gals_bf, cen_halos_bf = \
         get_best_fit_model(bf_params)
-
-    # print('Plotting MF')
-    # plot_mf(result, maxis_bf, phi_bf, err_tot_bf, maxis_data, phi_data, 
-    #     err_data_mf, bf_chi2)
-
-    # print('Plotting XMHM')
-    # plot_xmhm(result, cen_gals_bf, cen_halos_bf, cen_gals_data, cen_halos_data,
-    #     cen_gals_b10, cen_halos_b10, bf_chi2)   
+    if posterior == 'blobs':
+        # Chains run with --blobs need no new populations
+        print('Reading model predictions of posterior draws')
+        result = blob_init(blob_file, maxis_bf)
+
+    if posterior is not None:
+        print('Plotting MF')
+        plot_mf(result, maxis_bf, phi_bf, err_tot_bf, maxis_data, phi_data,
+            err_data_mf, bf_chi2)
+
+        print('Plotting XMHM')
+        plot_xmhm(result, cen_gals_bf, cen_halos_bf, cen_gals_data,
+            cen_halos_data, cen_gals_b10, cen_halos_b10, bf_chi2)
 
     xmhm_mocks = get_xmhm_mocks(survey, path_to_mocks, mf_type)
 
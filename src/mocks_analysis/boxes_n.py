@@ -1,10 +1,11 @@
-from cosmo_utils.utils.file_readers import fast_food_reader as ffr
 from cosmo_utils.utils import work_paths as cwpaths
 import matplotlib.pyplot as plt
 from matplotlib import rc
 import numpy as np
 import os 
 
+from src.data.fast_food import read_header
+
 __author__ = '{Mehnaaz Asad}'
 
 rc('font', **{'family': 'sans-serif', 'sans-serif': ['Helvetica']}, size=20)
@@ -19,22 +20,11 @@ os.chdir(path_to_ff)
 
 ngal_arr = [] 
 for hb_local in np.sort(os.listdir()): 
-    with open(path_to_ff + hb_local, 'rb') as hb: 
-        idat    = ffr('int'  , 5, hb) 
-        fdat    = ffr('float', 9, hb) 
-        znow    = ffr('float', 1, hb)[0] 
-        ngal    = int(idat[1]) 
-        lbox    = int(fdat[0]) 
-        x_arr   = ffr('float' , ngal, hb)
-        y_arr   = ffr('float' , ngal, hb)
-        z_arr   = ffr('float' , ngal, hb)
-        vx_arr  = ffr('float' , ngal, hb)
-        vy_arr  = ffr('float' , ngal, hb)
-        vz_arr  = ffr('float' , ngal, hb)
-        halom   = ffr('double' , ngal, hb)
-        cs_flag = ffr('int'   , ngal, hb)
-        haloid  = ffr('long'   , ngal, hb)
-        ngal_arr.append(ngal) 
+    # Only the header is needed to count galaxies
+    header = read_header(path_to_ff + hb_local)
+    ngal = header['ngal']
+    lbox = header['lbox']
+    ngal_arr.append(ngal)
 
 ngal_arr = np.array(ngal_arr)
 
@@ -14,6 +14,15 @@ import numpy as np
 import math
 import os
 
+from src.data.mock_suite import MockSuite
+from src.data.surveys import get_survey
+from src.data.mass_conversion import to_h1, log_bary_mass, \
+    mock_log_bary_mass
+from src.data.ensemble_errors import ensemble_errors, \
+    sigma_from_frac as scale_to_data
+from src.data.number_density import MAG_H_CONVERSION, cumu_num_dens, \
+    cumu_num_dens_batch, lum_func_bins
+
 __author__ = '{Mehnaaz Asad}'
 
 rc('font', **{'family': 'sans-serif', 'sans-serif': ['Helvetica']}, size=20)
@@ -203,7 +212,7 @@ def diff_smf(mstar_arr, volume, cvar_err, h1_bool):
     """
     if not h1_bool:
         # changing from h=0.7 to h=1
-        logmstar_arr = np.log10((10**mstar_arr) / 2.041)        
+        logmstar_arr = to_h1(mstar_arr)
     else:
         logmstar_arr = mstar_arr
     if survey == 'eco':
@@ -239,7 +248,7 @@ def diff_bmf(mass_arr, volume, cvar_err, sim_bool, h1_bool):
     
     if not h1_bool:
         # changing from h=0.7 to h=1
-        mass_arr = np.log10((10**mass_arr) / 2.041)
+        mass_arr = to_h1(mass_arr)
     
     if survey == 'eco':
         bin_min = np.round(np.log10((10**9.4) / 2.041), 1)
@@ -267,76 +276,40 @@ def diff_bmf(mass_arr, volume, cvar_err, sim_bool, h1_bool):
     phi = counts / (volume * dm)  # not a log quantity
     return maxis, phi, err_poiss, bins, counts
 
-def cumu_num_dens(data,weights,volume,bool_mag): 
-    if weights is None: 
-        weights = np.ones(len(data)) 
-    else: 
-        weights = np.array(weights) 
-    #Unnormalized histogram and bin edges 
-    data += 0.775 #change mags from h=0.7 to h=1
-    bins = np.arange(data.min(), data.max(), 0.2) 
-    freq,edg = np.histogram(data,bins=bins,weights=weights) 
-    bin_centers = 0.5*(edg[1:]+edg[:-1]) 
-    bin_width = edg[1] - edg[0] 
-    if not bool_mag: 
-        N_cumu = np.cumsum(freq[::-1])[::-1]  
-    else: 
-        N_cumu = np.cumsum(freq) 
-    n_cumu = N_cumu/volume 
-    err_poiss = np.sqrt(N_cumu)/volume 
-    return bin_centers,edg,n_cumu,err_poiss,bin_width 
-                                                               
 def frac_error(phi_arr):
-    # 3D array where each element is all the values of phi per bin
-    phi_arr_trans = np.transpose(phi_arr)
-
-    std_arr = []
-    mean_arr = []
-    frac_err_arr_mean = []
-    frac_err_arr = []
-    for idx,value in enumerate(phi_arr_trans):
-        #Measure std between each bin for all mocks
-        std = np.std(value)
-        #Measure mean between each bin for all mocks
-        mean = np.mean(value)
-        
-        #Fractional error on the mean of all mocks
-        frac_error_mean = std/mean
-
-        #Fractional error for each bin of each mock
-        temp_arr = []
-        for value2 in value:
-            # if value2 == 0:
-            #     value2 = 10**-99
-            frac_error = std/value2 
-            temp_arr.append(frac_error)   
-
-        std_arr.append(std)
-        mean_arr.append(mean)
-        frac_err_arr_mean.append(frac_error_mean)
-        frac_err_arr.append(temp_arr)
-
-    frac_err_arr = np.array(frac_err_arr)
-    return frac_err_arr, frac_err_arr_mean
+    # Fractional error for each bin of each mock with shape (bins, mocks)
+    # and fractional error on the mean of all mocks per bin
+    std, mean, frac_err, frac_err_mean = ensemble_errors(phi_arr)
+    frac_err_arr = np.transpose(frac_err)
+    return frac_err_arr, frac_err_mean
 
 def sigma_from_frac(frac_err_arr, frac_err_arr_mean, phi_data):
-    # Within each bin multiply frac_error with phi value for each bin
-    # Using the mean of each bin
-    sigma_final_arr_mean = frac_err_arr_mean * phi_data
-
     # Within each bin of each mock multiply frac_error with phi value from data
-    # for each bin
-    sigma_final_arr = []
-    for idx,value in enumerate(frac_err_arr):
-        value = value * phi_data[idx]
-        sigma_final_arr.append(value)
-
-    # Transpose fractional error array because to use df.corr function the columns
-    # have to be the different variables i.e. bin numbers
-    frac_err_arr_trans = np.transpose(frac_err_arr)
-    sigma_final_arr_trans = frac_err_arr_trans * phi_data
+    # for each bin. Transposed so that the columns are the different variables
+    # i.e. bin numbers, as needed by df.corr
+    sigma_final_arr_trans = scale_to_data(np.transpose(frac_err_arr),
+        phi_data)
+    sigma_final_arr = np.transpose(sigma_final_arr_trans)
     return sigma_final_arr_trans, sigma_final_arr
 
+def mock_mass_funcs(mock_cols):
+    """Reduction measuring SMF and BMF of an ECO mock"""
+    logmstar_arr = mock_cols['logmstar']
+    mhi_arr = mock_cols['mhi']
+    logmbary_arr = mock_log_bary_mass(logmstar_arr, mhi_arr, h1_shift=False)
+
+    #Measure SMF of mock using diff_smf function
+    maxis_smf, phi_smf, err_smf, bins_smf, counts_smf = \
+        diff_smf(logmstar_arr, volume, 0, False)
+    maxis_bmf, phi_bmf, err_bmf, bins_bmf, counts_bmf = \
+        diff_bmf(logmbary_arr, volume, 0, False, False)
+    return maxis_smf, phi_smf, err_smf, counts_smf, maxis_bmf, phi_bmf, \
+        err_bmf, counts_bmf
+
+def mock_magnitudes(mock_cols):
+    """Reduction returning h=1 absolute r-band magnitudes of a mock"""
+    return mock_cols['M_r'] + MAG_H_CONVERSION
+
 # Paths
 dict_of_paths = cwpaths.cookiecutter_paths()
 path_to_raw = dict_of_paths['raw_dir']
@@ -351,57 +324,13 @@ path_to_resolveb = path_to_external + 'RESOLVE_B_mvir_catls/'
 global survey
 survey = 'eco'
 
-phi_arr_smf = []
-max_arr_smf = []
-err_arr_smf = []
-counts_arr_smf = []
-phi_arr_bmf = []
-max_arr_bmf = []
-err_arr_bmf = []
-counts_arr_bmf = []
-box_id_arr = np.linspace(5001,5008,8)
-for box in box_id_arr:
-    box = int(box)
-    path_to_mocks = '/Users/asadm2/Documents/Grad_School/Research/'\
-        'Repositories/resolve_statistics/data/external/m200b/eco/{0}/'\
-        'ECO_m200b_catls/'.format(box) 
-    for num in range(8):
-        filename = path_to_mocks + 'ECO_cat_{0}_Planck_memb_cat.hdf5'.format(num)
-        mock_pd = reading_catls(filename) 
-
-        #Using the same survey definition as in mcmc smf i.e excluding the buffer
-        mock_pd = mock_pd.loc[(mock_pd.cz.values >= 3000) & \
-            (mock_pd.cz.values <= 7000) & (mock_pd.M_r.values <= -17.33) &\
-                (mock_pd.logmstar.values >= 8.9)]
-        
-        logmstar_arr = mock_pd.logmstar.values
-        mhi_arr = mock_pd.mhi.values
-        logmgas_arr = np.log10(1.4 * mhi_arr)
-        logmbary_arr = np.log10(10**(logmstar_arr) + 10**(logmgas_arr))
-        
-        volume = 151829.26 # Survey volume without buffer [Mpc/h]^3
-        #Measure SMF of mock using diff_smf function
-        maxis, phi, err_poiss, bins, counts = \
-            diff_smf(logmstar_arr, volume, 0, False)
-        phi_arr_smf.append(phi)
-        max_arr_smf.append(maxis)
-        err_arr_smf.append(err_poiss)
-        counts_arr_smf.append(counts)
-        maxis, phi, err_poiss, bins, counts = \
-            diff_bmf(logmbary_arr, volume, 0, False, False) 
-        phi_arr_bmf.append(phi) 
-        max_arr_bmf.append(maxis)
-        err_arr_bmf.append(err_poiss)
-        counts_arr_bmf.append(counts) 
+path_to_eco_mocks = path_to_external + 'm200b/eco/'
+volume = 151829.26 # Survey volume without buffer [Mpc/h]^3
 
-phi_arr_smf = np.array(phi_arr_smf)
-max_arr_smf = np.array(max_arr_smf)
-err_arr_smf = np.array(err_arr_smf)
-counts_arr_smf = np.array(counts_arr_smf)
-phi_arr_bmf = np.array(phi_arr_bmf)
-max_arr_bmf = np.array(max_arr_bmf)
-err_arr_bmf = np.array(err_arr_bmf)
-counts_arr_bmf = np.array(counts_arr_bmf)
+#Using the same survey definition as in mcmc smf i.e excluding the buffer
+eco_suite = MockSuite(path_to_eco_mocks, get_survey(survey), 'smf')
+max_arr_smf, phi_arr_smf, err_arr_smf, counts_arr_smf, max_arr_bmf, \
+    phi_arr_bmf, err_arr_bmf, counts_arr_bmf = eco_suite.map(mock_mass_funcs)
 
 columns = ['1', '2', '3', '4', '5', '6'] 
 df = pd.DataFrame(phi_arr_smf, columns=columns)
@@ -456,7 +385,7 @@ elif survey == 'resolvea' or survey == 'resolveb':
 catl, volume, cvar, z_median = read_data(catl_file, survey)
 logmstar_arr = catl.logmstar.values
 logmgas_arr = catl.logmgas.values
-logmbary_arr = np.log10((10**logmstar_arr)+(10**logmgas_arr))
+logmbary_arr = log_bary_mass(logmstar_arr, logmgas_arr)
 max_data_smf, phi_data_smf, err_data_smf, bins_data_smf, counts_smf = \
     diff_smf(logmstar_arr, volume, cvar, False)
 
@@ -507,38 +436,18 @@ plt.legend(loc='lower left', prop={'size': 20})
 plt.show() 
 
 ## Plot of luminosity function of all mocks
-mag_cen_arr = []
-mag_n_arr = []
-mag_err_arr = []
-for box in box_id_arr:
-    box = int(box)
-    path_to_mocks = '/Users/asadm2/Documents/Grad_School/Research/'\
-        'Repositories/resolve_statistics/data/external/m200b/eco/{0}/'\
-        'ECO_m200b_catls/'.format(box) 
-    for num in range(8):
-        filename = path_to_mocks + 'ECO_cat_{0}_Planck_memb_cat.hdf5'.format(num)
-        mock_pd = reading_catls(filename) 
-
-        #Using the same survey definition as in mcmc smf i.e excluding the buffer
-        mock_pd = mock_pd.loc[(mock_pd.cz.values >= 3000) & \
-            (mock_pd.cz.values <= 7000) & (mock_pd.M_r.values <= -17.33) &\
-                (mock_pd.logmstar.values >= 8.9)]
-        mag_cen, mag_edg, mag_n, mag_err, bw = cumu_num_dens(mock_pd.M_r.
-            values, None, volume, True) 
-        mag_cen_arr.append(mag_cen)
-        mag_n_arr.append(mag_n)
-        mag_err_arr.append(mag_err)
-
-mag_cen_arr = np.array(mag_cen_arr)
-mag_n_arr = np.array(mag_n_arr)
-mag_err_arr = np.array(mag_err_arr)
+mag_arr = eco_suite.map(mock_magnitudes)
+# Luminosity functions of data and all mocks on the same bins
+mag_bins = lum_func_bins(catl.absrmag.values)
+mag_cen, mag_n_arr, mag_err_arr = cumu_num_dens_batch(mag_arr, mag_bins,
+    volume, True)
 
 mag_cen, mag_edg, mag_n, mag_err, bw = cumu_num_dens(catl.absrmag.
-    values, None, volume, True)    
+    values + MAG_H_CONVERSION, mag_bins, None, volume, True)
 
 fig6 = plt.figure(figsize=(10,10))
 for idx in range(n_catls):
-    plt.errorbar(mag_cen_arr[idx],mag_n_arr[idx],yerr=mag_err_arr[idx],
+    plt.errorbar(mag_cen,mag_n_arr[idx],yerr=mag_err_arr[idx],
     color=col_arr[idx],marker='o',markersize=4,capsize=5,capthick=0.5)
 plt.errorbar(mag_cen,mag_n,yerr=mag_err,markersize=4,capsize=5,
     capthick=2, marker='o', label='data',color='k',fmt='-s',ecolor='k',
@@ -572,8 +481,7 @@ for num in range(59):
     
     logmstar_arr = mock_pd.logmstar.values
     mhi_arr = mock_pd.mhi.values
-    logmgas_arr = np.log10(1.4 * mhi_arr)
-    logmbary_arr = np.log10(10**(logmstar_arr) + 10**(logmgas_arr))
+    logmbary_arr = mock_log_bary_mass(logmstar_arr, mhi_arr, h1_shift=False)
 
     # print("bary: ", logmbary_arr.max())
     # print("star: ", logmstar_arr.max())
@@ -655,7 +563,7 @@ elif survey == 'resolvea' or survey == 'resolveb':
 catl, volume, cvar, z_median = read_data(catl_file, survey)
 logmstar_arr = catl.logmstar.values
 logmgas_arr = catl.logmgas.values
-logmbary_arr = np.log10((10**logmstar_arr)+(10**logmgas_arr))
+logmbary_arr = log_bary_mass(logmstar_arr, logmgas_arr)
 max_data_smf, phi_data_smf, err_data_smf, bins_data_smf, counts_smf = \
     diff_smf(logmstar_arr, volume, cvar, False)
 
@@ -716,8 +624,7 @@ for num in range(104):
     
     logmstar_arr = mock_pd.logmstar.values
     mhi_arr = mock_pd.mhi.values
-    logmgas_arr = np.log10(1.4 * mhi_arr)
-    logmbary_arr = np.log10(10**(logmstar_arr) + 10**(logmgas_arr))
+    logmbary_arr = mock_log_bary_mass(logmstar_arr, mhi_arr, h1_shift=False)
 
     # print("bary: ", logmbary_arr.max())
     # print("star: ", logmstar_arr.max())
@@ -799,7 +706,7 @@ elif survey == 'resolvea' or survey == 'resolveb':
 catl, volume, cvar, z_median = read_data(catl_file, survey)
 logmstar_arr = catl.logmstar.values
 logmgas_arr = catl.logmgas.values
-logmbary_arr = np.log10((10**logmstar_arr)+(10**logmgas_arr))
+logmbary_arr = log_bary_mass(logmstar_arr, logmgas_arr)
 max_data_smf, phi_data_smf, err_data_smf, bins_data_smf, counts_smf = \
     diff_smf(logmstar_arr, volume, cvar, False)
 
@@ -13,10 +13,18 @@ from matplotlib import rc
 import seaborn as sns
 import pandas as pd
 import numpy as np
+from functools import partial
 import argparse
 import math
 import os
 
+from src.data.mock_suite import MockSuite, count
+from src.data.surveys import get_survey, measure_mf
+from src.data.mass_conversion import to_h1, log_bary_mass, \
+    mock_log_bary_mass
+from src.data.number_density import MAG_H_CONVERSION, cumu_num_dens, \
+    cumu_num_dens_batch, lum_func_bins
+
 __author__ = '{Mehnaaz Asad}'
 
 rc('font', **{'family': 'sans-serif', 'sans-serif': ['Helvetica']}, size=20)
@@ -172,7 +180,7 @@ def read_data(path_to_file, survey):
 
     return catl,volume,cvar,z_median
 
-def diff_smf(mstar_arr, volume, h1_bool):
+def diff_smf(mstar_arr, volume, h1_bool, survey_name=None):
     """
     Calculates differential stellar mass function
 
@@ -187,6 +195,9 @@ def diff_smf(mstar_arr, volume, h1_bool):
     h1_bool: boolean
         True if units of masses are h=1, False if units of masses are not h=1
 
+    survey_name: string, optional
+        Survey whose bins are used, the survey of the run if None
+
     Returns
     ---------
     maxis: array
@@ -201,148 +212,62 @@ def diff_smf(mstar_arr, volume, h1_bool):
     bins: array
         Array of bin edge values
     """
+    survey_name = survey_name or survey
     if not h1_bool:
         # changing from h=0.7 to h=1
-        logmstar_arr = np.log10((10**mstar_arr) / 2.041)        
+        logmstar_arr = to_h1(mstar_arr)
     else:
         logmstar_arr = mstar_arr
-    if survey == 'eco':
-        bin_min = np.round(np.log10((10**8.9) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.8) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)
-    
-    elif survey == 'resolvea':
-        bin_min = np.round(np.log10((10**8.9) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.5) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)
-
-    elif survey == 'resolveb':
-        bin_min = np.round(np.log10((10**8.7) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.8) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)   
-
-
-    # Unnormalized histogram and bin edges
-    counts, edg = np.histogram(logmstar_arr, bins=bins)  # paper used 17 bins
-    dm = edg[1] - edg[0]  # Bin width
-    maxis = 0.5 * (edg[1:] + edg[:-1])  # Mass axis i.e. bin centers
-    # Normalized to volume and bin width
-    err_poiss = np.sqrt(counts) / (volume * dm)
-    phi = counts / (volume * dm)  # not a log quantity
+    bins = get_survey(survey_name).bins('smf')
+    maxis, phi, err_poiss, counts = measure_mf(logmstar_arr, volume, bins)
     return maxis, phi, err_poiss, bins, counts
 
-def diff_bmf(mass_arr, volume, sim_bool, h1_bool):
+def diff_bmf(mass_arr, volume, sim_bool, h1_bool, survey_name=None):
     """Calculates differential stellar mass function given stellar/baryonic
-     masses."""  
+     masses. Bins are those of survey_name, the survey of the run if None."""
+    survey_name = survey_name or survey
     if sim_bool:
         mass_arr = np.log10(mass_arr)
     
     if not h1_bool:
         # changing from h=0.7 to h=1
-        mass_arr = np.log10((10**mass_arr) / 2.041)
-    
-    if survey == 'eco':
-        bin_min = np.round(np.log10((10**9.4) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.8) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)
+        mass_arr = to_h1(mass_arr)
     
-    if survey == 'resolvea':
-        bin_min = np.round(np.log10((10**9.4) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.5) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7)    
-
-    if survey == 'resolveb':
-        bin_min = np.round(np.log10((10**9.1) / 2.041), 1)
-        bin_max = np.round(np.log10((10**11.5) / 2.041), 1)
-        bins = np.linspace(bin_min, bin_max, 7) 
-       
-
-    # Unnormalized histogram and bin edges
-    counts, edg = np.histogram(mass_arr, bins=bins)  # paper used 17 bins
-    dm = edg[1] - edg[0]  # Bin width
-    maxis = 0.5 * (edg[1:] + edg[:-1])  # Mass axis i.e. bin centers
-    # Normalized to volume and bin width
-    err_poiss = np.sqrt(counts) / (volume * dm)
-
-    phi = counts / (volume * dm)  # not a log quantity
+    bins = get_survey(survey_name).bins('bmf')
+    maxis, phi, err_poiss, counts = measure_mf(mass_arr, volume, bins)
     return maxis, phi, err_poiss, bins, counts
 
-def cumu_num_dens(data, weights, volume, bool_mag): 
-    if weights is None: 
-        weights = np.ones(len(data)) 
-    else: 
-        weights = np.array(weights) 
-    #Unnormalized histogram and bin edges 
-    data += 0.775 #change mags from h=0.7 to h=1
-    bins = np.arange(data.min(), data.max(), 0.2) 
-    freq,edg = np.histogram(data,bins=bins,weights=weights) 
-    bin_centers = 0.5*(edg[1:]+edg[:-1]) 
-    bin_width = edg[1] - edg[0] 
-    if not bool_mag: 
-        N_cumu = np.cumsum(freq[::-1])[::-1]  
-    else: 
-        N_cumu = np.cumsum(freq) 
-    n_cumu = N_cumu/volume 
-    err_poiss = np.sqrt(N_cumu)/volume 
-    return bin_centers,edg,n_cumu,err_poiss,bin_width 
-
-def measure_corr_mat(path_to_mocks):
-
-    phi_arr_smf = []
-    max_arr_smf = []
-    err_arr_smf = []
-    counts_arr_smf = []
-    phi_arr_bmf = []
-    max_arr_bmf = []
-    err_arr_bmf = []
-    counts_arr_bmf = []
-    box_id_arr = np.linspace(5001,5008,8)
-    for box in box_id_arr:
-        box = int(box)
-        temp_path = path_to_mocks + '{0}/{1}_m200b_catls/'.format(box, 
-            temp_dict.get('mock_name')) 
-        for num in range(temp_dict.get('num_mocks')):
-            filename = temp_path + '{0}_cat_{1}_Planck_memb_cat.hdf5'.\
-                format(temp_dict.get('mock_name'), num)
-            mock_pd = reading_catls(filename) 
-            if num == 0:
-                print("cz min: ", mock_pd.cz.min())
-                print("cz max: ",mock_pd.cz.max())
-            #Using the same survey definition as in mcmc smf i.e excluding 
-            # the buffer
-            mock_pd = mock_pd.loc[(mock_pd.cz.values >= temp_dict.get('min_cz'))
-                & (mock_pd.cz.values <= temp_dict.get('max_cz')) & 
-                (mock_pd.M_r.values <= temp_dict.get('mag_limit')) &
-                (mock_pd.logmstar.values >= temp_dict.get('mstar_limit'))]
-            
-            logmstar_arr = mock_pd.logmstar.values
-            mhi_arr = mock_pd.mhi.values
-            logmgas_arr = np.log10(1.4 * mhi_arr)
-            logmbary_arr = np.log10(10**(logmstar_arr) + 10**(logmgas_arr))
-            
-            volume =  temp_dict.get('volume') 
-            #Measure SMF of mock using diff_smf function
-            maxis, phi, err_poiss, bins, counts = \
-                diff_smf(logmstar_arr, volume, False)
-            phi_arr_smf.append(phi)
-            max_arr_smf.append(maxis)
-            err_arr_smf.append(err_poiss)
-            counts_arr_smf.append(counts)
-            maxis, phi, err_poiss, bins, counts = \
-                diff_bmf(logmbary_arr, volume, False, False) 
-            phi_arr_bmf.append(phi) 
-            max_arr_bmf.append(maxis)
-            err_arr_bmf.append(err_poiss)
-            counts_arr_bmf.append(counts) 
-
-    phi_arr_smf = np.array(phi_arr_smf)
-    max_arr_smf = np.array(max_arr_smf)
-    err_arr_smf = np.array(err_arr_smf)
-    counts_arr_smf = np.array(counts_arr_smf)
-    phi_arr_bmf = np.array(phi_arr_bmf)
-    max_arr_bmf = np.array(max_arr_bmf)
-    err_arr_bmf = np.array(err_arr_bmf)
-    counts_arr_bmf = np.array(counts_arr_bmf)
+def mock_mass_funcs(mock_cols, volume, survey_name):
+    """
+    Reduction measuring SMF and BMF of a mock. Volume and survey are
+    arguments since workers need not share the globals set by main().
+    """
+    logmstar_arr = mock_cols['logmstar']
+    mhi_arr = mock_cols['mhi']
+    logmbary_arr = mock_log_bary_mass(logmstar_arr, mhi_arr, h1_shift=False)
+
+    #Measure SMF of mock using diff_smf function
+    maxis_smf, phi_smf, err_smf, bins_smf, counts_smf = \
+        diff_smf(logmstar_arr, volume, False, survey_name)
+    maxis_bmf, phi_bmf, err_bmf, bins_bmf, counts_bmf = \
+        diff_bmf(logmbary_arr, volume, False, False, survey_name)
+    return maxis_smf, phi_smf, err_smf, counts_smf, maxis_bmf, phi_bmf, \
+        err_bmf, counts_bmf
+
+def mock_magnitudes(mock_cols):
+    """Reduction returning h=1 absolute r-band magnitudes of a mock"""
+    return mock_cols['M_r'] + MAG_H_CONVERSION
+
+def measure_corr_mat(path_to_mocks, nproc=1):
+
+    #Using the same survey definition as in mcmc smf i.e excluding
+    # the buffer
+    suite = MockSuite(path_to_mocks, get_survey(survey), 'smf',
+        columns=['logmstar', 'mhi'])
+    max_arr_smf, phi_arr_smf, err_arr_smf, counts_arr_smf, max_arr_bmf, \
+        phi_arr_bmf, err_arr_bmf, counts_arr_bmf = suite.map(partial(
+        mock_mass_funcs, volume=temp_dict.get('volume'), survey_name=survey),
+        nproc)
 
     columns = ['1', '2', '3', '4', '5', '6'] 
     df = pd.DataFrame(phi_arr_smf, columns=columns)
@@ -399,7 +324,7 @@ def measure_mass_funcs(smf, bmf, catl):
     max_arr_bmf, phi_arr_bmf, err_arr_bmf = bmf[0], bmf[1], bmf[2]
     logmstar_arr = catl.logmstar.values
     logmgas_arr = catl.logmgas.values
-    logmbary_arr = np.log10((10**logmstar_arr)+(10**logmgas_arr))
+    logmbary_arr = log_bary_mass(logmstar_arr, logmgas_arr)
     max_data_smf, phi_data_smf, err_data_smf, bins_data_smf, counts_smf = \
         diff_smf(logmstar_arr, volume, False)
 
@@ -461,48 +386,30 @@ def measure_mass_funcs(smf, bmf, catl):
     plt.legend(loc='lower left', prop={'size': 20})
     plt.show() 
 
-def measure_lum_funcs(catl, path_to_mocks):
+def measure_lum_funcs(catl, path_to_mocks, nproc=1):
 
     volume =  temp_dict.get('volume') 
 
-    mag_cen_arr = []
-    mag_n_arr = []
-    mag_err_arr = []
-    box_id_arr = np.linspace(5001,5008,8)
-    for box in box_id_arr:
-        box = int(box)
-        temp_path = path_to_mocks + '{0}/{1}_m200b_catls/'.format(box, 
-            temp_dict.get('mock_name')) 
-        for num in range(temp_dict.get('num_mocks')):
-            filename = temp_path + '{0}_cat_{1}_Planck_memb_cat.hdf5'.\
-                format(temp_dict.get('mock_name'), num)
-            mock_pd = reading_catls(filename) 
-
-            # Using the same survey definition as in mcmc smf 
-            # i.e excluding the buffer
-            mock_pd = mock_pd.loc[(mock_pd.cz.values >= temp_dict.get('min_cz')) 
-                & (mock_pd.cz.values <= temp_dict.get('max_cz')) & 
-                (mock_pd.M_r.values <= temp_dict.get('mag_limit')) &
-                (mock_pd.logmstar.values >= temp_dict.get('mstar_limit'))]
-            mag_cen, mag_edg, mag_n, mag_err, bw = cumu_num_dens(mock_pd.M_r.
-                values, None, volume, True) 
-            mag_cen_arr.append(mag_cen)
-            mag_n_arr.append(mag_n)
-            mag_err_arr.append(mag_err)
-
-    mag_cen_arr = np.array(mag_cen_arr)
-    mag_n_arr = np.array(mag_n_arr)
-    mag_err_arr = np.array(mag_err_arr)
+    # Using the same survey definition as in mcmc smf
+    # i.e excluding the buffer
+    suite = MockSuite(path_to_mocks, get_survey(survey), 'smf',
+        columns=['M_r'])
+    mag_arr = suite.map(mock_magnitudes, nproc)
+    # Luminosity functions of data and all mocks on the same bins
+    mag_bins = lum_func_bins(catl.absrmag.values)
+    mag_cen, mag_n_arr, mag_err_arr = cumu_num_dens_batch(mag_arr, mag_bins,
+        volume, True)
+    box_id_arr = np.unique(suite.boxes)
 
     mag_cen, mag_edg, mag_n, mag_err, bw = cumu_num_dens(catl.absrmag.
-        values, None, volume, True)    
+        values + MAG_H_CONVERSION, mag_bins, None, volume, True)
 
     cm = plt.get_cmap('Spectral')
-    n_catls = temp_dict.get('num_mocks')*len(box_id_arr)
+    n_catls = len(suite)
     col_arr = [cm(idx/float(n_catls)) for idx in range(n_catls)]
     fig6 = plt.figure(figsize=(10,10))
     for idx in range(n_catls):
-        plt.errorbar(mag_cen_arr[idx],mag_n_arr[idx],yerr=mag_err_arr[idx],
+        plt.errorbar(mag_cen,mag_n_arr[idx],yerr=mag_err_arr[idx],
         color=col_arr[idx],marker='o',markersize=4,capsize=5,capthick=0.5)
     plt.errorbar(mag_cen,mag_n,yerr=mag_err,markersize=4,capsize=5,
         capthick=2, marker='o', label='data',color='k',fmt='-s',ecolor='k',
@@ -520,32 +427,16 @@ def measure_lum_funcs(catl, path_to_mocks):
     plt.legend(loc='lower left', prop={'size': 20})
     plt.show()
 
-def measure_num_dens(catl, path_to_mocks):
+def measure_num_dens(catl, path_to_mocks, nproc=1):
 
     volume =  temp_dict.get('volume') 
 
-    num_arr = [] 
-    box_arr = [] 
-    box_id_arr = np.linspace(5001,5008,8)
-    for box in box_id_arr: 
-        box = int(box) 
-        temp_path = path_to_mocks + '{0}/{1}_m200b_catls/'.format(box, 
-            temp_dict.get('mock_name'))
-        num_arr_temp = [] 
-        box_arr_temp = [] 
-        for num in range(temp_dict.get('num_mocks')): 
-            filename = temp_path + '{0}_cat_{1}_Planck_memb_cat.hdf5'.format( 
-                    temp_dict.get('mock_name'), num)  
-            mock_pd = reading_catls(filename) 
-            mock_pd = mock_pd.loc[(mock_pd.cz.values >= temp_dict.get('min_cz'))
-                & (mock_pd.cz.values <= temp_dict.get('max_cz')) & 
-                (mock_pd.M_r.values <= temp_dict.get('mag_limit')) & 
-                (mock_pd.logmstar.values >= temp_dict.get('mstar_limit'))] 
-            num_arr_temp.append(len(mock_pd)) 
-            box_arr_temp.append(box) 
-        box_arr.append(box_arr_temp) 
-        num_arr.append(num_arr_temp) 
-    num_arr = np.array(num_arr)
+    suite = MockSuite(path_to_mocks, get_survey(survey), 'smf',
+        columns=['logmstar'])
+    counts = suite.map(count, nproc)
+    boxes = suite.boxes
+    box_arr = [boxes[boxes == box] for box in np.unique(boxes)]
+    num_arr = np.array([counts[boxes == box] for box in np.unique(boxes)])
 
     num_dens_arr = num_arr/volume
 
@@ -577,6 +468,8 @@ def args_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('survey', type=str, \
         help='Options: eco/resolvea/resolveb')
+    parser.add_argument('nproc', type=int, nargs='?',
+        help='Number of processes used to read mocks', default=1)
     args = parser.parse_args()
     return args
 
@@ -646,10 +539,10 @@ def main(args):
     temp_dict = vars()[survey]
 
     catl, volume, cvar, z_median = read_data(catl_file, survey)
-    smf, bmf = measure_corr_mat(path_to_mocks)
+    smf, bmf = measure_corr_mat(path_to_mocks, args.nproc)
     measure_mass_funcs(smf, bmf, catl)
-    measure_lum_funcs(catl, path_to_mocks)
-    measure_num_dens(catl, path_to_mocks)
+    measure_lum_funcs(catl, path_to_mocks, args.nproc)
+    measure_num_dens(catl, path_to_mocks, args.nproc)
 
 # Main function
 if __name__ == '__main__':